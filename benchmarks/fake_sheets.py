@@ -0,0 +1,205 @@
+# benchmarks/fake_sheets.py
+# Spreadsheet ปลอมในหน่วยความจำ แทน gspread.Spreadsheet ให้ gsheet_utils ใช้ได้โดยไม่ต้องต่อ Google
+# (มีเฉพาะเมธอดที่ gsheet_utils ใช้ ดู SheetBackend ใน sheet_backends.py)
+#
+#   from benchmarks.fake_sheets import FakeSpreadsheet
+#   fake = FakeSpreadsheet({"PR_PO": [["Request_ID", ...], [...], ...]}, latency=0.2)
+#   gsheet_utils.use_backend(fake)
+import json
+import threading
+import time
+from collections import Counter, deque
+
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol, absolute_range_name
+
+from sheet_backends import split_range
+
+
+def _formatted(value) -> str:
+    """ค่าที่เขียนแบบ RAW -> ข้อความที่ Google คืนมาตอนอ่าน (FORMATTED_VALUE)"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _trim(rows: list[list]) -> list[list]:
+    """ตัดค่าว่างท้ายแถวและแถวว่างท้ายตาราง แบบที่ Sheets API ทำ"""
+    out = []
+    for row in rows:
+        end = len(row)
+        while end and row[end - 1] == "":
+            end -= 1
+        out.append(row[:end])
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+def _payload_size(obj) -> int:
+    return len(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+
+class _FakeResponse:
+    """response ขั้นต่ำที่ gspread.exceptions.APIError ต้องใช้"""
+
+    def __init__(self, code: int, status: str, message: str):
+        self.status_code = code
+        self._error = {"code": code, "status": status, "message": message}
+        self.text = json.dumps({"error": self._error})
+
+    def json(self):
+        return {"error": self._error}
+
+
+class FakeSpreadsheet:
+    """
+    Spreadsheet ปลอม เก็บแต่ละ Sheet เป็น list ของแถว (ค่าเป็นข้อความแบบที่ API คืนมา)
+
+    latency            : หน่วงเวลาทุกการเรียก API (วินาที) จำลองเวลาเดินทางไป Google
+    read_quota         : จำนวนครั้งอ่านสูงสุดต่อ 60 วินาที (None = ไม่จำกัด) เกินแล้ว APIError 429
+    write_quota        : จำนวนครั้งเขียนสูงสุดต่อ 60 วินาที
+    stats              : จำนวนครั้งที่เรียกแต่ละเมธอด + bytes_sent / bytes_received (ขนาด JSON)
+    """
+
+    def __init__(self, sheets: dict[str, list[list]] | None = None, latency: float = 0.0,
+                 read_quota: int | None = None, write_quota: int | None = None):
+        self.sheets = {
+            name: [[_formatted(v) for v in row] for row in rows]
+            for name, rows in (sheets or {}).items()
+        }
+        self.latency = latency
+        self.read_quota = read_quota
+        self.write_quota = write_quota
+        self.revision = 0
+        self.stats = Counter()
+        self._calls = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------
+    # การนับ / หน่วงเวลา / quota
+    # -------------------------------------------------------
+    def reset_stats(self):
+        with self._lock:
+            self.stats = Counter()
+
+    def _call(self, method: str, kind: str, request=None):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            quota = self.read_quota if kind == "read" else self.write_quota
+            window = self._calls[kind]
+            now = time.monotonic()
+            while window and now - window[0] > 60:
+                window.popleft()
+            if quota is not None and len(window) >= quota:
+                self.stats["quota_errors"] += 1
+                raise APIError(_FakeResponse(
+                    429, "RESOURCE_EXHAUSTED",
+                    f"Quota exceeded for quota metric '{kind.title()} requests' (fake)",
+                ))
+            window.append(now)
+            self.stats[method] += 1
+            self.stats["api_calls"] += 1
+            if request is not None:
+                self.stats["bytes_sent"] += _payload_size(request)
+
+    def _reply(self, response):
+        with self._lock:
+            self.stats["bytes_received"] += _payload_size(response)
+        return response
+
+    def _sheet(self, name: str) -> list[list]:
+        if name not in self.sheets:
+            raise APIError(_FakeResponse(400, "INVALID_ARGUMENT", f"Unable to parse range: {name}"))
+        return self.sheets[name]
+
+    def _read(self, range_name: str) -> list[list]:
+        name, a1 = split_range(range_name)
+        rows = self._sheet(name)
+        grid = a1_range_to_grid_range(a1) if a1 else {}
+        r0, r1 = grid.get("startRowIndex", 0), grid.get("endRowIndex", len(rows))
+        c0, c1 = grid.get("startColumnIndex", 0), grid.get("endColumnIndex")
+        return _trim([row[c0:c1] for row in rows[r0:r1]])
+
+    def _write(self, name: str, start_row: int, start_col: int, values: list[list]):
+        rows = self._sheet(name)
+        for offset, new in enumerate(values):
+            index = start_row - 1 + offset
+            while len(rows) <= index:
+                rows.append([])
+            row = rows[index]
+            end = start_col - 1 + len(new)
+            if len(row) < end:
+                row.extend([""] * (end - len(row)))
+            row[start_col - 1:end] = [_formatted(v) for v in new]
+        self.revision += 1
+
+    # -------------------------------------------------------
+    # gspread.Spreadsheet subset
+    # -------------------------------------------------------
+    def get_lastUpdateTime(self) -> str:
+        self._call("get_lastUpdateTime", "read")
+        return self._reply(f"rev-{self.revision}")
+
+    def values_get(self, range: str, params: dict | None = None) -> dict:
+        self._call("values_get", "read", {"range": range})
+        return self._reply({"range": range, "values": self._read(range)})
+
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> dict:
+        self._call("values_batch_get", "read", {"ranges": ranges})
+        return self._reply({"valueRanges": [{"range": r, "values": self._read(r)} for r in ranges]})
+
+    def values_batch_update(self, body: dict | None = None) -> dict:
+        self._call("values_batch_update", "write", body)
+        for item in body.get("data", []):
+            name, a1 = split_range(item["range"])
+            row, col = a1_to_rowcol(a1.split(":")[0]) if a1 else (1, 1)
+            self._write(name, row, col, item.get("values", []))
+        return self._reply({"totalUpdatedRanges": len(body.get("data", []))})
+
+    def values_append(self, range: str, params: dict, body: dict) -> dict:
+        self._call("values_append", "write", body)
+        name, _ = split_range(range)
+        values = body.get("values", [])
+        first = len(_trim(self._sheet(name))) + 1
+        self._write(name, first, 1, values)
+        updated = absolute_range_name(name, f"A{first}:A{first + max(len(values), 1) - 1}")
+        return self._reply({"updates": {"updatedRange": updated, "updatedRows": len(values)}})
+
+    def values_clear(self, range: str) -> dict:
+        self._call("values_clear", "write", {"range": range})
+        name, a1 = split_range(range)
+        if a1 is None:
+            self.sheets[name] = []
+        else:
+            rows = self._sheet(name)
+            grid = a1_range_to_grid_range(a1)
+            for row in rows[grid.get("startRowIndex", 0):grid.get("endRowIndex", len(rows))]:
+                c0, c1 = grid.get("startColumnIndex", 0), grid.get("endColumnIndex", len(row))
+                row[c0:c1] = [""] * len(row[c0:c1])
+        self.revision += 1
+        return self._reply({"clearedRange": range})
+
+    def values_update(self, range: str, params: dict | None = None, body: dict | None = None) -> dict:
+        self._call("values_update", "write", body)
+        name, a1 = split_range(range)
+        row, col = a1_to_rowcol(a1.split(":")[0]) if a1 else (1, 1)
+        self._write(name, row, col, (body or {}).get("values", []))
+        return self._reply({"updatedRange": range})
+
+    def add_worksheet(self, title: str, rows: int, cols: int):
+        self._call("add_worksheet", "write", {"title": title})
+        if title in self.sheets:
+            raise APIError(_FakeResponse(400, "INVALID_ARGUMENT", f'A sheet with the name "{title}" already exists.'))
+        self.sheets[title] = []
+        self.revision += 1
+        return self._reply({"title": title})
+
+    def fetch_sheet_metadata(self, params: dict | None = None) -> dict:
+        self._call("fetch_sheet_metadata", "read", params)
+        return self._reply({"sheets": [{"properties": {"title": name}} for name in self.sheets]})
@@ -0,0 +1,274 @@
+# benchmarks/run_benchmarks.py
+# วัดเวลา load_sheet / save_sheet / ค้นหา / KPI Dashboard / รับเข้า PO บนข้อมูลสังเคราะห์
+# โดยใช้ FakeSpreadsheet แทน Google Sheets (ไม่ต้องมี secrets / internet)
+#
+#   python benchmarks/run_benchmarks.py
+#   python benchmarks/run_benchmarks.py --sizes 1000,10000 --latency 0.15 --json bench.json
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import gsheet_utils
+import kpi_rollup
+import reports
+import search_index
+from benchmarks.fake_sheets import FakeSpreadsheet
+from purchase_ops import (
+    RECEIVED_STATUS,
+    apply_goods_receipt,
+    apply_po_edits,
+    check_goods_receipt,
+    closed_po_periods,
+    search_items_with_wildcard,
+)
+
+PRPO_COLUMNS = [
+    "Request_Date", "Request_ID", "PO_ID", "PR_ID", "Date", "Status", "Item_No", "Description",
+    "Quantity", "Back_Order", "Comment", "Qty_to_Receive", "Quantity_Received",
+    "Outstanding_Quantity", "Expected_Received", "Vendor_No.", "Vendor_Name", "Row_Version",
+]
+STATUSES = [
+    "ขอสั่งซื้อ", "ขอเสนอราคา", "เปิดใบขอซื้อ(PR)", "รออนุมัติโดยHead", "รออนุมัติโดยCOO",
+    "แจ้งขอสั่งซื้อแล้ว(PR)", "จัดทำใบสั่งซื้อ(PO)", "แจ้งสั่งซื้อแล้ว(PO)", "อยู่ระหว่างการจัดส่ง",
+    RECEIVED_STATUS,
+]
+PO_STATUSES = STATUSES[6:]
+PRIORITIES = ["ด่วนมาก", "ด่วน", "ปกติ"]
+WORDS = ["lens", "filter", "cable", "สายไฟ", "หลอดไฟ", "กล่อง", "MONDER", "bracket", "สกรู", "PQM"]
+PRPO_SEARCH_COLUMNS = ["Request_ID", "PO_ID", "PR_ID", "Item_No", "Description", "Vendor_Name", "Back_Order"]
+
+
+def _dates(rng, n: int) -> np.ndarray:
+    start = np.datetime64("2022-01-01")
+    return (start + rng.integers(0, 1000, n).astype("timedelta64[D]")).astype(str)
+
+
+def make_dataset(n_lines: int, seed: int = 0) -> dict[str, list[list]]:
+    """สร้างข้อมูลสังเคราะห์ Request / PR_PO / Item_Data / Enum_Data (ขนาดตาม n_lines แถว PR_PO)"""
+    rng = np.random.default_rng(seed)
+    n_items = max(n_lines // 2, 10)
+
+    item_no = np.array([f"IT{i:06d}" for i in range(n_items)])
+    item_desc = np.array([
+        f"{WORDS[a]} {WORDS[b]} {i}" for i, (a, b) in enumerate(rng.integers(0, len(WORDS), (n_items, 2)))
+    ])
+
+    items = rng.integers(0, n_items, n_lines)
+    status = rng.choice(STATUSES, n_lines)
+    has_pr = np.isin(status, STATUSES[2:])
+    has_po = np.isin(status, PO_STATUSES)
+    qty = rng.integers(1, 50, n_lines)
+    recv = np.where(status == RECEIVED_STATUS, qty, 0)
+    vendor = rng.integers(0, 200, n_lines)
+
+    prpo = pd.DataFrame({
+        "Request_Date": _dates(rng, n_lines),
+        "Request_ID": [f"RQ{i:06d}" for i in range(1, n_lines + 1)],
+        "PO_ID": np.where(has_po, [f"PO{i // 5:06d}" for i in range(n_lines)], ""),
+        "PR_ID": np.where(has_pr, [f"PR{i // 5:06d}" for i in range(n_lines)], ""),
+        "Date": _dates(rng, n_lines),
+        "Status": status,
+        "Item_No": item_no[items],
+        "Description": item_desc[items],
+        "Quantity": qty,
+        "Back_Order": "",
+        "Comment": "",
+        "Qty_to_Receive": qty - recv,
+        "Quantity_Received": recv,
+        "Outstanding_Quantity": qty - recv,
+        "Expected_Received": _dates(rng, n_lines),
+        "Vendor_No.": [f"V{v:04d}" for v in vendor],
+        "Vendor_Name": [f"Vendor {v}" for v in vendor],
+        "Row_Version": 1,
+    })[PRPO_COLUMNS]
+
+    n_req = max(n_lines // 4, 1)
+    request = pd.DataFrame({
+        "Request_ID": [f"RQ{i:06d}" for i in range(1, n_req + 1)],
+        "Request_Date": _dates(rng, n_req),
+        "Status": rng.choice(STATUSES[:6], n_req),
+        "Priority": rng.choice(PRIORITIES, n_req),
+        "Item_No": item_no[rng.integers(0, n_items, n_req)],
+        "Quantity": rng.integers(1, 50, n_req),
+        "Row_Version": 1,
+    })
+
+    def _rows(df: pd.DataFrame) -> list[list]:
+        return [df.columns.tolist()] + df.astype(str).values.tolist()
+
+    return {
+        "PR_PO": _rows(prpo),
+        "Request": _rows(request),
+        "Item_Data": _rows(pd.DataFrame({"No.": item_no, "Description": item_desc})),
+        "Enum_Data": _rows(pd.DataFrame({"Status": STATUSES})),
+    }
+
+
+# ---------------------------------------------------------
+# ตัววัด
+# ---------------------------------------------------------
+def measure(fake: FakeSpreadsheet, fn, repeat: int, setup=None) -> dict:
+    """รัน fn ซ้ำ repeat ครั้ง คืนเวลา (median/min) และจำนวน API call / bytes ของการรัน 1 ครั้ง"""
+    times, stats = [], None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        fake.reset_stats()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if stats is None:
+            stats = dict(fake.stats)
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "min_ms": min(times) * 1000,
+        "api_calls": stats.get("api_calls", 0),
+        "bytes_sent": stats.get("bytes_sent", 0),
+        "bytes_received": stats.get("bytes_received", 0),
+    }
+
+
+def run_size(n_lines: int, latency: float, repeat: int) -> list[dict]:
+    data = make_dataset(n_lines)
+    results = []
+
+    def fresh_backend():
+        fake = FakeSpreadsheet(data, latency=latency)
+        gsheet_utils.use_backend(fake)
+        return fake
+
+    def record(name, fake, fn, setup=None):
+        row = {"rows": n_lines, "case": name, **measure(fake, fn, repeat, setup)}
+        results.append(row)
+        print(
+            f"{n_lines:>8} {name:<34} {row['median_ms']:>10.1f} ms {row['api_calls']:>5} calls "
+            f"{row['bytes_sent']:>12,} B out {row['bytes_received']:>12,} B in",
+            flush=True,
+        )
+
+    # session พร้อมกัน 20 คน (single-flight: ควรเหลือ API call ชุดเดียว)
+    pool = ThreadPoolExecutor(max_workers=20)
+
+    fake = fresh_backend()
+    record("load_sheet PR_PO (cold)", fake, lambda: gsheet_utils.load_sheet("PR_PO"),
+           setup=gsheet_utils.invalidate_cache)
+    record("load_sheet PR_PO (warm)", fake, lambda: gsheet_utils.load_sheet("PR_PO"))
+    record("load_sheet PR_PO x20 conc. (cold)", fake,
+           lambda: list(pool.map(lambda _: gsheet_utils.load_sheet("PR_PO"), range(20))),
+           setup=gsheet_utils.invalidate_cache)
+    record("load_sheets PR_PO page (cold)", fake,
+           lambda: gsheet_utils.load_sheets(["Request", "PR_PO", "Enum_Data"]),
+           setup=gsheet_utils.invalidate_cache)
+
+    df_prpo = gsheet_utils.load_sheet("PR_PO")
+    record("search index build", fake,
+           lambda: search_index.get_search_index(df_prpo, PRPO_SEARCH_COLUMNS),
+           setup=search_index._build_index.clear)
+    record("search wildcard *lens*", fake,
+           lambda: search_items_with_wildcard(df_prpo, "*lens*", PRPO_SEARCH_COLUMNS))
+    record("search keyword vendor 1", fake,
+           lambda: search_items_with_wildcard(df_prpo, "vendor 1", PRPO_SEARCH_COLUMNS))
+    # KPI ของหน้า Dashboard: นับใหม่จาก Sheet ที่อยู่ใน cache / ใช้ตัวเลขที่นับไว้แล้ว
+    rollups = kpi_rollup._get_store()
+    record("dashboard summary (count)", fake, kpi_rollup.dashboard_summary,
+           setup=lambda: [rollups.drop(name) for name in ("Request", "PR_PO")])
+    record("dashboard summary (warm)", fake, kpi_rollup.dashboard_summary)
+
+    # แก้ 3 แถวแล้ว save (แบบปุ่ม bulk action) แต่ละรอบแก้คนละแถว
+    runs = itertools.count()
+
+    def save_three():
+        k = next(runs) * 3
+        df = gsheet_utils.load_sheet("PR_PO")
+        df.loc[df.index[k:k + 3], "Comment"] = "bench-" + str(k)
+        gsheet_utils.save_sheet("PR_PO", df)
+
+    fake = fresh_backend()
+    record("save_sheet 3 row changes", fake, save_three)
+    # โหลดหลัง save: sync เฉพาะแถวที่ Row_Version เปลี่ยน (เทียบกับ cold = โหลดทั้ง Sheet)
+    record("load_sheet PR_PO after save (sync)", fake, lambda: gsheet_utils.load_sheet("PR_PO"),
+           setup=save_three)
+
+    # รับเข้า 2% ของบรรทัด PO ผ่านตาราง PO แล้ว save
+    def receive_po():
+        df = gsheet_utils.load_sheet("PR_PO")
+        df_po = df[df["PO_ID"].astype(str) != ""].copy()
+        edited = df_po.sample(frac=0.02, random_state=next(runs))
+        edited["Quantity_Received"] = edited["Quantity"]
+        edited_po = df_po.copy()
+        edited_po.loc[edited.index, "Quantity_Received"] = edited["Quantity_Received"]
+        gsheet_utils.save_sheet("PR_PO", apply_po_edits(df, edited_po, PO_STATUSES))
+
+    fake = fresh_backend()
+    record("PO receive 2% lines + save", fake, receive_po)
+
+    # นำเข้าใบรับสินค้า: รับบางส่วน 1 ชิ้น ทุกบรรทัด PO ที่ยังค้างรับ (สูงสุด 3000 บรรทัด) แล้ว save
+    def goods_receipt():
+        df = gsheet_utils.load_sheet("PR_PO")
+        open_po = df[(df["PO_ID"].astype(str) != "") & (df["Outstanding_Quantity"] > 0)].head(3000)
+        gr = pd.DataFrame({"PO_ID": open_po["PO_ID"], "Item_No": open_po["Item_No"], "Qty": "1"})
+        df_new, _ = apply_goods_receipt(df, check_goods_receipt(df, gr))
+        gsheet_utils.save_sheet("PR_PO", df_new)
+
+    fake = fresh_backend()
+    record("goods receipt file 3000 lines + save", fake, goods_receipt)
+
+    # ย้ายรายการที่ปิดแล้วไปเก็บถาวร (ทุกรอบเริ่มจากข้อมูลชุดเดิม) แล้ววัดการโหลด Sheet หลักที่เหลือ
+    fake = fresh_backend()
+    original = {name: [row[:] for row in rows] for name, rows in fake.sheets.items()}
+
+    def restore():
+        fake.sheets = {name: [row[:] for row in rows] for name, rows in original.items()}
+        gsheet_utils.use_backend(fake)
+
+    def archive_closed():
+        df = gsheet_utils.load_sheet("PR_PO")
+        gsheet_utils.archive_rows("PR_PO", df, closed_po_periods(df))
+
+    record("archive closed lines", fake, archive_closed, setup=restore)
+    record("load_sheet PR_PO hot (cold)", fake, lambda: gsheet_utils.load_sheet("PR_PO"),
+           setup=gsheet_utils.invalidate_cache)
+    record("load_sheet PR_PO +archive (cold)", fake,
+           lambda: gsheet_utils.load_sheet("PR_PO", include_archive=True),
+           setup=gsheet_utils.invalidate_cache)
+    record("report outstanding by vendor csv", fake,
+           lambda: reports.export_report("outstanding_by_vendor").close())
+    record("report PO received csv", fake, lambda: reports.export_report("po_received").close())
+
+    pool.shutdown()
+    gsheet_utils.use_backend(None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark ชั้นข้อมูลของ Purchase Web App")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="จำนวนแถว PR_PO คั่นด้วย ,")
+    parser.add_argument("--latency", type=float, default=0.0, help="หน่วงเวลาต่อ API call (วินาที)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="บันทึกผลเป็นไฟล์ JSON")
+    args = parser.parse_args()
+    # ข้อมูลสังเคราะห์มีคอลัมน์ Row_Version อยู่แล้ว -> เปิด sync รายแถวเหมือนตั้งใน secrets
+    gsheet_utils.VERSIONED_SHEETS = ["Request", "PR_PO"]
+
+    print(f"{'rows':>8} {'case':<34} {'median':>13} {'api':>11} {'sent':>16} {'received':>15}")
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        results.extend(run_size(size, args.latency, args.repeat))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
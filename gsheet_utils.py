@@ -1,52 +1,2282 @@
 # gsheet_utils.py
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 import gspread
+import requests
+from gspread.utils import absolute_range_name, numericise_all, rowcol_to_a1
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from sheet_backends import RenamedSheets, SheetBackend, SQLiteMirror, row_runs
+from snapshot_store import SnapshotStore
+from telemetry import InstrumentedBackend, get_telemetry, record_retry, response_hook, set_enabled
+
+# DataFrame ที่ load_sheet คืนใช้ข้อมูลร่วมกับ cache ได้เฉพาะตอน pandas เปิด Copy-on-Write (pandas 3 เปิดเสมอ)
+# pandas 2 ที่ไม่ได้เปิด -> คืนสำเนาจริง (ไม่แตะ option ของทั้ง process ให้ ดู _share)
+_PANDAS_COW = int(pd.__version__.split(".")[0]) >= 3
+
+
+def _share(df: pd.DataFrame) -> pd.DataFrame:
+    """สำเนาของ df ที่แก้ได้โดยไม่กระทบต้นฉบับ (ใช้ข้อมูลร่วมกันถ้าเปิด Copy-on-Write อยู่)"""
+    cow = _PANDAS_COW or pd.get_option("mode.copy_on_write") is True
+    return df.copy(deep=not cow)
+
+
+def _secret(key: str, default=None):
+    """อ่านค่าจาก st.secrets (ไม่มีไฟล์ secrets / ไม่มี key = default เช่นตอนรัน benchmark)"""
+    try:
+        return st.secrets.get(key, default)
+    except FileNotFoundError:
+        return default
 
-st.write("SPREADSHEET_ID =",
-st.secrets.get("SPREADSHEET_ID", "NOT FOUND"))
 
 # ใส่ Spreadsheet ID ของ Google Sheet ที่ใช้เป็น DB
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-CREDS = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=SCOPES)
-client = gspread.authorize(CREDS)
+# drive.metadata.readonly ใช้อ่าน modifiedTime ของไฟล์ เพื่อเช็คว่า cache ยังใช้ได้ไหม
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
+SPREADSHEET_ID = _secret("SPREADSHEET_ID")
+
+# ภายในกี่วินาทีหลังโหลด/เช็คล่าสุด ที่จะคืนข้อมูลจาก cache เลยโดยไม่ถาม Google
+# พ้นช่วงนี้แล้วจะเช็ค revision ของ Spreadsheet ก่อน ถ้าไม่เปลี่ยนก็ใช้ cache ต่อ
+CACHE_TTL_SECONDS = float(_secret("SHEET_CACHE_TTL_SECONDS", 30))
+# จำนวนข้อมูลเวอร์ชันก่อน ๆ ที่เก็บไว้ให้ save_sheet เทียบว่าหน้าเว็บแก้ cell ไหนไปบ้าง
+CACHE_HISTORY = 4
+
+# ที่เก็บข้อมูลเบื้องหลัง load_sheet / save_sheet (ดู sheet_backends.py)
+#   "gspread" = อ่าน/เขียน Google Sheets ตรง ๆ
+#   "sqlite"  = อ่านจากสำเนาในไฟล์ SQLite, เขียนผ่านไป Google แล้วอัปเดตสำเนา, sync เบื้องหลัง
+STORAGE_BACKEND = _secret("STORAGE_BACKEND", "gspread")
+MIRROR_PATH = _secret("MIRROR_PATH", ".cache/purchase_mirror.sqlite3")
+MIRROR_SYNC_SECONDS = float(_secret("MIRROR_SYNC_SECONDS", 60))
+# snapshot ของแต่ละ Sheet บนดิสก์ (Arrow IPC) เปิดแอปใหม่ใช้ได้ทันทีแล้วค่อยเช็คกับ Google เบื้องหลัง
+# "" = ไม่เก็บ / snapshot ที่เก่ากว่า SNAPSHOT_MAX_AGE_SECONDS ไม่ใช้
+SNAPSHOT_DIR = _secret("SNAPSHOT_DIR", ".cache/snapshots")
+SNAPSHOT_MAX_AGE_SECONDS = float(_secret("SNAPSHOT_MAX_AGE_SECONDS", 7 * 24 * 3600))
+# คอลัมน์ที่สร้าง index ในสำเนา SQLite ไว้ให้ query_sheet / find_rows ใช้
+MIRROR_INDEXES = {
+    "Request": ["Request_ID", "Status"],
+    "PR_PO": ["Request_ID", "PR_ID", "PO_ID", "Item_No", "Status", "Vendor_Name"],
+    "Item_Data": ["No."],
+}
+
+# คอลัมน์ที่ใช้ระบุแถว (row key) ของแต่ละ Sheet ไว้เทียบว่าแถวไหนเปลี่ยนตอน save_sheet
+# ใส่ได้หลายชุด จะใช้ชุดแรกที่ไม่ว่างและไม่ซ้ำกันเลย ถ้าไม่มีชุดไหนใช้ได้จะเทียบตามลำดับแถว
+SHEET_KEYS = {
+    "Request": [["Request_ID"]],
+    "PR_PO": [["Request_ID"], ["PO_ID", "Item_No"]],
+}
+
+# ชนิดข้อมูลของคอลัมน์แต่ละ Sheet ที่ load_sheet แปลงให้ครั้งเดียวตอนโหลด
+#   "str"      : ข้อความตามที่อยู่ใน Sheet (รหัส / เลขที่ ไม่แปลงเป็นตัวเลข, ค่าว่าง = "")
+#   "number"   : float (ค่าว่าง = NaN)
+#   "date"     : datetime จากข้อความ YYYY-MM-DD (ค่าว่าง = NaT)
+#   "category" : categorical (ค่าว่าง = NaN) หมวดหมู่ = ค่าใน SHEET_CATEGORIES + ค่าที่มีจริงใน Sheet
+# แปลงเฉพาะเมื่อแปลงกลับเป็นข้อความเดิมได้ทุก cell ไม่งั้นคอลัมน์นั้นใช้แบบเดิม (numericise ทีละ cell)
+# คอลัมน์ที่ไม่ได้ระบุก็ใช้แบบเดิม
+SHEET_SCHEMAS = {
+    "Request": {
+        "Request_ID": "str", "Request_Date": "date", "Status": "category",
+        "Priority": "category", "Item_No": "str", "Quantity": "number", "Row_Version": "number",
+    },
+    "PR_PO": {
+        "Request_Date": "date", "Request_ID": "str", "PO_ID": "str", "PR_ID": "str",
+        "Date": "date", "Status": "category", "Item_No": "str", "Description": "str",
+        "Quantity": "number", "Back_Order": "str", "Comment": "str",
+        "Qty_to_Receive": "number", "Quantity_Received": "number", "Outstanding_Quantity": "number",
+        "Expected_Received": "date", "Vendor_No.": "str", "Vendor_Name": "category",
+        "Row_Version": "number",
+    },
+    "Item_Data": {"No.": "str", "Description": "str"},
+}
+# หมวดหมู่ที่มีแน่ ๆ ของคอลัมน์ category (หน้าเว็บตั้งค่าเหล่านี้ได้แม้ยังไม่มีใน Sheet)
+SHEET_CATEGORIES = {
+    "Status": [
+        "ขอสั่งซื้อ", "ขอเสนอราคา", "เปิดใบขอซื้อ(PR)", "รออนุมัติโดยHead", "รออนุมัติโดยCOO",
+        "แจ้งขอสั่งซื้อแล้ว(PR)", "จัดทำใบสั่งซื้อ(PO)", "รออนุมัติโดยCFO", "รออนุมัติโดยCEO",
+        "แจ้งสั่งซื้อแล้ว(PO)", "Vendor กำลังดำเนินการ", "อยู่ระหว่างการจัดส่ง", "รับสินค้าเข้าแล้ว",
+    ],
+    "Priority": ["ด่วนมาก", "ด่วน", "ปกติ"],
+}
+DATE_FORMAT = "%Y-%m-%d"
+
+# Sheet ที่โตขึ้นเรื่อย ๆ (PR_PO) แบ่งเป็น Sheet หลัก (hot) กับ Sheet เก็บถาวรตามช่วงเวลา
+# ชื่อ "<Sheet>_Archive_<ช่วงเวลา>" เช่น PR_PO_Archive_2023 (ดู archive_rows)
+# load_sheet อ่านเฉพาะ Sheet หลัก ส่วน Sheet เก็บถาวรอ่านเมื่อขอด้วย include_archive=True เท่านั้น
+ARCHIVE_SUFFIX = "_Archive_"
+# Sheet เก็บถาวรแทบไม่เปลี่ยน (มีแค่ append ตอนย้าย) ใช้ cache / รายชื่อ Sheet ได้นานกว่า Sheet หลัก
+ARCHIVE_CACHE_TTL_SECONDS = float(_secret("ARCHIVE_CACHE_TTL_SECONDS", 600))
+
+# Sheet ที่แบ่งเก็บหลาย Spreadsheet (shard) เมื่อ Spreadsheet หลักใกล้เต็ม cell / quota เช่นใน secrets
+#   [SHEET_SHARDS.PR_PO]
+#   column = "Request_Date"                       # คอลัมน์ที่ใช้เลือก shard (คอลัมน์ "date" ใช้ปี)
+#   spreadsheets = { "2024" = "<Spreadsheet ID>", "2025" = "<Spreadsheet ID>" }
+# แต่ละ shard คือ Worksheet ชื่อเดียวกับ Sheet หลักใน Spreadsheet ของตัวเอง ในโค้ดเรียกว่า "PR_PO@2024"
+# แถวที่ค่าไม่ตรง shard ไหนอยู่ใน Sheet หลัก (SPREADSHEET_ID) ตามเดิม
+# load_sheet ดึงทุก shard พร้อมกัน (ไม่เกิน SHARD_FETCH_WORKERS Spreadsheet) แล้วต่อกันเป็น DataFrame เดียว
+# shard อ่าน/เขียน Google ตรง ๆ (ไม่ผ่านสำเนา SQLite ของ STORAGE_BACKEND = "sqlite")
+SHEET_SHARDS = _secret("SHEET_SHARDS", {})
+SHARD_SEP = "@"
+SHARD_FETCH_WORKERS = int(_secret("SHARD_FETCH_WORKERS", 4))
+
+# Sheet ที่มีคอลัมน์ Row_Version = เลขเวอร์ชันของแถว ตัวเขียนเพิ่มให้ทุกครั้งที่แถวนั้นเปลี่ยน
+# load_sheet จึง sync เฉพาะแถวที่เปลี่ยนได้: อ่านแค่คอลัมน์ key + Row_Version แล้วดึงเฉพาะแถวที่เลขเปลี่ยน / แถวใหม่
+# ปิดไว้เป็นค่าเริ่มต้น เปิดเองใน secrets ทีละ Sheet:
+#   VERSIONED_SHEETS = ["Request", "PR_PO"]
+# การเปิดครั้งแรก = migration ครั้งเดียว: Sheet ที่ยังไม่มีคอลัมน์นี้ ตัวเขียนจะต่อคอลัมน์ Row_Version ท้ายสุด
+# แล้วเขียนใหม่ทั้งหน้าตอนบันทึกครั้งถัดไป (นับไว้ใน telemetry "row_version_added" ดูได้ที่หน้า Diagnostics)
+# ควรเปิดตอนไม่มีคนแก้ Sheet ตรง ๆ และอย่ามีสูตร/การจัดรูปแบบที่อ้างถึงคอลัมน์ท้าย Sheet
+ROW_VERSION_COLUMN = "Row_Version"
+VERSIONED_SHEETS = list(_secret("VERSIONED_SHEETS", []))
+# แก้ใน Google Sheet ตรง ๆ (ไม่ผ่านแอป) เลขเวอร์ชันไม่เปลี่ยน -> โหลดใหม่ทั้ง Sheet อย่างน้อยทุกกี่วินาที
+SYNC_FULL_RELOAD_SECONDS = float(_secret("SYNC_FULL_RELOAD_SECONDS", 300))
+# แถวที่เปลี่ยนเกินสัดส่วนนี้ของทั้ง Sheet / ช่วงแถวที่ต้องดึงเกินจำนวนนี้ -> โหลดทั้ง Sheet ทีเดียวคุ้มกว่า
+SYNC_MAX_CHANGED_FRACTION = 0.2
+SYNC_MAX_RANGES = 200
+
+# เลข running แต่ละ prefix: prefix -> (Sheet, คอลัมน์) ที่มีเลขเดิมอยู่ ใช้หาเลขตั้งต้นครั้งแรก
+ID_SOURCES = {
+    "RQ": ("PR_PO", "Request_ID"),
+    "PR": ("PR_PO", "PR_ID"),
+    "PO": ("PR_PO", "PO_ID"),
+}
+# จองเลขทีละกี่เลขต่อการเรียก API 1 ครั้ง (มากกว่า 1 = เร็วขึ้น แต่เลขที่จองค้างไว้จะข้ามไปเมื่อ restart)
+ID_BLOCK_SIZE = int(_secret("ID_BLOCK_SIZE", 1))
+
+
+# เก็บเวลา / จำนวนครั้งเรียก API / cache hit ของทุกการอ่านเขียน (ดูหน้า Diagnostics)
+TELEMETRY_ENABLED = bool(_secret("TELEMETRY_ENABLED", True))
+set_enabled(TELEMETRY_ENABLED)
+# quota อ่านต่อนาทีของ Sheets API (ใช้แสดงในหน้า Diagnostics ว่าใกล้เต็มแค่ไหน)
+READ_QUOTA_PER_MINUTE = float(_secret("READ_QUOTA_PER_MINUTE", 60))
+
+
+# ---------------------------------------------------------
+# CONNECTION (สร้างเมื่อใช้ครั้งแรก ไม่มีอะไรต่อ Google ตอน import)
+# ---------------------------------------------------------
+# จำนวน connection ที่เปิดค้างไว้ (keep-alive) ไปยัง Google API ต่อ process
+HTTP_POOL_SIZE = int(_secret("HTTP_POOL_SIZE", 10))
+# timeout ต่อ request (วินาที): (ต่อ connection, รออ่านผล)
+HTTP_TIMEOUT = (10, 60)
+
+
+class _Connection:
+    """
+    จุดเดียวที่ต่อ Google Sheets (ใช้ร่วมกันทุก session / thread)
+    - credentials สร้างครั้งเดียว token ใช้ซ้ำจนใกล้หมดอายุ แล้วต่ออายุเบื้องหลังระหว่างที่ token เดิมยังใช้ได้
+    - HTTP session เดียว มี connection pool แบบ keep-alive ไม่ต้อง TLS handshake ใหม่ทุก request
+    - handle ของ Spreadsheet / Worksheet ที่เปิดแล้วเก็บไว้ใช้ซ้ำ (เปิดแต่ละครั้งต้องโหลด metadata)
+    """
+
+    def __init__(self, creds_info: dict):
+        self._creds_info = creds_info
+        self._lock = threading.RLock()
+        self._client: gspread.Client | None = None
+        self._spreadsheets: dict[str, gspread.Spreadsheet] = {}
+        self._worksheets: dict[tuple[str, str], gspread.Worksheet] = {}
+
+    def client(self) -> gspread.Client:
+        with self._lock:
+            if self._client is None:
+                creds = Credentials.from_service_account_info(self._creds_info, scopes=SCOPES)
+                creds = creds.with_non_blocking_refresh()
+                session = AuthorizedSession(creds)
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.hooks["response"].append(response_hook)   # นับ bytes รับส่งจริง
+                client = gspread.Client(auth=creds, session=session)
+                client.set_timeout(HTTP_TIMEOUT)
+                self._client = client
+            return self._client
+
+    def spreadsheet(self, key: str) -> gspread.Spreadsheet:
+        with self._lock:
+            if key not in self._spreadsheets:
+                self._spreadsheets[key] = self.client().open_by_key(key)
+            return self._spreadsheets[key]
+
+    def worksheet(self, key: str, title: str) -> gspread.Worksheet:
+        with self._lock:
+            if (key, title) not in self._worksheets:
+                self._worksheets[(key, title)] = self.spreadsheet(key).worksheet(title)
+            return self._worksheets[(key, title)]
+
+
+@st.cache_resource
+def _get_connection() -> _Connection:
+    return _Connection(dict(st.secrets["gcp_service_account"]))
+
+
+def get_gsheet_client() -> gspread.Client:
+    """gspread client จาก service account ที่เก็บใน st.secrets (สร้างครั้งแรกที่เรียก)"""
+    return _get_connection().client()
+
+
+def _open_spreadsheet() -> gspread.Spreadsheet:
+    """handle ของ Spreadsheet หลัก (เปิดครั้งเดียวแล้วใช้ซ้ำ)"""
+    return _get_connection().spreadsheet(SPREADSHEET_ID)
+
+
+def get_worksheet(sheet_name: str) -> gspread.Worksheet:
+    """handle ของ Worksheet ใน Spreadsheet หลัก (เปิดครั้งเดียวแล้วใช้ซ้ำ)"""
+    return _get_connection().worksheet(SPREADSHEET_ID, sheet_name)
+
+
+def _instrument(backend: SheetBackend) -> SheetBackend:
+    """
+    ห่อ backend ให้ทุกการเรียก API ถูกนับใน telemetry
+    (SQLiteMirror อ่านจากไฟล์บนเครื่อง ไม่ใช่ API -> ไม่ห่อ นับเฉพาะ remote ที่ห่อไว้ตอนสร้าง)
+    """
+    if isinstance(backend, (SQLiteMirror, InstrumentedBackend)):
+        return backend
+    return InstrumentedBackend(backend)
+
+
+@st.cache_resource
+def _default_backend() -> SheetBackend:
+    """backend ตาม STORAGE_BACKEND (สร้างครั้งเดียวต่อ process)"""
+    if STORAGE_BACKEND == "sqlite":
+        mirror = SQLiteMirror(
+            MIRROR_PATH,
+            remote=_instrument(_open_spreadsheet()),
+            index_columns=MIRROR_INDEXES,
+            version_cells=_version_cells,
+            changed_rows=_changed_rows,
+        )
+        mirror.start_background_sync(MIRROR_SYNC_SECONDS)
+        return mirror
+    return _instrument(_open_spreadsheet())
+
+
+_backend_override: SheetBackend | None = None
+_shard_overrides: dict[str, SheetBackend] = {}
+
+
+def get_backend() -> SheetBackend:
+    """backend ที่ load_sheet / save_sheet ใช้อยู่"""
+    if _backend_override is not None:
+        return _backend_override
+    return _default_backend()
+
+
+@st.cache_resource
+def _shard_backend(spreadsheet_id: str) -> SheetBackend:
+    """backend ของ Spreadsheet shard (เรียก Sheet ในนั้นด้วยชื่อ shard เช่น "PR_PO@2024")"""
+    names = {
+        shard_sheet_name(base, label): base
+        for base, spec in SHEET_SHARDS.items()
+        for label, key in spec["spreadsheets"].items()
+        if key == spreadsheet_id
+    }
+    remote = _shard_overrides.get(spreadsheet_id)
+    if remote is None:
+        remote = _get_connection().spreadsheet(spreadsheet_id)
+    return _instrument(RenamedSheets(remote, names))
+
+
+def _backend_for(sheet_name: str) -> SheetBackend:
+    """backend ของ Spreadsheet ที่เก็บ Sheet นี้ (shard อยู่ใน Spreadsheet ของตัวเอง)"""
+    spreadsheet_id = _shard_spreadsheet(sheet_name)
+    return get_backend() if spreadsheet_id is None else _shard_backend(spreadsheet_id)
+
+
+def use_backend(backend: SheetBackend | None, shards: dict[str, SheetBackend] | None = None):
+    """
+    สลับไปใช้ backend ที่กำหนด (เช่น Spreadsheet ปลอมใน benchmarks/) แทน Google Sheets
+    shards = backend แทน Spreadsheet shard แต่ละตัว {Spreadsheet ID: backend}
+    None = กลับไปใช้ตาม STORAGE_BACKEND และล้าง cache / เลขที่จองไว้ทั้งหมด
+    """
+    global _backend_override, _shard_overrides
+    _backend_override = _instrument(backend) if backend is not None else None
+    _shard_overrides = dict(shards or {}) if backend is not None else {}
+    _shard_backend.clear()
+    _get_sheet_cache.clear()
+    _get_id_allocator.clear()
+    _get_write_queue.clear()
+    _get_snapshot_store.clear()
+
+
+def query_sheet(sql: str, params: tuple | dict = ()) -> pd.DataFrame:
+    """
+    query ข้อมูลด้วย SQL จากสำเนา SQLite (ใช้ได้เมื่อ STORAGE_BACKEND = "sqlite")
+    ชื่อตาราง = ชื่อ Sheet, ชื่อคอลัมน์ = header เช่น
+    query_sheet('SELECT * FROM "PR_PO" WHERE "PO_ID" = ?', (po_id,))
+    """
+    backend = get_backend()
+    if not isinstance(backend, SQLiteMirror):
+        raise RuntimeError('query_sheet ใช้ได้เฉพาะ STORAGE_BACKEND = "sqlite"')
+    return backend.query(sql, params)
+
+
+def find_rows(sheet_name: str, column: str, values: list) -> pd.DataFrame:
+    """
+    แถวของ Sheet ที่ค่าใน column อยู่ใน values (แปลงชนิดตาม SHEET_SCHEMAS แบบเดียวกับ load_sheet
+    index = ลำดับแถวเดียวกับ load_sheet) ใช้แสดงผล ไม่ใช่ส่งกลับ enqueue_save ทั้ง Sheet
+    - STORAGE_BACKEND = "sqlite": query สำเนาผ่าน index ของ MIRROR_INDEXES ไม่ต้องโหลดทั้ง Sheet
+    - backend อื่น / Sheet ที่ยังไม่มีสำเนา / Sheet ที่แบ่ง shard: กรองจาก load_sheet ด้วย pandas
+    """
+    values = [str(v) for v in values]
+    backend = get_backend()
+    if (
+        isinstance(backend, SQLiteMirror) and sheet_name not in SHEET_SHARDS
+        and sheet_name in backend.mirrored_sheets()
+    ):
+        marks = ", ".join("?" * len(values))
+        cells = query_sheet(
+            f'SELECT * FROM "{sheet_name}" WHERE "{column}" IN ({marks}) ORDER BY _row', tuple(values)
+        )
+        cells.index = pd.Index(cells.pop("_row").to_numpy() - 2)
+        return _typed_frame(sheet_name, cells) if not cells.empty else cells
+    df = load_sheet(sheet_name)
+    if df.empty or column not in df.columns:
+        return df.iloc[0:0]
+    return df[_column_text(df[column]).isin(values).to_numpy()]
+
+
+# ---------------------------------------------------------
+# READ CACHE (ใช้ร่วมกันทุก session ใน process เดียวกัน)
+# ---------------------------------------------------------
+@dataclass
+class _CacheEntry:
+    df: pd.DataFrame
+    revision: str | None     # modifiedTime ของ Spreadsheet ตอนที่โหลด
+    checked_at: float        # time.monotonic() ตอนเช็ค revision ล่าสุด
+    full_at: float           # time.monotonic() ตอนโหลดทั้ง Sheet ครั้งล่าสุด (sync เฉพาะแถวไม่นับ)
+
+
+class _SheetCache:
+    """
+    cache DataFrame ของแต่ละ Sheet (key = ชื่อ Sheet) พร้อม revision ที่โหลดมา
+    และเก็บ snapshot เนื้อหาล่าสุดที่รู้ว่าอยู่ใน Sheet ไว้ให้ตัวเขียนหาตำแหน่งแถว
+    กับข้อมูลเวอร์ชันล่าสุด ๆ ไว้เทียบว่าหน้าเว็บแก้อะไรไปจากชุดที่โหลดไป
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, _CacheEntry] = {}
+        self._snapshots: dict[str, pd.DataFrame] = {}
+        self._history: OrderedDict[str, pd.DataFrame] = OrderedDict()
+        self._flights: dict[str, Future] = {}   # Sheet ที่กำลังดึงอยู่
+        self._versions = itertools.count(1)
+        self._titles: tuple[float, list[str]] | None = None   # (เวลาที่อ่าน, ชื่อทุก Sheet)
+
+    def get(self, sheet_name: str) -> _CacheEntry | None:
+        with self._lock:
+            return self._entries.get(sheet_name)
+
+    def _stamp(self, sheet_name: str, df: pd.DataFrame):
+        # เลขเวอร์ชันของข้อมูลชุดนี้ ติดไปกับทุก copy ที่ load_sheet คืนให้ (ดู data_version)
+        version = f"{sheet_name}:{next(self._versions)}"
+        df.attrs["sheet_version"] = version
+        self._history[version] = df
+        while len(self._history) > CACHE_HISTORY:
+            self._history.popitem(last=False)
+
+    def put(self, sheet_name: str, df: pd.DataFrame, revision: str | None, full_at: float | None = None):
+        """full_at = None: โหลดมาทั้ง Sheet / ไม่งั้นเวลาโหลดทั้ง Sheet ครั้งก่อน (ได้มาจาก sync เฉพาะแถว)"""
+        with self._lock:
+            now = time.monotonic()
+            self._stamp(sheet_name, df)
+            self._entries[sheet_name] = _CacheEntry(df, revision, now, now if full_at is None else full_at)
+            self._snapshots[sheet_name] = df
+
+    def put_local(self, sheet_name: str, df: pd.DataFrame):
+        """
+        ข้อมูลที่เพิ่งส่งเข้าคิวเขียน (ยังไม่ถึง Sheet) ให้ทุก session เห็นทันที
+        ไม่แตะ snapshot เพราะใน Sheet จริงยังเป็นข้อมูลเดิมอยู่
+        """
+        with self._lock:
+            entry = self._entries.get(sheet_name)
+            self._stamp(sheet_name, df)
+            now = time.monotonic()
+            self._entries[sheet_name] = _CacheEntry(
+                df, entry.revision if entry is not None else None, now,
+                entry.full_at if entry is not None else float("-inf"),
+            )
+
+    def base(self, version: str | None) -> pd.DataFrame | None:
+        """ข้อมูลชุดที่มีเลขเวอร์ชันนี้ (ถ้ายังเก็บไว้)"""
+        with self._lock:
+            return self._history.get(version) if version is not None else None
+
+    def snapshot(self, sheet_name: str) -> pd.DataFrame | None:
+        with self._lock:
+            return self._snapshots.get(sheet_name)
+
+    def set_snapshot(self, sheet_name: str, df: pd.DataFrame | None):
+        """None = ไม่รู้ตำแหน่งแถวใน Sheet แน่ชัดแล้ว (save ครั้งหน้าจะเขียนใหม่ทั้งหน้า)"""
+        with self._lock:
+            if df is None:
+                self._snapshots.pop(sheet_name, None)
+            else:
+                self._snapshots[sheet_name] = df
+
+    def expire(self, sheet_name: str):
+        """ให้ load ครั้งหน้าเช็คกับ Sheet ใหม่ แต่เก็บข้อมูลเดิมไว้ sync เฉพาะแถวที่เปลี่ยน"""
+        with self._lock:
+            entry = self._entries.get(sheet_name)
+            if entry is not None:
+                entry.revision = None
+                entry.checked_at = float("-inf")
+
+    def touch(self, sheet_name: str, revision: str | None = None):
+        """revision ยังเหมือนเดิม / sync แล้วไม่มีแถวไหนเปลี่ยน -> ต่ออายุ TTL (และจำ revision ใหม่)"""
+        with self._lock:
+            entry = self._entries.get(sheet_name)
+            if entry is not None:
+                entry.checked_at = time.monotonic()
+                if revision is not None:
+                    entry.revision = revision
+
+    def claim(self, sheet_names: list[str]) -> tuple[dict[str, Future], list[str]]:
+        """
+        จองการดึง Sheet (single-flight): คืน Future ของทุก Sheet
+        และรายชื่อ Sheet ที่ผู้เรียกต้องดึงเอง (ที่เหลือมีคนกำลังดึงอยู่ แค่รอ Future)
+        """
+        flights, lead = {}, []
+        with self._lock:
+            for name in sheet_names:
+                flight = self._flights.get(name)
+                if flight is None:
+                    flight = self._flights[name] = Future()
+                    lead.append(name)
+                flights[name] = flight
+        return flights, lead
+
+    def release(self, sheet_names: list[str]):
+        with self._lock:
+            for name in sheet_names:
+                self._flights.pop(name, None)
+
+    def titles(self, max_age: float) -> list[str] | None:
+        with self._lock:
+            if self._titles is None or time.monotonic() - self._titles[0] > max_age:
+                return None
+            return self._titles[1]
+
+    def set_titles(self, titles: list[str] | None):
+        with self._lock:
+            self._titles = None if titles is None else (time.monotonic(), titles)
+
+    def invalidate(self, sheet_name: str | None = None):
+        """ลบ cache ของ Sheet ที่ระบุ (ไม่ระบุ = ลบทั้งหมด)"""
+        with self._lock:
+            if sheet_name is None:
+                self._entries.clear()
+                self._titles = None
+            else:
+                self._entries.pop(sheet_name, None)
+
+
+@st.cache_resource
+def _get_sheet_cache() -> _SheetCache:
+    return _SheetCache()
+
+
+@st.cache_resource
+def _get_snapshot_store() -> SnapshotStore:
+    # backend ที่สลับมาใช้ (เช่น benchmark) ไม่เก็บ snapshot ลงดิสก์
+    return SnapshotStore("" if _backend_override is not None else SNAPSHOT_DIR)
+
+
+def _get_revision(sh: SheetBackend) -> str | None:
+    """อ่าน modifiedTime ของ Spreadsheet (ถ้าอ่านไม่ได้คืน None = ถือว่าเปลี่ยนแล้ว)"""
+    try:
+        # gspread 6 ใช้ get_lastUpdateTime(), gspread 5 ใช้ property lastUpdateTime
+        getter = getattr(sh, "get_lastUpdateTime", None)
+        return getter() if getter is not None else sh.lastUpdateTime
+    except gspread.exceptions.APIError:
+        return None
+
+
+def invalidate_cache(sheet_name: str | None = None):
+    """บังคับให้ load_sheet ครั้งถัดไปไปอ่านจาก Google Sheet ใหม่"""
+    _get_sheet_cache().invalidate(sheet_name)
+
+
+# ---------------------------------------------------------
+# LISTENERS (ให้โมดูลอื่นรู้เมื่อมีข้อมูลชุดใหม่ของ Sheet เช่น kpi_rollup)
+# ---------------------------------------------------------
+#   "load"   : fn(sheet_name, df)   โหลดข้อมูลชุดใหม่มาจาก Sheet (ไม่เรียกตอนคืนจาก cache)
+#   "save"   : fn(sheet_name, df)   save_sheet เขียน df ทั้งก้อนสำเร็จ (เขียนใหม่ทั้งหน้า)
+#   "patch"  : fn(sheet_name, old, new)  save_sheet / enqueue_save แก้เฉพาะบางแถวสำเร็จ
+#              old = แถวเดิมก่อนแก้, new = แถวเดียวกันหลังแก้ + แถวที่เพิ่มต่อท้าย
+#   "append" : fn(sheet_name, df)   append_rows เพิ่มแถว df สำเร็จ
+# listener ห้ามแก้ df ที่ได้รับ (เป็นตัวเดียวกับที่อยู่ใน cache)
+_listeners: dict[str, list] = {"load": [], "save": [], "append": [], "patch": []}
+
+
+def add_listener(event: str, fn):
+    """ลงทะเบียน listener (ลงซ้ำตัวเดิมได้ จะถูกเรียกครั้งเดียว)"""
+    if fn not in _listeners[event]:
+        _listeners[event].append(fn)
+
+
+def _notify(event: str, sheet_name: str, *frames: pd.DataFrame):
+    for fn in list(_listeners[event]):
+        fn(sheet_name, *frames)
+
+
+def data_version(df: pd.DataFrame) -> str | None:
+    """
+    เวอร์ชันของข้อมูลที่ได้จาก load_sheet (เปลี่ยนทุกครั้งที่โหลดข้อมูลชุดใหม่จาก Sheet)
+    ใช้เป็น key ของ cache ที่คำนวณจาก DataFrame เช่น index ค้นหา
+    """
+    return df.attrs.get("sheet_version")
+
+
+def _numericise_column(text: pd.Series) -> pd.Series:
+    """แบบเดิมของ get_all_records: แปลงทีละ cell ข้อความที่เป็นตัวเลขเป็น int/float"""
+    return pd.Series(numericise_all(text.tolist()), index=text.index, name=text.name)
+
+
+def _typed_column(text: pd.Series, kind: str) -> pd.Series | None:
+    """แปลงคอลัมน์ข้อความตามชนิดใน SHEET_SCHEMAS (None = แปลงแล้วกลับเป็นข้อความเดิมไม่ได้)"""
+    blank = text == ""
+    if kind == "str":
+        return text.astype(str)
+    if kind == "number":
+        values = pd.to_numeric(text.mask(blank), errors="coerce").astype(float)
+        return None if values.isna().sum() != blank.sum() else values
+    if kind == "date":
+        values = pd.to_datetime(text.mask(blank), format=DATE_FORMAT, errors="coerce")
+        if values.isna().sum() != blank.sum():
+            return None
+        return values if (values.dt.strftime(DATE_FORMAT).fillna("") == text).all() else None
+    if kind == "category":
+        known = SHEET_CATEGORIES.get(text.name, [])
+        observed = [v for v in pd.unique(text[~blank]) if v not in known]
+        return pd.Series(pd.Categorical(text.mask(blank), categories=known + sorted(observed)),
+                         index=text.index, name=text.name)
+    raise ValueError(f"ไม่รู้จักชนิดคอลัมน์ {kind!r}")
+
+
+def _typed_frame(sheet_name: str, cells: pd.DataFrame) -> pd.DataFrame:
+    """DataFrame ข้อความ (ตามที่อยู่ใน Sheet) -> DataFrame ที่แปลงชนิดแล้วตาม SHEET_SCHEMAS"""
+    schema = SHEET_SCHEMAS.get(_base_sheet(sheet_name), {})
+    columns = {}
+    for col in cells.columns:
+        text = cells[col].astype(object).where(cells[col].notna(), "").astype(str)
+        typed = _typed_column(text, schema[col]) if col in schema else None
+        columns[col] = typed if typed is not None else _numericise_column(text)
+    return pd.DataFrame(columns, index=cells.index)
+
+
+def _values_to_frame(values: list[list], sheet_name: str) -> pd.DataFrame:
+    """แปลงค่าดิบจาก Sheets API (แถวแรกเป็น header) เป็น DataFrame ที่แปลงชนิดตาม SHEET_SCHEMAS แล้ว"""
+    if len(values) < 2:
+        return pd.DataFrame()
+    header = values[0]
+    width = len(header)
+    rows = [(row + [""] * (width - len(row)))[:width] for row in values[1:]]
+    if len(set(header)) != width:
+        # header ซ้ำ -> แปลงทีละแถวแบบเดิม
+        return pd.DataFrame([numericise_all(row) for row in rows], columns=header)
+    return _typed_frame(sheet_name, pd.DataFrame(rows, columns=header, dtype=object))
+
+
+def _versioned(sheet_name: str) -> bool:
+    return _base_sheet(sheet_name) in VERSIONED_SHEETS
+
+
+def _version_cells(sheet_name: str, df: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    คอลัมน์ key ชุดที่ใช้ได้ + Row_Version ของ df (เป็นข้อความ) ไว้เทียบกับใน Sheet
+    None = เทียบไม่ได้ (ไม่มี Row_Version / ไม่มี key ที่ใช้ได้)
+    """
+    if (
+        not _versioned(sheet_name)
+        or ROW_VERSION_COLUMN not in df.columns
+        or not len(df)
+        or not df.columns.is_unique
+    ):
+        return None
+    key_sets = SHEET_KEYS.get(_base_sheet(sheet_name), [])
+    cols = list(dict.fromkeys(c for key_cols in key_sets for c in key_cols if c in df.columns))
+    cells = _to_cells(df[cols + [ROW_VERSION_COLUMN]])
+    key_cols = _row_keys(cells, sheet_name)
+    return cells[key_cols + [ROW_VERSION_COLUMN]] if key_cols is not None else None
+
+
+def _sync_cells(sheet_name: str, entry: _CacheEntry) -> pd.DataFrame | None:
+    """_version_cells ของข้อมูลใน cache ที่ sync เฉพาะแถวได้ (None = ต้องโหลดทั้ง Sheet)"""
+    if time.monotonic() - entry.full_at > SYNC_FULL_RELOAD_SECONDS:
+        return None
+    return _version_cells(sheet_name, entry.df)
+
+
+def _version_ranges(sheet_name: str, columns: list[str], old: pd.DataFrame) -> list[str]:
+    """ช่วงที่ต้องอ่านเพื่อเทียบกับ old (จาก _version_cells): header + คอลัมน์ key + Row_Version ทั้งคอลัมน์"""
+    ranges = [absolute_range_name(sheet_name, "1:1")]
+    for col in old.columns:
+        letter = rowcol_to_a1(1, columns.index(col) + 1)[:-1]
+        ranges.append(absolute_range_name(sheet_name, f"{letter}:{letter}"))
+    return ranges
+
+
+def _column_cells(values: list[list], n_rows: int) -> np.ndarray:
+    """ค่าจากช่วงคอลัมน์เดียว (เช่น C:C ไม่รวม header) -> array ข้อความยาว n_rows (cell ว่าง = "")"""
+    cells = [row[0] if row else "" for row in values[1:n_rows + 1]]
+    return np.array(cells + [""] * (n_rows - len(cells)), dtype=object)
+
+
+def _changed_rows(old: pd.DataFrame, header: list[str], columns: list[list]) -> list[int] | None:
+    """
+    เทียบคอลัมน์ key + Row_Version ที่อ่านมา (columns ตามลำดับคอลัมน์ของ old) กับข้อมูลใน cache
+    คืนตำแหน่งแถวที่ต้องดึงใหม่ (เลขเวอร์ชันเปลี่ยน + แถวใหม่ท้าย Sheet)
+    หรือ None ถ้าโครงสร้างเปลี่ยน (header / แถวถูกลบ-ย้าย) หรือเปลี่ยนเยอะจนโหลดทั้ง Sheet คุ้มกว่า
+    """
+    n_old = len(old)
+    n_new = max(len(values) for values in columns) - 1
+    if n_new < n_old:
+        return None
+    for col, values in zip(old.columns[:-1], columns):
+        if (_column_cells(values, n_new)[:n_old] != old[col].to_numpy()).any():
+            return None
+    versions = _column_cells(columns[-1], n_new)[:n_old]
+    changed = np.flatnonzero(versions != old[ROW_VERSION_COLUMN].to_numpy()).tolist()
+    changed += range(n_old, n_new)
+    if len(changed) > SYNC_MAX_CHANGED_FRACTION * n_new:
+        return None
+    return changed
+
+
+def _merge_rows(df: pd.DataFrame, positions: np.ndarray, fresh: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    แทนแถวตำแหน่ง positions ของ df ด้วยแถวของ fresh (ตำแหน่งที่เกินท้าย df = แถวใหม่ ต่อท้าย)
+    หมวดหมู่ของคอลัมน์ category เรียงแบบเดียวกับตอนโหลดทั้ง Sheet (ดู _typed_column)
+    คืน None ถ้าชนิดคอลัมน์ของ fresh ไม่ตรงกับ df
+    """
+    fresh = fresh.copy(deep=False)
+    categorical = []
+    for col in df.columns:
+        old, new = df[col].dtype, fresh[col].dtype
+        if isinstance(old, pd.CategoricalDtype) and isinstance(new, pd.CategoricalDtype):
+            categorical.append(col)
+        elif pd.api.types.is_datetime64_dtype(old) and pd.api.types.is_datetime64_dtype(new):
+            fresh[col] = fresh[col].astype(old)
+        elif old != new:
+            return None
+
+    merged = _share(df)
+    for col in categorical:
+        known = SHEET_CATEGORIES.get(col, [])
+        observed = set(df[col].cat.categories) | set(fresh[col].cat.categories)
+        categories = known + sorted(observed - set(known))
+        merged[col] = merged[col].cat.set_categories(categories)
+        fresh[col] = fresh[col].cat.set_categories(categories)
+
+    inside = positions < len(df)
+    if inside.any():
+        for j in range(df.shape[1]):
+            merged.iloc[positions[inside], j] = fresh.iloc[np.flatnonzero(inside), j].to_numpy()
+    if not inside.all():
+        merged = pd.concat([merged, fresh[~inside]], ignore_index=True)
+
+    for col in categorical:
+        # ตัดหมวดหมู่ที่ไม่มีแถวไหนใช้แล้ว (ยกเว้นที่อยู่ใน SHEET_CATEGORIES)
+        known = SHEET_CATEGORIES.get(col, [])
+        codes = merged[col].cat.codes.to_numpy()
+        categories = merged[col].cat.categories
+        used = categories[np.unique(codes[codes >= 0])]
+        keep = known + [c for c in used if c not in known]
+        if len(keep) != len(categories):
+            merged[col] = merged[col].cat.set_categories(keep)
+    return merged
+
+
+def _sync_sheets(sh: SheetBackend, candidates: dict[str, tuple[_CacheEntry, pd.DataFrame]]) -> dict[str, pd.DataFrame | None]:
+    """
+    sync เฉพาะแถวที่เปลี่ยนของ Sheet ที่มี Row_Version (batchGet 2 ครั้งรวมทุก Sheet)
+      1) header + คอลัมน์ key + Row_Version
+      2) เฉพาะช่วงแถวที่เลขเวอร์ชันเปลี่ยน / แถวใหม่ท้าย Sheet
+    แล้วแทนแถวเหล่านั้นในข้อมูลเดิม คืน {ชื่อ Sheet: DataFrame ใหม่ | None = ไม่มีแถวไหนเปลี่ยน}
+    เฉพาะ Sheet ที่ sync ได้ (ที่เหลือต้องโหลดทั้ง Sheet)
+    """
+    ranges = []
+    for name, (entry, old) in candidates.items():
+        ranges.extend(_version_ranges(name, entry.df.columns.tolist(), old))
+    value_ranges = iter(sh.values_batch_get(ranges).get("valueRanges", []))
+
+    plans: dict[str, list[tuple[int, int]]] = {}
+    for name, (entry, old) in candidates.items():
+        header = (next(value_ranges, {}).get("values") or [[]])[0]
+        columns = [next(value_ranges, {}).get("values", []) for _ in old.columns]
+        changed = _changed_rows(old, header, columns) if header == entry.df.columns.tolist() else None
+        if changed is not None:
+            plans[name] = row_runs(changed)
+    if sum(len(runs) for runs in plans.values()) > SYNC_MAX_RANGES:
+        return {}
+
+    result: dict[str, pd.DataFrame | None] = {name: None for name, runs in plans.items() if not runs}
+    plans = {name: runs for name, runs in plans.items() if runs}
+    if not plans:
+        return result
+    resp = sh.values_batch_get([
+        # +1 header, +1 เริ่มนับที่ 1
+        absolute_range_name(name, f"{first + 2}:{last + 2}") for name, runs in plans.items() for first, last in runs
+    ])
+    value_ranges = iter(resp.get("valueRanges", []))
+
+    telemetry = get_telemetry()
+    for name, runs in plans.items():
+        df = candidates[name][0].df
+        width = df.shape[1]
+        rows, positions = [], []
+        for first, last in runs:
+            values = next(value_ranges, {}).get("values", [])
+            values += [[]] * (last - first + 1 - len(values))
+            rows.extend((row + [""] * (width - len(row)))[:width] for row in values)
+            positions.extend(range(first, last + 1))
+        with telemetry.timer("parse", name):
+            positions = np.array(positions)
+            cells = pd.DataFrame(rows, columns=df.columns, dtype=object)
+            merged = _merge_rows(df, positions, _typed_frame(name, cells))
+            if merged is None:
+                # ชนิดคอลัมน์ของแถวที่ดึงมาไม่ตรงกับของเดิม -> แปลงชนิดใหม่ทั้ง Sheet
+                merged = _typed_frame(name, _merge_rows(_to_cells(df).astype(object), positions, cells))
+            result[name] = merged
+        telemetry.count("rows_loaded", name, len(rows))
+    return result
+
+
+def _fetch_sheets(sheet_names: list[str]) -> dict[str, pd.DataFrame]:
+    """
+    ดึง Sheet ที่ขอ แยกตาม Spreadsheet ที่เก็บ (shard อยู่คนละ Spreadsheet)
+    หลาย Spreadsheet -> ดึงพร้อมกันใน thread pool (ไม่เกิน SHARD_FETCH_WORKERS)
+    คืน DataFrame ตัวที่อยู่ใน cache (ห้ามแก้ในตัว)
+    """
+    groups: dict[str | None, list[str]] = {}
+    for name in sheet_names:
+        groups.setdefault(_shard_spreadsheet(name), []).append(name)
+    if len(groups) == 1:
+        return _fetch_spreadsheet(_backend_for(sheet_names[0]), sheet_names)
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+
+    def fetch(names: list[str]) -> dict[str, pd.DataFrame]:
+        add_script_run_ctx(threading.current_thread(), ctx)   # telemetry นับเข้าหน้าที่เรียก
+        return _fetch_spreadsheet(_backend_for(names[0]), names)
+
+    result: dict[str, pd.DataFrame] = {}
+    workers = min(SHARD_FETCH_WORKERS, len(groups))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-fetch") as pool:
+        for fetched in pool.map(fetch, groups.values()):
+            result.update(fetched)
+    return result
+
+
+def _fetch_spreadsheet(sh: SheetBackend, sheet_names: list[str]) -> dict[str, pd.DataFrame]:
+    """
+    Sheet ใน Spreadsheet เดียวกัน: เช็ค revision แล้วดึง Sheet ที่เปลี่ยนรวมกันใน values.batchGet ครั้งเดียว
+    Sheet ที่มี Row_Version จะ sync เฉพาะแถวที่เปลี่ยนก่อน (ดู _sync_sheets)
+    """
+    cache = _get_sheet_cache()
+    revision = _get_revision(sh)
+    result: dict[str, pd.DataFrame] = {}
+
+    telemetry = get_telemetry()
+    to_fetch = []
+    candidates: dict[str, tuple[_CacheEntry, pd.DataFrame]] = {}
+    for name in sheet_names:
+        entry = cache.get(name)
+        if entry is not None and revision is not None and revision == entry.revision:
+            cache.touch(name)
+            telemetry.count("cache_revalidated", name)
+            result[name] = entry.df
+            continue
+        old = _sync_cells(name, entry) if entry is not None else None
+        if old is not None:
+            candidates[name] = (entry, old)
+        else:
+            to_fetch.append(name)
+
+    synced = _sync_sheets(sh, candidates) if candidates else {}
+    for name, (entry, _) in candidates.items():
+        if name not in synced:
+            to_fetch.append(name)
+        elif synced[name] is None:
+            cache.touch(name, revision)
+            telemetry.count("cache_revalidated", name)
+            result[name] = entry.df
+        else:
+            df = synced[name]
+            cache.put(name, df, revision, full_at=entry.full_at)
+            telemetry.count("cache_synced", name)
+            _notify("load", name, df)
+            _save_snapshot(name, df, revision, time.time() - (time.monotonic() - entry.full_at))
+            result[name] = df
+
+    for name in to_fetch:
+        telemetry.count("cache_miss", name)
+    if to_fetch:
+        resp = sh.values_batch_get([absolute_range_name(name) for name in to_fetch])
+        for name, value_range in zip(to_fetch, resp.get("valueRanges", [])):
+            values = value_range.get("values", [])
+            with telemetry.timer("parse", name):
+                df = _values_to_frame(values, name)
+            telemetry.count("rows_loaded", name, max(len(values) - 1, 0))
+            cache.put(name, df, revision)
+            _notify("load", name, df)
+            _save_snapshot(name, df, revision, time.time())
+            result[name] = df
+
+    return result
+
+
+# ---------------------------------------------------------
+# SNAPSHOT บนดิสก์ (เปิดแอปใหม่แสดงข้อมูลล่าสุดได้ทันที แล้วค่อยเช็คกับ Sheet เบื้องหลัง)
+# ---------------------------------------------------------
+def _save_snapshot(sheet_name: str, df: pd.DataFrame, revision: str | None, full_at: float):
+    """full_at = เวลา (time.time()) ที่โหลดทั้ง Sheet ครั้งล่าสุด ใช้นับ SYNC_FULL_RELOAD_SECONDS ต่อหลัง restart"""
+    if revision is None:
+        return
+    meta = {"revision": revision, "saved_at": time.time(), "full_at": full_at}
+    _get_snapshot_store().save_later(sheet_name, df, meta)
+
+
+def _restore_snapshot(sheet_name: str) -> _CacheEntry | None:
+    """
+    ใส่ข้อมูลจาก snapshot บนดิสก์เข้า cache (ครั้งแรกของ process เท่านั้น)
+    ไม่ใช้เป็นฐานของงานเขียน: save ครั้งแรกจะอ่านของจริงจาก Sheet ก่อนเสมอ
+    """
+    restored = _get_snapshot_store().load(sheet_name, SNAPSHOT_MAX_AGE_SECONDS)
+    if restored is None:
+        return None
+    df, meta = restored
+    cache = _get_sheet_cache()
+    full_at = time.monotonic() - max(time.time() - meta["full_at"], 0.0)
+    cache.put(sheet_name, df, meta["revision"], full_at=full_at)
+    cache.set_snapshot(sheet_name, None)
+    get_telemetry().count("cache_restored", sheet_name)
+    _notify("load", sheet_name, df)
+    return cache.get(sheet_name)
+
+
+def _revalidate_in_background(sheet_names: list[str]):
+    """เช็ค Sheet ที่เพิ่ง restore จาก snapshot กับ Google (revision เดิม = ใช้ต่อ / เปลี่ยน = sync หรือโหลดใหม่)"""
+    cache = _get_sheet_cache()
+
+    def run():
+        flights, lead = cache.claim(sheet_names)
+        if not lead:
+            return
+        try:
+            fetched = _fetch_sheets(lead)
+        except Exception as e:
+            for name in lead:
+                flights[name].set_exception(e)
+            # ไม่สำเร็จ (เช่น ติด quota) -> ใช้ข้อมูลจาก snapshot ไปจนหมด TTL แล้ว load_sheet จะเช็คใหม่เอง
+        else:
+            for name in lead:
+                flights[name].set_result(fetched[name])
+        finally:
+            cache.release(lead)
+
+    threading.Thread(target=run, name="snapshot-revalidate", daemon=True).start()
+
+
+def load_sheets(sheet_names: list[str], combine_shards: bool = True) -> dict[str, pd.DataFrame]:
+    """
+    อ่านหลาย Sheet พร้อมกันเป็น dict {ชื่อ Sheet: DataFrame}
+    Sheet ที่ cache หมดอายุ/revision เปลี่ยน จะดึงรวมกันใน values.batchGet ครั้งเดียว
+    ถ้า session อื่นกำลังดึง Sheet เดียวกันอยู่ จะรอใช้ผลของ session นั้นแทนการดึงซ้ำ
+    DataFrame ที่คืนเป็น copy แบบ Copy-on-Write ใช้ข้อมูลร่วมกับ cache จนกว่าจะถูกแก้
+    Sheet ที่แบ่ง shard (SHEET_SHARDS) คืนทุก shard ต่อกัน
+    combine_shards=False : คืนแยกตามที่เก็บจริง ("PR_PO" = เฉพาะส่วนใน Spreadsheet หลัก, "PR_PO@2024", ...)
+    """
+    with get_telemetry().timer("load_sheets", sheet_io=True):
+        if not combine_shards:
+            return _load_sheets(sheet_names)
+        parts = {name: [name] + shard_partitions(name) for name in sheet_names}
+        loaded = _load_sheets([part for names in parts.values() for part in names])
+        return {
+            name: loaded[name] if len(names) == 1 else _combine_shards({part: loaded[part] for part in names})
+            for name, names in parts.items()
+        }
+
+
+def _load_sheets(sheet_names: list[str]) -> dict[str, pd.DataFrame]:
+    cache = _get_sheet_cache()
+    telemetry = get_telemetry()
+    now = time.monotonic()
+    result: dict[str, pd.DataFrame] = {}
+
+    queue = _get_write_queue()
+    stale, restored = [], []
+    for name in dict.fromkeys(sheet_names):
+        entry = cache.get(name)
+        if entry is None:
+            entry = _restore_snapshot(name)
+            if entry is not None:
+                restored.append(name)
+                result[name] = entry.df
+                continue
+        ttl = ARCHIVE_CACHE_TTL_SECONDS if archive_base(name) else CACHE_TTL_SECONDS
+        # Sheet ที่ยังมีงานเขียนค้างในคิว ใช้ข้อมูลใน cache (ที่ใส่ค่าใหม่ไว้ล่วงหน้าแล้ว) ไปก่อน
+        if entry is not None and (now - entry.checked_at < ttl or queue.has_pending(name)):
+            telemetry.count("cache_hit", name)
+            result[name] = entry.df
+        else:
+            stale.append(name)
+
+    if stale:
+        flights, lead = cache.claim(stale)
+        for name in stale:
+            if name not in lead:
+                telemetry.count("cache_shared", name)   # รอผลจาก session อื่นที่กำลังดึงอยู่
+        if lead:
+            try:
+                fetched = _fetch_sheets(lead)
+            except BaseException as e:
+                for name in lead:
+                    flights[name].set_exception(e)
+                raise
+            else:
+                for name in lead:
+                    flights[name].set_result(fetched[name])
+            finally:
+                cache.release(lead)
+        for name in stale:
+            result[name] = flights[name].result()
+
+    if restored:
+        _revalidate_in_background(restored)
+    return {name: _share(result[name]) for name in sheet_names}
+
+
+def load_sheet(sheet_name: str, include_archive: bool = False) -> pd.DataFrame:
+    """
+    อ่านข้อมูลทั้ง Sheet มาเป็น DataFrame
+    (ใช้ cache ร่วมกันทุก session จะโหลดใหม่เฉพาะเมื่อ Spreadsheet ถูกแก้ไข)
+    include_archive=True : ต่อแถวจาก Sheet เก็บถาวรทุกช่วงเวลาท้าย Sheet หลัก (ดูอย่างเดียว บันทึกกลับไม่ได้)
+    """
+    if not include_archive:
+        return load_sheets([sheet_name])[sheet_name]
+    names = [sheet_name] + shard_partitions(sheet_name) + archive_partitions(sheet_name)
+    sheets = load_sheets(names, combine_shards=False)
+    return _concat_partitions([sheets[name] for name in names], names)
+
+
+def iter_sheet_chunks(sheet_name: str, chunk_rows: int, include_archive: bool = False) -> Iterator[pd.DataFrame]:
+    """
+    อ่าน Sheet ทีละช่วงแถว (ไม่เกิน chunk_rows แถว) รวม shard และ Sheet เก็บถาวร (include_archive=True)
+    ใช้กับงานที่ไล่อ่านทั้งประวัติทีเดียว เช่น รายงานส่งออก (reports.py)
+    - ส่วนที่อยู่ใน cache อยู่แล้ว (เช่น Sheet หลัก): เช็ค revision ผ่าน load_sheets แล้วแบ่งเป็น view (ห้ามแก้)
+    - ส่วนที่ยังไม่อยู่ใน cache (ปกติคือ Sheet เก็บถาวร): ดึงทีละช่วงแถวด้วย values.get
+      แปลงชนิดทีละช่วง ไม่เก็บลง cache ผู้เรียกใช้เสร็จแล้วทิ้งได้ หน่วยความจำไม่โตตามประวัติ
+    """
+    names = [sheet_name] + shard_partitions(sheet_name)
+    if include_archive:
+        names += archive_partitions(sheet_name)
+    cache = _get_sheet_cache()
+    for name in names:
+        if cache.get(name) is None:
+            yield from _stream_rows(name, chunk_rows)
+            continue
+        df = load_sheets([name], combine_shards=False)[name]
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+def _stream_rows(sheet_name: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """ดึง Sheet ทีละ chunk_rows แถว (แถว 2-N, N+1-..., จนได้ช่วงว่าง) index = ลำดับแถวแบบ load_sheet"""
+    sh = _backend_for(sheet_name)
+    header = _sheet_header(sh, sheet_name)
+    if not header:
+        return
+    telemetry = get_telemetry()
+    first = 2
+    while True:
+        last = first + chunk_rows - 1
+        values = sh.values_get(absolute_range_name(sheet_name, f"{first}:{last}")).get("values", [])
+        if not values:
+            return
+        with telemetry.timer("parse", sheet_name):
+            df = _values_to_frame([header] + values, sheet_name)
+        df.index = pd.RangeIndex(first - 2, first - 2 + len(df))
+        telemetry.count("rows_loaded", sheet_name, len(values))
+        yield df
+        first = last + 1
+
+
+# ---------------------------------------------------------
+# WRITE (เขียนเฉพาะ cell ที่เปลี่ยนเทียบกับข้อมูลชุดที่หน้าเว็บโหลดไป)
+# ---------------------------------------------------------
+def _cell_text(value) -> str:
+    """แปลงค่า 1 cell เป็นข้อความที่จะเขียนลง Sheet (5.0 -> "5", วันที่ -> YYYY-MM-DD ให้ตรงกับค่าที่อ่านมา)"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, pd.Timestamp):
+        return value.strftime(DATE_FORMAT) if value == value.normalize() else value.isoformat(sep=" ")
+    return str(value)
+
+
+def _column_text(col: pd.Series) -> pd.Series:
+    """_cell_text ทั้งคอลัมน์ (คอลัมน์ที่ชนิดแน่นอนจาก SHEET_SCHEMAS แปลงแบบ vectorized)"""
+    blank = col.isna()
+    if pd.api.types.is_float_dtype(col.dtype):
+        values = col.to_numpy(dtype=float, na_value=np.nan)
+        integral = np.isfinite(values) & (np.mod(values, 1) == 0)
+        small = integral & (np.abs(values) < 2 ** 53)
+        text = col.astype(object).map(str).to_numpy()
+        text[small] = values[small].astype(np.int64).astype(str)
+        text[integral & ~small] = [str(int(v)) for v in values[integral & ~small]]
+        text[blank.to_numpy()] = ""
+        return pd.Series(text, index=col.index, name=col.name, dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(col.dtype) and (col.dropna() == col.dropna().dt.normalize()).all():
+        return col.dt.strftime(DATE_FORMAT).astype(object).where(~blank, "")
+    if isinstance(col.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+        return col.astype(object).where(~blank, "").map(str)
+    return col.astype(object).where(~blank, "").map(_cell_text)
+
+
+def _to_cells(df: pd.DataFrame) -> pd.DataFrame:
+    """แปลงทั้ง DataFrame เป็นข้อความ (NaN -> "") แบบเดียวกับที่เขียนลง Sheet"""
+    return pd.DataFrame({i: _column_text(df.iloc[:, i]) for i in range(df.shape[1])},
+                        index=df.index).set_axis(df.columns, axis=1)
+
+
+def _row_keys(cells: pd.DataFrame, sheet_name: str) -> list[str] | None:
+    """เลือกชุดคอลัมน์ key ที่มีครบ ไม่ว่าง และไม่ซ้ำกัน (ไม่มีเลย = None)"""
+    for key_cols in SHEET_KEYS.get(_base_sheet(sheet_name), []):
+        if not all(c in cells.columns for c in key_cols):
+            continue
+        keys = cells[key_cols]
+        if (keys == "").to_numpy().any() or keys.duplicated().any():
+            continue
+        return key_cols
+    return None
+
+
+def _diff_patch(sheet_name: str, old: pd.DataFrame, new: pd.DataFrame) -> dict | None:
+    """
+    เทียบ new กับข้อมูลชุดที่หน้าเว็บโหลดไป old (ทั้งคู่ผ่าน _to_cells แล้ว และคอลัมน์ตรงกัน)
+    คืน patch {"key_cols", "rows": [[key, {คอลัมน์: ค่า}, Row_Version]], "appends": [{คอลัมน์: ค่า}]}
+    key = ค่าคอลัมน์ key ของแถว หรือเลขลำดับแถวถ้า Sheet ไม่มี key ที่ใช้ได้
+    Row_Version (เฉพาะ Sheet ที่มีคอลัมน์นี้) = เลขของแถวใน new คือเลขที่หน้าเว็บโหลดไป
+    ตัวเขียนจะแก้แถวนั้นก็ต่อเมื่อเลขใน Sheet ยังเท่าเดิม (compare-and-swap)
+    หรือ None ถ้ามีแถวเดิมหายไป (ต้องเขียนใหม่ทั้ง Sheet)
+    """
+    key_cols = _row_keys(old, sheet_name)
+    if key_cols is not None and _row_keys(new, sheet_name) == key_cols:
+        old_keys = pd.MultiIndex.from_frame(old[key_cols])
+        new_keys = pd.MultiIndex.from_frame(new[key_cols])
+        positions = old_keys.get_indexer(new_keys)
+    else:
+        # ไม่มี key ที่ใช้ได้ -> จับคู่ตามลำดับแถว (frame ที่หน้าเว็บแก้มายังเรียงตามที่ load มา)
+        key_cols = None
+        if len(new) < len(old):
+            return None
+        positions = np.arange(len(new))
+        positions[len(old):] = -1
+
+    matched = positions >= 0
+    if matched.sum() != len(old):
+        return None
+
+    old_rows = positions[matched]
+    new_values = new.to_numpy()
+    matched_values = new_values[matched]
+    changed = old.to_numpy()[old_rows] != matched_values
+    columns = new.columns.tolist()
+    version_col = columns.index(ROW_VERSION_COLUMN) if _versioned(sheet_name) and ROW_VERSION_COLUMN in columns else None
+    if version_col is not None:
+        changed[:, version_col] = False   # เลขเวอร์ชันตัวเขียนเป็นคนเพิ่ม ไม่นับเป็นการแก้
+
+    old_keys = old[key_cols].to_numpy().tolist() if key_cols else None
+    rows = []
+    for i in np.flatnonzero(changed.any(axis=1)):
+        r = int(old_rows[i])
+        key = old_keys[r] if key_cols else r
+        row = [key, {columns[j]: matched_values[i, j] for j in np.flatnonzero(changed[i])}]
+        if version_col is not None:
+            row.append(matched_values[i, version_col])
+        rows.append(row)
+
+    appends = [dict(zip(columns, row)) for row in new_values[~matched].tolist()]
+    return {"key_cols": key_cols, "rows": rows, "appends": appends}
+
+
+def _add_rows(frame: pd.DataFrame, rows: list[dict]) -> pd.DataFrame:
+    """ต่อแถวใหม่ (dict) ท้าย frame ตามคอลัมน์ของ frame (ไม่มีค่า = "")"""
+    if not rows:
+        return frame
+    new = pd.DataFrame([[row.get(c, "") for c in frame.columns] for row in rows],
+                       columns=frame.columns)
+    if ROW_VERSION_COLUMN in new.columns:
+        new[ROW_VERSION_COLUMN] = "1"
+    return pd.concat([frame, new], ignore_index=True)
+
+
+def _apply_patch(frame: pd.DataFrame, patch: dict):
+    """
+    ใส่ patch จาก _diff_patch ลงใน frame (แก้ในตัว + ต่อแถวใหม่ท้าย)
+    แถวที่ Row_Version ใน frame ไม่ตรงกับที่ patch คาดไว้ = มีคนแก้ไปก่อน ข้ามทั้งแถว
+    แถวที่แก้ได้ เพิ่ม Row_Version ทันที (งานถัดไปในรอบเดียวกันเทียบกับเลขใหม่)
+    คืน (frame, {ตำแหน่งแถว: {ตำแหน่งคอลัมน์ที่แก้}}, key ของแถวที่หาไม่เจอ, key ของแถวที่ชนกัน)
+    """
+    key_cols = patch["key_cols"]
+    keys = [row[0] for row in patch["rows"]]
+    if not keys:
+        positions = []
+    elif key_cols:
+        if not all(c in frame.columns for c in key_cols):
+            return frame, {}, keys, []
+        # key ซ้ำใน Sheet -> ใช้แถวแรก
+        index = pd.MultiIndex.from_frame(frame[key_cols].astype(str))
+        lookup = pd.Series(np.arange(len(frame)), index=index)
+        lookup = lookup[~lookup.index.duplicated()]
+        wanted = pd.MultiIndex.from_tuples([tuple(str(k) for k in key) for key in keys], names=key_cols)
+        positions = lookup.reindex(wanted).fillna(-1).astype(int).tolist()
+    else:
+        positions = [k if k < len(frame) else -1 for k in keys]
+
+    changed: dict[int, set[int]] = {}
+    missing, conflicts = [], []
+    column_pos = {col: j for j, col in enumerate(frame.columns)}
+    version_col = column_pos.get(ROW_VERSION_COLUMN)
+    versions: dict[int, str] = {}   # ตำแหน่งแถว -> Row_Version ใหม่
+    updates: dict[int, tuple[list, list]] = {}   # ตำแหน่งคอลัมน์ -> (แถว, ค่า) ใส่ทีละคอลัมน์
+    for row, pos in zip(patch["rows"], positions):
+        key, cells = row[0], row[1]
+        if pos < 0 or not all(col in column_pos for col in cells):
+            missing.append(key)
+            continue
+        if version_col is not None and len(row) > 2:
+            current = versions.get(pos, frame.iat[pos, version_col])
+            if row[2] != "" and row[2] != current:
+                # ค่าที่จะเขียนตรงกับใน Sheet อยู่แล้ว = ไม่มีอะไรต้องเขียน ไม่นับว่าชนกัน
+                if any(frame.iat[pos, column_pos[col]] != value for col, value in cells.items()):
+                    conflicts.append(key)
+                continue
+            versions[pos] = str(_version_number(current) + 1)
+        for col, value in cells.items():
+            j = column_pos[col]
+            rows, values = updates.setdefault(j, ([], []))
+            rows.append(int(pos))
+            values.append(value)
+            changed.setdefault(int(pos), set()).add(j)
+
+    for j, (rows, values) in updates.items():
+        frame.iloc[rows, j] = values
+    if versions:
+        frame.iloc[list(versions), version_col] = list(versions.values())
+        for pos in versions:
+            changed[pos].add(version_col)
+
+    return _add_rows(frame, patch["appends"]), changed, missing, conflicts
+
+
+def _delete_rows(frame: pd.DataFrame, payload: dict):
+    """ลบแถวที่ key ตรงกับ payload["keys"] คืน (frame ใหม่, key ที่หาไม่เจอ)"""
+    key_cols, keys = payload["key_cols"], payload["keys"]
+    if not keys:
+        return frame, []
+    if not all(c in frame.columns for c in key_cols):
+        return frame, keys
+    index = pd.MultiIndex.from_frame(frame[key_cols].astype(str))
+    wanted = pd.MultiIndex.from_tuples([tuple(str(k) for k in key) for key in keys], names=key_cols)
+    missing = [key for key, found in zip(keys, wanted.isin(index)) if not found]
+    return frame[~index.isin(wanted)].reset_index(drop=True), missing
+
+
+def _version_number(text) -> int:
+    """Row_Version (ข้อความใน Sheet) -> int (ว่าง / อ่านไม่ออก = 0)"""
+    try:
+        return int(float(text))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _version_numbers(col: pd.Series) -> np.ndarray:
+    return pd.to_numeric(col, errors="coerce").fillna(0).astype(int).to_numpy()
+
+
+def _matched_rows(sheet_name: str, before: pd.DataFrame, after: pd.DataFrame) -> np.ndarray:
+    """ตำแหน่งใน before ของแต่ละแถวใน after (จับคู่ด้วย key ถ้ามี ไม่งั้นตามลำดับ) -1 = แถวใหม่"""
+    key_cols = _row_keys(after, sheet_name)
+    if key_cols is not None and all(c in before.columns for c in key_cols) and not before[key_cols].duplicated().any():
+        return pd.MultiIndex.from_frame(before[key_cols]).get_indexer(pd.MultiIndex.from_frame(after[key_cols]))
+    positions = np.arange(len(after))
+    positions[positions >= len(before)] = -1
+    return positions
+
+
+def _rewrite_conflicts(sheet_name: str, state: pd.DataFrame, new: pd.DataFrame) -> list:
+    """
+    งานเขียนใหม่ทั้งหน้า: แถวที่ Row_Version ใน new (เลขที่หน้าเว็บโหลดไป) ไม่ตรงกับใน Sheet ตอนนี้
+    และเนื้อหาต่างกัน = มีคนแก้แถวนั้นไปก่อน -> ใช้แถวใน Sheet แทน (แก้ new ในตัว) คืน key ของแถวเหล่านั้น
+    """
+    if ROW_VERSION_COLUMN not in state.columns or ROW_VERSION_COLUMN not in new.columns:
+        return []
+    key_cols = _row_keys(new, sheet_name)
+    if key_cols is None:
+        return []
+    positions = _matched_rows(sheet_name, state, new)
+    matched = np.flatnonzero(positions >= 0)
+    common = [c for c in new.columns if c in state.columns and c != ROW_VERSION_COLUMN]
+    ours = new[common].to_numpy()[matched]
+    theirs = state[common].to_numpy()[positions[matched]]
+    expected = new[ROW_VERSION_COLUMN].to_numpy()[matched]
+    current = state[ROW_VERSION_COLUMN].to_numpy()[positions[matched]]
+    stale = matched[(expected != "") & (expected != current) & (ours != theirs).any(axis=1)]
+    if not len(stale):
+        return []
+    cols = common + [ROW_VERSION_COLUMN]
+    new.iloc[stale, [new.columns.get_loc(c) for c in cols]] = (
+        state.iloc[positions[stale], [state.columns.get_loc(c) for c in cols]].to_numpy()
+    )
+    return new[key_cols].iloc[stale].to_numpy().tolist()
+
+
+def _bump_versions(sheet_name: str, before: pd.DataFrame, after: pd.DataFrame):
+    """
+    เขียนใหม่ทั้งหน้า: ตั้ง Row_Version ของ after (แก้ในตัว) เทียบกับ before (ข้อมูลใน Sheet ก่อนรอบนี้)
+    แถวที่เนื้อหาเปลี่ยน = เลขเดิม + 1, แถวใหม่ = 1, แถวที่งาน patch ในรอบนี้เพิ่มเลขไปแล้วคงไว้
+    """
+    positions = _matched_rows(sheet_name, before, after)
+    matched = positions >= 0
+    common = [c for c in after.columns if c in before.columns and c != ROW_VERSION_COLUMN]
+    changed = ~matched
+    if set(common) != set(after.columns) - {ROW_VERSION_COLUMN}:
+        changed[:] = True   # มีคอลัมน์ใหม่ = ทุกแถวเปลี่ยน
+    elif common and matched.any():
+        changed[matched] = (
+            after[common].to_numpy()[matched] != before[common].to_numpy()[positions[matched]]
+        ).any(axis=1)
+
+    if ROW_VERSION_COLUMN in before.columns:
+        old_versions = _version_numbers(before[ROW_VERSION_COLUMN])
+    else:
+        old_versions = np.zeros(len(before), dtype=int)
+    previous = np.where(matched, old_versions[np.maximum(positions, 0)] if len(before) else 0, 0)
+    current = _version_numbers(after[ROW_VERSION_COLUMN])
+    versions = np.where(changed | (previous == 0), previous + 1, previous)
+    versions = np.where(current > previous, current, versions)
+    after[ROW_VERSION_COLUMN] = versions.astype(str).tolist()
+
+
+def _snapshot_current(sh: SheetBackend, sheet_name: str, snapshot: pd.DataFrame) -> bool:
+    """
+    key + Row_Version ใน Sheet จริงยังตรงกับ snapshot หรือไม่ (อ่านแค่ header + 2-3 คอลัมน์)
+    ไม่ตรง = มีการเขียนจากที่อื่น (process อื่น) ต้องอ่านทั้ง Sheet มาเป็นฐาน compare-and-swap
+    """
+    old = _version_cells(sheet_name, snapshot)
+    if old is None:
+        return True
+    columns = snapshot.columns.tolist()
+    value_ranges = sh.values_batch_get(_version_ranges(sheet_name, columns, old)).get("valueRanges", [])
+    header = (value_ranges[0].get("values") or [[]])[0] if value_ranges else []
+    if header != columns:
+        return False
+    return _changed_rows(old, header, [v.get("values", []) for v in value_ranges[1:]]) == []
+
+
+def _rewrite_sheet(sh: SheetBackend, sheet_name: str, cells: pd.DataFrame, call=None):
+    """clear แล้วเขียน Header + ข้อมูลใหม่ทั้งหมด"""
+    call = call or (lambda fn, *args, **kwargs: fn(*args, **kwargs))
+    rows = [cells.columns.tolist()] + cells.values.tolist()
+    call(sh.values_clear, absolute_range_name(sheet_name))
+    call(
+        sh.values_update,
+        absolute_range_name(sheet_name),
+        params={"valueInputOption": "RAW"},
+        body={"values": rows},
+    )
+
+
+def _sheet_header(sh: SheetBackend, sheet_name: str) -> list[str]:
+    """header ของ Sheet (ใช้จาก snapshot ถ้ามี ไม่งั้นอ่านแถวแรกแถวเดียว)"""
+    snapshot = _get_sheet_cache().snapshot(sheet_name)
+    if snapshot is not None and len(snapshot.columns):
+        return snapshot.columns.tolist()
+    resp = sh.values_get(absolute_range_name(sheet_name, "1:1"))
+    values = resp.get("values", [])
+    return values[0] if values else []
+
+
+def _fetch_cells(sh: SheetBackend, sheet_name: str) -> pd.DataFrame:
+    """อ่านทั้ง Sheet เป็นข้อความตามที่อยู่ใน Sheet (ใช้เป็นฐานตอนไม่มี snapshot)"""
+    values = sh.values_get(absolute_range_name(sheet_name)).get("values", [])
+    if not values:
+        return pd.DataFrame()
+    header = values[0]
+    width = len(header)
+    rows = [(row + [""] * (width - len(row)))[:width] for row in values[1:]]
+    return pd.DataFrame(rows, columns=header, dtype=object)
+
+
+# ---------------------------------------------------------
+# WRITE-BEHIND QUEUE (หน้าเว็บส่งงานเขียนเข้าคิวแล้วไปต่อได้ทันที)
+# ---------------------------------------------------------
+# ตัวเขียนเบื้องหลัง 1 thread ต่อ process:
+#   - รวมงานในคิวของ Sheet เดียวกันเป็น values.batchUpdate 1 ครั้ง (+ values.append 1 ครั้ง)
+#   - จำกัดจำนวนครั้งเขียนต่อนาทีด้วย token bucket ตาม quota ของ Sheets API
+#   - 429 / 5xx / เน็ตหลุด -> รอแบบ backoff แล้วลองใหม่ ไม่เกิน WRITE_MAX_ATTEMPTS ครั้ง (เกิน = งานนั้น error)
+#   - ทุกงานถูกบันทึกลงไฟล์ journal ก่อนตอบรับ restart แล้วงานที่ค้างจะถูกส่งต่อ
+# งานในคิว (kind):
+#   "patch"   : cell ที่เปลี่ยน + แถวใหม่ จาก _diff_patch
+#   "rewrite" : เขียนใหม่ทั้ง Sheet {"columns", "rows"}
+#   "append"  : แถวใหม่ [{คอลัมน์: ค่า}]
+#   "delete"  : ลบแถวตาม key {"key_cols", "keys"} แล้วเขียนใหม่ทั้ง Sheet (ใช้ตอนย้ายไปเก็บถาวร)
+WRITE_QUOTA_PER_MINUTE = float(_secret("WRITE_QUOTA_PER_MINUTE", 60))
+WRITE_JOURNAL_PATH = _secret("WRITE_JOURNAL_PATH", ".cache/write_journal.jsonl")
+# รอรวมงานที่ตามมาติด ๆ กันกี่วินาทีก่อนเริ่มเขียน
+WRITE_BATCH_DELAY = float(_secret("WRITE_BATCH_DELAY_SECONDS", 0.2))
+# save_sheet / append_rows แบบรอผล รอได้นานสุดกี่วินาที (งานยังอยู่ในคิวต่อถ้าเกินเวลา)
+WRITE_WAIT_TIMEOUT = float(_secret("WRITE_WAIT_TIMEOUT_SECONDS", 120))
+WRITE_MAX_BACKOFF = 64
+# เรียก API ครั้งหนึ่งได้กี่ครั้งรวมที่ลองใหม่ (backoff 1, 2, 4, ... 64 วินาที: 8 ครั้ง ~ 2 นาที)
+# เกินแล้ว job ของ Sheet นั้นเป็น error ตัวเขียนไปทำงานของ Sheet อื่นต่อ ไม่ค้างทั้งคิว
+WRITE_MAX_ATTEMPTS = int(_secret("WRITE_MAX_ATTEMPTS", 8))
+
+
+class WriteError(Exception):
+    """งานเขียนในคิวล้มเหลวแบบลองใหม่ไม่ได้ (เช่น ชื่อ Sheet ผิด / หาแถวไม่เจอ)"""
+
+
+class WriteConflict(WriteError):
+    """บางแถวไม่ได้เขียน เพราะมีคนแก้แถวนั้นไปก่อน (Row_Version ไม่ตรงกับที่โหลดไป) keys = key ของแถวเหล่านั้น"""
+
+    def __init__(self, message: str, keys: list):
+        super().__init__(message)
+        self.keys = keys
+
+
+def _conflict_message(sheet_name: str, keys: list) -> str:
+    shown = [" / ".join(map(str, key)) if isinstance(key, list) else f"แถวที่ {key + 2}" for key in keys[:10]]
+    more = f" และอีก {len(keys) - 10} แถว" if len(keys) > 10 else ""
+    return (
+        f"มีคนแก้ {len(keys)} แถวใน {sheet_name} ไปก่อนที่คุณจะบันทึก จึงไม่ได้เขียนทับ "
+        f"(แถวอื่นบันทึกแล้ว): {', '.join(shown)}{more} — ดูข้อมูลล่าสุดแล้วแก้ใหม่อีกครั้ง"
+    )
+
+
+@dataclass
+class _WriteJob:
+    ticket: str
+    sheet: str
+    kind: str
+    payload: object
+
+
+class _TokenBucket:
+    """อนุญาตได้เฉลี่ย rate ครั้ง/นาที และ burst ได้ไม่เกิน capacity ครั้ง"""
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or max(1.0, rate_per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+
+def _is_transient(exc: Exception) -> bool:
+    if isinstance(exc, gspread.exceptions.APIError):
+        code = getattr(exc, "code", None) or getattr(exc.response, "status_code", 0)
+        return code == 429 or code >= 500
+    return isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+class _WriteQueue:
+    def __init__(self, journal_path: str | None, backend: SheetBackend | None = None):
+        self._backend = backend   # None = backend ตาม STORAGE_BACKEND
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._jobs: deque[_WriteJob] = deque()
+        self._pending: Counter = Counter()       # Sheet -> จำนวนงานที่ยังไม่เขียนเสร็จ
+        self._done: OrderedDict[str, str | None] = OrderedDict()   # ticket -> None หรือข้อความ error
+        self._conflicts: dict[str, list] = {}    # ticket -> key ของแถวที่ไม่ได้เขียนเพราะชนกัน
+        self._events: dict[str, threading.Event] = {}
+        self._bucket = _TokenBucket(WRITE_QUOTA_PER_MINUTE)
+        self._journal_path = journal_path
+        self._journal_lock = threading.Lock()
+        self._closed = False
+
+        if journal_path:
+            os.makedirs(os.path.dirname(journal_path) or ".", exist_ok=True)
+            for job in self._replay():
+                self._push(job, journal=False)
+
+        self._thread = threading.Thread(target=self._run, name="sheet-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- journal ----------
+    def _journal(self, record: dict):
+        if not self._journal_path:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._journal_lock, open(self._journal_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay(self) -> list[_WriteJob]:
+        """งานที่บันทึกไว้แต่ยังไม่ได้เขียน (จาก process ก่อน restart)"""
+        if not os.path.exists(self._journal_path):
+            return []
+        jobs: dict[str, _WriteJob] = {}
+        with open(self._journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue   # บรรทัดสุดท้ายเขียนไม่จบตอน process ตาย
+                if record.get("op") == "enqueue":
+                    jobs[record["ticket"]] = _WriteJob(
+                        record["ticket"], record["sheet"], record["kind"], record["payload"]
+                    )
+                elif record.get("op") == "done":
+                    jobs.pop(record["ticket"], None)
+        return list(jobs.values())
+
+    def _compact_journal(self):
+        """คิวว่างแล้ว -> ล้างไฟล์ journal (เรียกตอนถือ self._lock)"""
+        if self._journal_path and not self._jobs and not any(self._pending.values()):
+            with self._journal_lock:
+                tmp = self._journal_path + ".tmp"
+                open(tmp, "w").close()
+                os.replace(tmp, self._journal_path)
+
+    # ---------- ฝั่งหน้าเว็บ ----------
+    def _push(self, job: _WriteJob, journal: bool = True):
+        if journal:
+            self._journal({"op": "enqueue", "ticket": job.ticket, "sheet": job.sheet,
+                           "kind": job.kind, "payload": job.payload})
+        with self._wakeup:
+            self._jobs.append(job)
+            self._pending[job.sheet] += 1
+            self._events[job.ticket] = threading.Event()
+            self._wakeup.notify()
+
+    def submit(self, sheet_name: str, kind: str, payload) -> str:
+        ticket = uuid.uuid4().hex[:12]
+        self._push(_WriteJob(ticket, sheet_name, kind, payload))
+        return ticket
+
+    def has_pending(self, sheet_name: str) -> bool:
+        with self._lock:
+            return self._pending[sheet_name] > 0
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(self._pending.values())
+
+    def status(self, ticket: str) -> tuple[str, str | None]:
+        """("queued" | "done" | "conflict" | "error" | "unknown", ข้อความ error / conflict)"""
+        with self._lock:
+            if ticket in self._done:
+                error = self._done[ticket]
+                if ticket in self._conflicts:
+                    return "conflict", error
+                return ("error" if error else "done"), error
+            if ticket in self._events:
+                return "queued", None
+            return "unknown", None
+
+    def wait(self, ticket: str, timeout: float | None = None):
+        with self._lock:
+            event = self._events.get(ticket)
+        if event is not None and not event.wait(timeout):
+            raise TimeoutError(f"งานเขียน {ticket} ยังไม่เสร็จใน {timeout} วินาที (ยังอยู่ในคิว)")
+        state, error = self.status(ticket)
+        if state == "conflict":
+            with self._lock:
+                raise WriteConflict(error, self._conflicts.get(ticket, []))
+        if state == "error":
+            raise WriteError(error)
+
+    def close(self):
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+
+    # ---------- ตัวเขียนเบื้องหลัง ----------
+    def _finish(self, jobs: list[_WriteJob], error: str | None = None, errors: dict | None = None,
+                conflicts: dict | None = None):
+        for job in jobs:
+            self._journal({"op": "done", "ticket": job.ticket})
+        with self._lock:
+            for job in jobs:
+                self._pending[job.sheet] -= 1
+                stale = None if error else (conflicts or {}).get(job.ticket)
+                if stale:
+                    self._conflicts[job.ticket] = stale
+                    self._done[job.ticket] = _conflict_message(job.sheet, stale)
+                else:
+                    self._done[job.ticket] = error or (errors or {}).get(job.ticket)
+                while len(self._done) > 1000:
+                    self._conflicts.pop(self._done.popitem(last=False)[0], None)
+                event = self._events.pop(job.ticket, None)
+                if event is not None:
+                    event.set()
+            self._compact_journal()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._jobs and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+            time.sleep(WRITE_BATCH_DELAY)
+            with self._lock:
+                jobs = list(self._jobs)
+                self._jobs.clear()
+
+            by_sheet: dict[str, list[_WriteJob]] = {}
+            for job in jobs:
+                by_sheet.setdefault(job.sheet, []).append(job)
+            for sheet_name, sheet_jobs in by_sheet.items():
+                try:
+                    with get_telemetry().timer("write.flush", sheet_name):
+                        errors, conflicts = self._flush(sheet_name, sheet_jobs)
+                    get_telemetry().count("write_jobs", sheet_name, len(sheet_jobs))
+                    if conflicts:
+                        get_telemetry().count("write_conflicts", sheet_name, sum(map(len, conflicts.values())))
+                except Exception as e:
+                    get_telemetry().count("write_errors", sheet_name)
+                    self._finish(sheet_jobs, error=f"{type(e).__name__}: {e}")
+                else:
+                    self._finish(sheet_jobs, errors=errors, conflicts=conflicts)
+
+    def _call(self, fn, *args, throttle: bool = True, **kwargs):
+        """
+        เรียก API 1 ครั้ง: รอ token ก่อน (throttle=False สำหรับการอ่าน ซึ่งมี quota แยก)
+        และลองใหม่แบบ backoff เมื่อโดน quota / server error / เน็ตหลุด (ครบ WRITE_MAX_ATTEMPTS ครั้งแล้ว raise)
+        """
+        attempt = 0
+        while True:
+            if throttle:
+                self._bucket.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not _is_transient(e) or attempt + 1 >= WRITE_MAX_ATTEMPTS:
+                    raise
+                delay = min(WRITE_MAX_BACKOFF, 2 ** attempt) + random.uniform(0, 1)
+                attempt += 1
+                record_retry()
+                time.sleep(delay)
+
+    def _flush(self, sheet_name: str, jobs: list[_WriteJob]) -> tuple[dict[str, str], dict[str, list]]:
+        """
+        เขียนงานทั้งหมดของ Sheet เดียวรวดเดียว
+        คืน ({ticket: error} ของงานที่ทำไม่ได้บางส่วน, {ticket: key ของแถวที่ไม่ได้เขียนเพราะชนกัน})
+        """
+        if shard_base(sheet_name):
+            sh = _backend_for(sheet_name)
+        else:
+            sh = self._backend if self._backend is not None else _default_backend()
+        cache = _get_sheet_cache()
+
+        if all(job.kind == "append" for job in jobs):
+            self._flush_appends(sh, sheet_name, jobs)
+            return {}, {}
+
+        # ลบแถว = เขียนใหม่ทั้งหน้า -> อ่าน Sheet จริงล่าสุดก่อน แถวที่เพิ่งถูกเพิ่มจากที่อื่นจะได้ไม่หาย
+        deleting = any(job.kind == "delete" for job in jobs)
+        snapshot = None if deleting else cache.snapshot(sheet_name)
+        if snapshot is not None and not self._call(_snapshot_current, sh, sheet_name, snapshot, throttle=False):
+            # มีการเขียนจากที่อื่น -> เทียบ Row_Version กับของจริงใน Sheet
+            snapshot = None
+        if snapshot is None:
+            state = self._call(_fetch_cells, sh, sheet_name, throttle=False)
+        else:
+            state = _to_cells(snapshot)
+        state = state.astype(object).copy()
+        state0 = state.copy()
+        n_existing = len(state)
+        rewrite = False
+        dirty: dict[int, set[int]] = {}
+        errors: dict[str, str] = {}
+        conflicts: dict[str, list] = {}
+
+        for job in jobs:
+            if job.kind == "rewrite":
+                new_state = pd.DataFrame(job.payload["rows"], columns=job.payload["columns"], dtype=object)
+                stale = _rewrite_conflicts(sheet_name, state, new_state) if _versioned(sheet_name) else []
+                if stale:
+                    conflicts[job.ticket] = stale
+                state = new_state
+                rewrite, dirty = True, {}
+            elif job.kind == "append":
+                if not len(state.columns) and job.payload:
+                    # Sheet ยังว่างอยู่ -> ใช้ key ของแถวแรกเป็น header แล้วเขียนทั้งหน้า
+                    state = pd.DataFrame(columns=list(job.payload[0].keys()), dtype=object)
+                    rewrite = True
+                state = _add_rows(state, job.payload)
+            elif job.kind == "delete":
+                # key ที่หาไม่เจอ = ถูกลบ/ย้ายไปแล้ว ไม่ถือเป็น error
+                state, _ = _delete_rows(state, job.payload)
+                rewrite, dirty = True, {}
+            else:
+                state, changed, missing, stale = _apply_patch(state, job.payload)
+                for pos, cols in changed.items():
+                    dirty.setdefault(pos, set()).update(cols)
+                if missing:
+                    errors[job.ticket] = f"หาแถวใน Sheet {sheet_name} ไม่เจอ (ถูกลบ/เปลี่ยน key): {missing[:5]}"
+                if stale:
+                    conflicts[job.ticket] = stale
+
+        if _versioned(sheet_name) and len(state.columns):
+            if ROW_VERSION_COLUMN not in state.columns:
+                # Sheet เดิมที่ยังไม่มีคอลัมน์ Row_Version -> เพิ่มแล้วเขียนใหม่ทั้งหน้าครั้งเดียว (migration)
+                state[ROW_VERSION_COLUMN] = ""
+                rewrite, dirty = True, {}
+                get_telemetry().count("row_version_added", sheet_name)
+            if rewrite:
+                _bump_versions(sheet_name, state0, state)
+
+        ok = False
+        try:
+            if rewrite:
+                _rewrite_sheet(sh, sheet_name, state, call=self._call)
+            else:
+                updates = []
+                for pos in sorted(p for p in dirty if p < n_existing):
+                    cols = sorted(dirty[pos])
+                    first, last = cols[0], cols[-1]
+                    sheet_row = pos + 2   # +1 header, +1 เริ่มนับที่ 1
+                    a1 = f"{rowcol_to_a1(sheet_row, first + 1)}:{rowcol_to_a1(sheet_row, last + 1)}"
+                    updates.append({
+                        "range": absolute_range_name(sheet_name, a1),
+                        "values": [state.iloc[pos, first:last + 1].tolist()],
+                    })
+                if updates:
+                    self._call(sh.values_batch_update, {"valueInputOption": "RAW", "data": updates})
+                if len(state) > n_existing:
+                    self._call(
+                        sh.values_append,
+                        absolute_range_name(sheet_name),
+                        params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+                        body={"values": state.iloc[n_existing:].values.tolist()},
+                    )
+            # แถวที่ append อาจไม่ได้อยู่ต่อท้าย snapshot พอดี (คนอื่น append แทรกได้)
+            appended = not rewrite and len(state) > n_existing
+            cache.set_snapshot(sheet_name, None if appended else state)
+            ok = not errors and not conflicts
+        except Exception:
+            cache.set_snapshot(sheet_name, None)
+            raise
+        finally:
+            self._after_write(sheet_name, len(jobs), ok)
+        if rewrite:
+            _notify("save", sheet_name, state)
+        else:
+            # แก้บางแถว -> ส่งแค่แถวที่เปลี่ยน (ก่อน/หลัง) ไม่ต้องนับใหม่ทั้ง Sheet
+            changed_pos = sorted(p for p in dirty if p < n_existing)
+            added = list(range(n_existing, len(state)))
+            if changed_pos or added:
+                _notify("patch", sheet_name, state0.iloc[changed_pos], state.iloc[changed_pos + added])
+        return errors, conflicts
+
+    def _flush_appends(self, sh: SheetBackend, sheet_name: str, jobs: list[_WriteJob]):
+        """มีแต่แถวใหม่ -> values.append ครั้งเดียว ไม่ต้องอ่านทั้ง Sheet (อ่านแค่ header)"""
+        rows = [row for job in jobs for row in job.payload]
+        header = self._call(_sheet_header, sh, sheet_name, throttle=False)
+        values = []
+        if not header:
+            # Sheet ยังว่างอยู่ -> ใช้ key ของแถวแรกเป็น header
+            header = list(rows[0].keys())
+            values.append(header)
+        values.extend([row.get(col, "") for col in header] for row in rows)
+        if ROW_VERSION_COLUMN in header:
+            j = header.index(ROW_VERSION_COLUMN)
+            for row in values[len(values) - len(rows):]:
+                row[j] = "1"
+
+        ok = False
+        try:
+            self._call(
+                sh.values_append,
+                absolute_range_name(sheet_name),
+                params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+                body={"values": values},
+            )
+            ok = True
+        finally:
+            _get_sheet_cache().set_snapshot(sheet_name, None)
+            self._after_write(sheet_name, len(jobs), ok)
+        _notify("append", sheet_name, pd.DataFrame(rows))
+
+    def _after_write(self, sheet_name: str, n_jobs: int, ok: bool = False):
+        # ถ้ายังมีงานของ Sheet นี้รอในคิวอีก ให้ cache เก็บข้อมูลที่ใส่ไว้ล่วงหน้าต่อ
+        with self._lock:
+            more = self._pending[sheet_name] > n_jobs
+        if more:
+            return
+        if ok and _versioned(sheet_name):
+            # เขียนครบทุกแถว -> ข้อมูลใน cache ต่างจาก Sheet เฉพาะเลข Row_Version ของแถวที่เพิ่งเขียน
+            # load ครั้งหน้า sync แค่แถวเหล่านั้น
+            _get_sheet_cache().expire(sheet_name)
+        else:
+            # revision ของทั้ง Spreadsheet เปลี่ยนแล้ว แต่ cache ของ Sheet นี้ต้องทิ้งทันที
+            invalidate_cache(sheet_name)
 
-SPREADSHEET_ID = st.secrets["SPREADSHEET_ID"]
 
 @st.cache_resource
-def get_gsheet_client():
-    """สร้าง gspread client จาก service account ที่เก็บใน st.secrets"""
-    creds_info = st.secrets["gcp_service_account"]
-    creds = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
-    client = gspread.authorize(creds)
-    return client
+def _get_write_queue() -> _WriteQueue:
+    # backend ที่สลับมาใช้ (เช่น benchmark) ไม่ต้องมี journal
+    if _backend_override is not None:
+        return _WriteQueue(None, backend=_backend_override)
+    return _WriteQueue(WRITE_JOURNAL_PATH)
+
+
+def _append_payload(rows: list[dict]) -> list[dict]:
+    return [
+        {col: "" if pd.isna(value) else _cell_text(value) for col, value in row.items()}
+        for row in rows
+    ]
+
+
+def enqueue_append(sheet_name: str, rows: list[dict]) -> str | None:
+    """
+    ส่งแถวใหม่เข้าคิวเขียน คืน ticket ทันที (ไม่มีแถว = None)
+    แต่ละแถวเป็น dict {ชื่อคอลัมน์: ค่า} จะเรียงตาม header ที่มีอยู่ใน Sheet
+    (คอลัมน์ที่ไม่ได้ใส่มาจะเป็นค่าว่าง, key ที่ไม่มีใน header จะไม่ถูกเขียน)
+    Sheet ที่แบ่ง shard: แต่ละแถวไป shard ตามค่าคอลัมน์ที่ใช้แบ่ง (ticket รวมของทุก shard)
+    """
+    if not rows:
+        return None
+    if sheet_name in SHEET_SHARDS:
+        owners = _shard_of_values(sheet_name, pd.DataFrame(rows))
+        return _join_tickets([
+            _enqueue_append(name, [row for row, owner in zip(rows, owners) if owner == name])
+            for name in dict.fromkeys(owners)
+        ])
+    return _enqueue_append(sheet_name, rows)
+
+
+def _enqueue_append(sheet_name: str, rows: list[dict]) -> str:
+    payload = _append_payload(rows)
+    ticket = _get_write_queue().submit(sheet_name, "append", payload)
+
+    cache = _get_sheet_cache()
+    entry = cache.get(sheet_name)
+    if entry is not None and len(entry.df.columns):
+        cache.put_local(sheet_name, _typed_frame(sheet_name, _add_rows(_to_cells(entry.df), payload)))
+    return ticket
+
+
+def _rows_in(sheet_name: str, df: pd.DataFrame, cells: pd.DataFrame) -> pd.DataFrame:
+    """แถวของ df ที่มี key อยู่ใน cells (แถวที่คนอื่นเพิ่มทีหลังจะได้ไม่ถูกนับเป็นแถวที่ถูกลบ)"""
+    key_cols = _row_keys(cells, sheet_name)
+    if key_cols is None or not all(c in df.columns for c in key_cols):
+        return df
+    keys = pd.MultiIndex.from_frame(_to_cells(df[key_cols]))
+    return df[keys.isin(pd.MultiIndex.from_frame(cells[key_cols]))]
+
+
+def enqueue_save(sheet_name: str, df: pd.DataFrame) -> str:
+    """
+    ส่ง DataFrame ทั้ง Sheet ที่แก้แล้วเข้าคิวเขียน คืน ticket ทันที
+    - เทียบกับข้อมูลชุดที่โหลดไป (data_version) ส่งเฉพาะ cell ที่หน้าเว็บแก้จริง
+      cell ที่คนอื่นแก้ไประหว่างนั้นจะไม่ถูกเขียนทับ
+    - Sheet ที่มี Row_Version: แถวที่มีคนแก้ไปก่อน (เลขไม่ตรงกับที่โหลดไป) จะไม่ถูกเขียน
+      write_status ของ ticket เป็น "conflict" (แถวอื่นใน ticket เดียวกันบันทึกตามปกติ)
+    - แถวใหม่ (key ที่ไม่เคยมี) จะ append ต่อท้าย
+    - ถ้าไม่รู้ว่าโหลดชุดไหนมา / header เปลี่ยน / มีแถวถูกลบ จะ clear แล้วเขียนใหม่ทั้งหน้าแบบเดิม
+    - Sheet ที่แบ่ง shard: แยกแถวไปตาม shard ที่เก็บ (ดู _enqueue_save_shards) ticket รวมของทุก shard
+    """
+    if df.attrs.get("partitions"):
+        raise ValueError(f"DataFrame ที่รวม Sheet เก็บถาวรแล้ว (include_archive=True) บันทึกกลับลง {sheet_name} ไม่ได้")
+    if sheet_name in SHEET_SHARDS:
+        return _enqueue_save_shards(sheet_name, df)
+    return _enqueue_save(sheet_name, df)
+
+
+def _enqueue_save(sheet_name: str, df: pd.DataFrame) -> str:
+    # เวลาที่หน้าเว็บรอ (เทียบหา cell ที่เปลี่ยน + ใส่ค่าใหม่ใน cache) ไม่รวมเวลาเขียนจริงเบื้องหลัง
+    with get_telemetry().timer("write.enqueue", sheet_name):
+        cache = _get_sheet_cache()
+        # แปลง NaN -> "" ป้องกัน error เวลา update
+        new_cells = _to_cells(df)
+
+        base = cache.base(data_version(df))
+        if base is None and _versioned(sheet_name) and ROW_VERSION_COLUMN in new_cells.columns:
+            # ไม่มีข้อมูลชุดที่โหลดไปแล้ว -> เทียบกับข้อมูลล่าสุด (เฉพาะแถวที่ df มี)
+            # แถวที่มีคนแก้ไปแล้วเลข Row_Version จะไม่ตรง ตัวเขียนจะแจ้ง conflict แทนการเขียนทับ
+            entry = cache.get(sheet_name)
+            if entry is not None:
+                base = _rows_in(sheet_name, entry.df, new_cells)
+        if base is None:
+            base = cache.snapshot(sheet_name)
+        patch = None
+        if base is not None and base.columns.tolist() == new_cells.columns.tolist():
+            patch = _diff_patch(sheet_name, _to_cells(base), new_cells)
+
+        queue = _get_write_queue()
+        if patch is None:
+            ticket = queue.submit(sheet_name, "rewrite", {
+                "columns": new_cells.columns.tolist(), "rows": new_cells.values.tolist(),
+            })
+            cache.put_local(sheet_name, _share(df))
+            return ticket
+
+        ticket = queue.submit(sheet_name, "patch", patch)
+        # ใส่เฉพาะ cell ที่แก้ลงในข้อมูลล่าสุดใน cache (งานของ session อื่นที่ยังอยู่ในคิวจะไม่หาย)
+        entry = cache.get(sheet_name)
+        if entry is not None and entry.df.columns.tolist() == new_cells.columns.tolist():
+            local, _, _, _ = _apply_patch(_to_cells(entry.df), patch)
+            cache.put_local(sheet_name, _typed_frame(sheet_name, local))
+        else:
+            cache.put_local(sheet_name, _share(df))
+        return ticket
 
 
-def load_sheet(sheet_name: str) -> pd.DataFrame:
-    """อ่านข้อมูลทั้ง Sheet มาเป็น DataFrame"""
-    client = get_gsheet_client()
-    sh = client.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(sheet_name)
-    data = ws.get_all_records()
-    df = pd.DataFrame(data)
-    return df
+def _join_tickets(tickets: list[str | None]) -> str | None:
+    """ticket รวมของงานที่แยกส่งหลาย shard ("a+b")"""
+    return "+".join(t for t in tickets if t) or None
+
+
+def write_status(ticket: str) -> tuple[str, str | None]:
+    """สถานะงานเขียน: ("queued" | "done" | "conflict" | "error" | "unknown", ข้อความ error / conflict)"""
+    queue = _get_write_queue()
+    states = [queue.status(t) for t in ticket.split("+")]
+    for state in ("queued", "unknown", "error", "conflict"):
+        errors = [error for s, error in states if s == state]
+        if errors:
+            return state, " / ".join(e for e in errors if e) or None
+    return "done", None
+
+
+def wait_for_write(ticket: str | None, timeout: float | None = WRITE_WAIT_TIMEOUT):
+    """รอจนงานเขียนเสร็จ (error -> WriteError, มีแถวชนกัน -> WriteConflict, เกินเวลา -> TimeoutError)"""
+    if ticket is None:
+        return
+    queue = _get_write_queue()
+    failures = []
+    for part in ticket.split("+"):
+        try:
+            queue.wait(part, timeout)
+        except WriteError as e:
+            failures.append(e)   # รอ shard ที่เหลือให้เสร็จก่อนแจ้ง
+    if len(failures) == 1:
+        raise failures[0]
+    if failures and all(isinstance(e, WriteConflict) for e in failures):
+        raise WriteConflict(" / ".join(map(str, failures)), [k for e in failures for k in e.keys])
+    if failures:
+        raise WriteError(" / ".join(map(str, failures)))
+
+
+def pending_writes() -> int:
+    """จำนวนงานเขียนที่ยังอยู่ในคิว"""
+    return _get_write_queue().pending_count()
+
+
+def telemetry_snapshot() -> dict:
+    """ตัวเลข telemetry ทั้งหมด (dict แปลงเป็น JSON ได้) พร้อม quota ที่ตั้งไว้และจำนวนงานเขียนที่ค้าง"""
+    snapshot = get_telemetry().snapshot(READ_QUOTA_PER_MINUTE, WRITE_QUOTA_PER_MINUTE)
+    snapshot["pending_writes"] = pending_writes()
+    return snapshot
+
+
+def append_rows(sheet_name: str, rows: list[dict]):
+    """เพิ่มแถวใหม่ต่อท้าย Sheet ผ่านคิวเขียน แล้วรอจนเขียนเสร็จ (ดู enqueue_append)"""
+    wait_for_write(enqueue_append(sheet_name, rows))
 
 
 def save_sheet(sheet_name: str, df: pd.DataFrame):
+    """เขียน DataFrame กลับไปที่ Google Sheet ผ่านคิวเขียน แล้วรอจนเขียนเสร็จ (ดู enqueue_save)"""
+    wait_for_write(enqueue_save(sheet_name, df))
+
+
+# ---------------------------------------------------------
+# ARCHIVE PARTITIONS (Sheet หลัก + Sheet เก็บถาวรตามช่วงเวลา)
+# ---------------------------------------------------------
+def archive_sheet_name(sheet_name: str, period: str) -> str:
+    return f"{sheet_name}{ARCHIVE_SUFFIX}{period}"
+
+
+def archive_base(sheet_name: str) -> str | None:
+    """ชื่อ Sheet หลักของ Sheet เก็บถาวร ("PR_PO_Archive_2023" -> "PR_PO", Sheet ทั่วไป = None)"""
+    base, sep, period = sheet_name.rpartition(ARCHIVE_SUFFIX)
+    return base if sep and base and period else None
+
+
+def sheet_titles() -> list[str]:
+    """ชื่อทุก Sheet ใน Spreadsheet (cache ไว้ ARCHIVE_CACHE_TTL_SECONDS)"""
+    cache = _get_sheet_cache()
+    titles = cache.titles(ARCHIVE_CACHE_TTL_SECONDS)
+    if titles is None:
+        meta = get_backend().fetch_sheet_metadata({"fields": "sheets.properties.title"})
+        titles = [sheet["properties"]["title"] for sheet in meta.get("sheets", [])]
+        cache.set_titles(titles)
+    return titles
+
+
+def archive_partitions(sheet_name: str) -> list[str]:
+    """ชื่อ Sheet เก็บถาวรของ sheet_name เรียงตามช่วงเวลา"""
+    return sorted(t for t in sheet_titles() if archive_base(t) == sheet_name)
+
+
+def _concat_partitions(frames: list[pd.DataFrame], names: list[str]) -> pd.DataFrame:
+    """ต่อ Sheet หลัก + shard / Sheet เก็บถาวร (คอลัมน์ category รวมหมวดหมู่ก่อน ไม่งั้นกลายเป็น object)"""
+    frames = [df for df in frames if len(df.columns)]
+    if not frames:
+        return pd.DataFrame()
+    columns = list(dict.fromkeys(col for df in frames for col in df.columns))
+    for col in columns:
+        dtypes = [df[col].dtype for df in frames if col in df.columns]
+        if all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            categories = list(dict.fromkeys(c for dtype in dtypes for c in dtype.categories))
+            frames = [
+                df.assign(**{col: df[col].cat.set_categories(categories)}) if col in df.columns else df
+                for df in frames
+            ]
+    out = pd.concat(frames, ignore_index=True)
+    versions = [data_version(df) for df in frames]
+    out.attrs = {
+        "sheet_version": "+".join(versions) if all(versions) else None,
+        "partitions": names,
+    }
+    return out
+
+
+def archive_rows(sheet_name: str, df: pd.DataFrame, periods: pd.Series) -> int:
     """
-    เขียน DataFrame กลับไปที่ Google Sheet ทั้งหน้า
-    (จะ clear แล้วเขียน Header + ข้อมูลใหม่ทั้งหมด)
+    ย้ายแถวของ df (ข้อมูลทั้ง Sheet จาก load_sheet) ไปไว้ใน Sheet เก็บถาวรตามช่วงเวลา
+    periods : Series ที่ index = แถวใน df ที่จะย้าย, ค่า = ช่วงเวลา เช่น "2023"
+    ลำดับ: append ลง Sheet เก็บถาวร (สร้างถ้ายังไม่มี) -> รอเขียนเสร็จ -> ลบออกจาก Sheet หลัก (หรือ shard ของแถวนั้น)
+    ถ้าหยุดกลางทาง แถวจะอยู่ทั้งสองที่ เรียกซ้ำได้ (แถวที่มี key อยู่ใน Sheet เก็บถาวรแล้วจะไม่ append ซ้ำ)
+    รอจนเขียนเสร็จ คืนจำนวนแถวที่ย้าย (error -> WriteError)
     """
-    client = get_gsheet_client()
-    sh = client.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(sheet_name)
+    if periods.empty:
+        return 0
+    cells = _to_cells(df)
+    key_cols = _row_keys(cells, sheet_name)
+    if key_cols is None:
+        raise ValueError(f"Sheet {sheet_name} ไม่มีคอลัมน์ key ที่ไม่ซ้ำกัน ย้ายแถวไปเก็บถาวรไม่ได้")
+
+    moving = cells.loc[periods.index]
+    labels = periods.astype(str)
+    targets = {period: archive_sheet_name(sheet_name, period) for period in sorted(labels.unique())}
 
-    # แปลง NaN -> "" ป้องกัน error เวลา update
-    df_to_save = df.copy()
-    df_to_save = df_to_save.fillna("")
+    cache = _get_sheet_cache()
+    existing = set(sheet_titles())
+    for name in targets.values():
+        if name not in existing:
+            try:
+                get_backend().add_worksheet(name, rows=1000, cols=len(cells.columns))
+            except gspread.exceptions.APIError:
+                pass   # process อื่นสร้างไปแล้ว
+    cache.set_titles(None)
+
+    archived = load_sheets(list(targets.values()))
+    tickets = []
+    for period, name in targets.items():
+        rows = moving[(labels == period).to_numpy()]
+        part = archived[name]
+        if len(part) and all(c in part.columns for c in key_cols):
+            have = pd.MultiIndex.from_frame(_to_cells(part[key_cols]))
+            rows = rows[~pd.MultiIndex.from_frame(rows[key_cols]).isin(have)]
+        tickets.append(enqueue_append(name, rows.to_dict("records")))
+    for ticket in tickets:
+        wait_for_write(ticket)
+
+    # Sheet ที่แบ่ง shard: ลบออกจาก shard ที่แถวนั้นอยู่
+    if sheet_name in SHEET_SHARDS:
+        bases = {}
+        for name in [sheet_name] + shard_partitions(sheet_name):
+            entry = cache.get(name)
+            bases[name] = entry.df if entry is not None else None
+        owners = _shard_owners(sheet_name, moving, key_cols, bases)
+    else:
+        owners = np.full(len(moving), sheet_name, dtype=object)
+    tickets = []
+    for name in dict.fromkeys(owners):
+        payload = {"key_cols": key_cols, "keys": moving.loc[owners == name, key_cols].values.tolist()}
+        tickets.append(_get_write_queue().submit(name, "delete", payload))
+        entry = cache.get(name)
+        if entry is not None and len(entry.df.columns):
+            local, _ = _delete_rows(_to_cells(entry.df), payload)
+            cache.put_local(name, _typed_frame(name, local))
+    for ticket in tickets:
+        wait_for_write(ticket)
+    return len(moving)
+
+
+# ---------------------------------------------------------
+# SHARDS (Sheet เดียวแบ่งเก็บหลาย Spreadsheet ดู SHEET_SHARDS)
+# ---------------------------------------------------------
+def shard_sheet_name(sheet_name: str, label: str) -> str:
+    return f"{sheet_name}{SHARD_SEP}{label}"
+
+
+def shard_base(sheet_name: str) -> str | None:
+    """ชื่อ Sheet หลักของ shard ("PR_PO@2024" -> "PR_PO", Sheet ทั่วไป = None)"""
+    base, sep, label = sheet_name.rpartition(SHARD_SEP)
+    return base if sep and label in SHEET_SHARDS.get(base, {}).get("spreadsheets", {}) else None
+
+
+def shard_partitions(sheet_name: str) -> list[str]:
+    """ชื่อ shard ทั้งหมดของ sheet_name ตามลำดับใน SHEET_SHARDS (ไม่ได้แบ่ง = [])"""
+    spec = SHEET_SHARDS.get(sheet_name)
+    return [shard_sheet_name(sheet_name, label) for label in spec["spreadsheets"]] if spec else []
+
+
+def _shard_spreadsheet(sheet_name: str) -> str | None:
+    """Spreadsheet ID ของ shard (Sheet ใน Spreadsheet หลัก = None)"""
+    base = shard_base(sheet_name)
+    return SHEET_SHARDS[base]["spreadsheets"][sheet_name[len(base) + len(SHARD_SEP):]] if base else None
+
+
+def _base_sheet(sheet_name: str) -> str:
+    """ชื่อ Sheet หลัก (ใช้หา SHEET_SCHEMAS / SHEET_KEYS ของ Sheet เก็บถาวร / shard)"""
+    return archive_base(sheet_name) or shard_base(sheet_name) or sheet_name
+
+
+def _shard_of_values(sheet_name: str, df: pd.DataFrame) -> np.ndarray:
+    """shard ของแต่ละแถวตามค่าคอลัมน์ที่ใช้แบ่ง (ไม่ตรง shard ไหน = Sheet หลัก)"""
+    spec = SHEET_SHARDS[sheet_name]
+    column = spec["column"]
+    if column not in df.columns:
+        return np.full(len(df), sheet_name, dtype=object)
+    values = df[column]
+    if SHEET_SCHEMAS.get(sheet_name, {}).get(column) == "date":
+        years = pd.to_datetime(values.astype(object), format=DATE_FORMAT, errors="coerce").dt.year
+        labels = years.astype("Int64").astype(str)
+    else:
+        labels = _column_text(values)
+    names = {label: shard_sheet_name(sheet_name, label) for label in spec["spreadsheets"]}
+    return labels.map(names).fillna(sheet_name).to_numpy(dtype=object)
+
+
+def _combine_shards(frames: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """ต่อทุก shard เป็น DataFrame เดียว จำเวอร์ชันของแต่ละ shard ไว้ให้ enqueue_save เทียบ"""
+    out = _concat_partitions(list(frames.values()), list(frames))
+    out.attrs = {
+        "sheet_version": out.attrs.get("sheet_version"),
+        "shards": {name: data_version(df) for name, df in frames.items()},
+    }
+    return out
+
+
+def _shard_owners(sheet_name: str, cells: pd.DataFrame, key_cols: list[str],
+                  bases: dict[str, pd.DataFrame | None]) -> np.ndarray:
+    """
+    shard ของแต่ละแถวใน cells: แถวเดิมอยู่ shard ที่มี key นั้น (แม้แก้ค่าคอลัมน์ที่ใช้แบ่งไปแล้ว)
+    แถวใหม่ไป shard ตามค่าคอลัมน์ที่ใช้แบ่ง
+    """
+    owners = _shard_of_values(sheet_name, cells)
+    keys = pd.MultiIndex.from_frame(cells[key_cols])
+    for name, base in bases.items():
+        if base is not None and all(c in base.columns for c in key_cols):
+            owners[keys.isin(pd.MultiIndex.from_frame(_to_cells(base[key_cols])))] = name
+    return owners
+
+
+def _enqueue_save_shards(sheet_name: str, df: pd.DataFrame) -> str:
+    """
+    แยก df (ทุก shard ต่อกันจาก load_sheet) ตาม shard ที่แถวนั้นอยู่ แล้วส่งเข้าคิวทีละ shard
+    แต่ละ shard เทียบกับข้อมูลชุดที่โหลดไปของ shard นั้นเอง shard ที่ไม่มี cell ไหนเปลี่ยนไม่ส่ง
+    """
+    cells = _to_cells(df)
+    key_cols = _row_keys(cells, sheet_name)
+    if key_cols is None:
+        raise ValueError(f"Sheet {sheet_name} ไม่มีคอลัมน์ key ที่ไม่ซ้ำกัน แยกบันทึกตาม shard ไม่ได้")
+
+    cache = _get_sheet_cache()
+    versions = df.attrs.get("shards") or {}
+    bases = {}
+    for name in [sheet_name] + shard_partitions(sheet_name):
+        base = cache.base(versions.get(name))
+        if base is None and (entry := cache.get(name)) is not None:
+            base = entry.df
+        bases[name] = base
+    owners = _shard_owners(sheet_name, cells, key_cols, bases)
+
+    tickets = []
+    for name, base in bases.items():
+        rows = (owners == name)
+        has_base = base is not None and len(base.columns) > 0
+        if not rows.any() and not (has_base and len(base)):
+            continue
+        part = df[rows]
+        if has_base and set(base.columns) <= set(part.columns):
+            part = part[base.columns.tolist()]
+            if len(part) == len(base) and _to_cells(part).reset_index(drop=True).equals(
+                _to_cells(base).reset_index(drop=True)
+            ):
+                continue   # shard นี้ไม่มีอะไรเปลี่ยน
+        part = part.reset_index(drop=True)
+        part.attrs = {"sheet_version": versions.get(name)}
+        tickets.append(_enqueue_save(name, part))
+    if not tickets:
+        # ไม่มีอะไรเปลี่ยนเลย -> ticket ของ Sheet หลัก (patch ว่าง) ให้ผู้เรียกรอได้เหมือน Sheet ทั่วไป
+        part = df[owners == sheet_name].reset_index(drop=True)
+        part.attrs = {"sheet_version": versions.get(sheet_name)}
+        tickets.append(_enqueue_save(sheet_name, part))
+    return _join_tickets(tickets)
+
+
+# ---------------------------------------------------------
+# ID ALLOCATOR (เลข running RQ / PR / PO ที่ไม่ซ้ำกันแม้มีหลาย session / หลาย process)
+# ---------------------------------------------------------
+# แต่ละ prefix มี Sheet "_ID_<prefix>" เก็บการจองเลข:
+#   แถว 2 = เลขตั้งต้น (seed) และขนาด block
+#   แถว 3 เป็นต้นไป = การจอง 1 block ต่อ 1 แถว (append)
+# values.append ของ Google จัดคิวให้เอง แต่ละการ append จึงได้เลขแถวไม่ซ้ำกัน
+# block ที่ k (แถว k + 3) = เลข seed + k * block_size + 1 ถึง seed + (k + 1) * block_size
+_ID_HEADER = ["Seed", "Block_Size", "Reserved_At"]
+
+
+def _id_sheet_name(prefix: str) -> str:
+    return f"_ID_{prefix}"
+
+
+def _max_existing_number(prefix: str) -> int:
+    """เลขมากสุดที่มีอยู่แล้วในข้อมูลจริง (ใช้ตอนสร้าง Sheet จองเลขครั้งแรก)"""
+    sheet_name, col = ID_SOURCES.get(prefix, ("PR_PO", f"{prefix}_ID"))
+    df = load_sheet(sheet_name, include_archive=True)
+    if df.empty or col not in df.columns:
+        return 0
+    ids = df[col].dropna().astype(str)
+    digits = ids[ids.str.startswith(prefix)].str.replace(r"\D", "", regex=True)
+    nums = pd.to_numeric(digits[digits != ""], errors="coerce").dropna()
+    return int(nums.max()) if not nums.empty else 0
+
+
+class _IdAllocator:
+    """แจกเลข running ทีละเลขจาก block ที่จองไว้ (lock ต่อ prefix กันแจกซ้ำใน process เดียวกัน)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prefix_locks: dict[str, threading.Lock] = {}
+        self._pools: dict[str, deque] = {}
+        self._seeds: dict[str, tuple[int, int]] = {}
+
+    def _prefix_lock(self, prefix: str) -> threading.Lock:
+        with self._lock:
+            return self._prefix_locks.setdefault(prefix, threading.Lock())
+
+    def _read_seed(self, sh: SheetBackend, prefix: str) -> tuple[int, int] | None:
+        try:
+            resp = sh.values_get(absolute_range_name(_id_sheet_name(prefix), "A2:B2"))
+        except gspread.exceptions.APIError:
+            return None   # ยังไม่มี Sheet
+        values = resp.get("values", [])
+        if not values or len(values[0]) < 2 or values[0][0] == "":
+            return None
+        return int(values[0][0]), int(values[0][1])
+
+    def _write_seed(self, sh: SheetBackend, prefix: str):
+        """เขียน header + แถวเลขตั้งต้น (แถว 2) ลองใหม่แบบ backoff เมื่อโดน quota / server error / เน็ตหลุด"""
+        for attempt in range(WRITE_MAX_ATTEMPTS):
+            try:
+                sh.values_update(
+                    absolute_range_name(_id_sheet_name(prefix), "A1"),
+                    params={"valueInputOption": "RAW"},
+                    body={"values": [
+                        _ID_HEADER,
+                        [_max_existing_number(prefix), ID_BLOCK_SIZE, datetime.now().isoformat(timespec="seconds")],
+                    ]},
+                )
+                return
+            except Exception as e:
+                if not _is_transient(e) or attempt + 1 >= WRITE_MAX_ATTEMPTS:
+                    raise
+                record_retry()
+                time.sleep(min(WRITE_MAX_BACKOFF, 2 ** attempt) + random.uniform(0, 1))
+
+    def _create_sheet(self, sh: SheetBackend, prefix: str):
+        try:
+            sh.add_worksheet(_id_sheet_name(prefix), rows=100, cols=len(_ID_HEADER))
+        except gspread.exceptions.APIError:
+            return   # process อื่นสร้างไปแล้ว
+        self._write_seed(sh, prefix)
+
+    def _repair_seed(self, sh: SheetBackend, prefix: str):
+        """
+        มี Sheet แล้วแต่ไม่มีแถว seed (เช่น process ที่สร้างเขียน seed ไม่สำเร็จ)
+        ถ้ายังไม่มีใครจอง block (ไม่มีแถว 3 ขึ้นไป) เขียน seed ให้เลย ไม่งั้นแก้เองไม่ได้ -> error
+        """
+        values = sh.values_get(absolute_range_name(_id_sheet_name(prefix), "A1:C")).get("values", [])
+        if any(any(cell != "" for cell in row) for row in values[2:]):
+            raise RuntimeError(
+                f"Sheet {_id_sheet_name(prefix)} ไม่มีเลขตั้งต้นในแถว 2 แต่มีการจองเลขไปแล้ว ต้องแก้ใน Sheet เอง"
+            )
+        self._write_seed(sh, prefix)
+
+    def _seed(self, sh: SheetBackend, prefix: str) -> tuple[int, int]:
+        if prefix in self._seeds:
+            return self._seeds[prefix]
+        seed = self._read_seed(sh, prefix)
+        if seed is None:
+            self._create_sheet(sh, prefix)
+            # ถ้า process อื่นเป็นคนสร้าง อาจยังเขียนแถว seed ไม่เสร็จ รอสักครู่
+            for _ in range(10):
+                seed = self._read_seed(sh, prefix)
+                if seed is not None:
+                    break
+                time.sleep(0.5)
+            else:
+                self._repair_seed(sh, prefix)
+                seed = self._read_seed(sh, prefix)
+                if seed is None:
+                    raise RuntimeError(f"อ่านเลขตั้งต้นของ {prefix} จาก Sheet {_id_sheet_name(prefix)} ไม่ได้")
+        self._seeds[prefix] = seed
+        return seed
+
+    def _reserve_block(self, prefix: str) -> range:
+        sh = get_backend()
+        seed, block_size = self._seed(sh, prefix)
+        resp = sh.values_append(
+            absolute_range_name(_id_sheet_name(prefix), "A:C"),
+            params={"valueInputOption": "RAW", "insertDataOption": "INSERT_ROWS"},
+            body={"values": [["", block_size, datetime.now().isoformat(timespec="seconds")]]},
+        )
+        updated = resp["updates"]["updatedRange"]
+        row = int(re.search(r"!\$?[A-Z]+\$?(\d+)", updated).group(1))
+        if row < 3:
+            # แถว 1-2 = header / seed: append ลงตรงนั้นแปลว่า Sheet ผิดรูป ใช้เลขนี้ไม่ได้ (จะได้ block ติดลบ)
+            raise RuntimeError(f"จองเลข {prefix} ได้แถว {row} ใน Sheet {_id_sheet_name(prefix)} (ต้องเป็นแถว 3 ขึ้นไป)")
+        block = row - 3
+        start = seed + block * block_size + 1
+        return range(start, start + block_size)
+
+    def next_number(self, prefix: str) -> int:
+        with self._prefix_lock(prefix):
+            pool = self._pools.setdefault(prefix, deque())
+            if not pool:
+                pool.extend(self._reserve_block(prefix))
+            return pool.popleft()
+
+
+@st.cache_resource
+def _get_id_allocator() -> _IdAllocator:
+    return _IdAllocator()
 
-    rows = [df_to_save.columns.tolist()] + df_to_save.astype(str).values.tolist()
 
-    ws.clear()
-    ws.update(rows)
+def next_id(prefix: str) -> str:
+    """ขอเลขถัดไปของ prefix (เช่น "RQ" -> "RQ0001") ไม่ซ้ำกันแม้กดบันทึกพร้อมกันหลายคน"""
+    return f"{prefix}{_get_id_allocator().next_number(prefix):04d}"
@@ -0,0 +1,119 @@
+# item_search.py
+# index ค้นหาสินค้าใน Item_Data สำหรับช่องเลือกสินค้าในหน้า request
+# (ค้นด้วยรหัสนำหน้า No. หรือคำที่อยู่ตรงไหนก็ได้ใน No. / Description รวมภาษาไทย)
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from gsheet_utils import data_version
+
+NGRAM = 3
+
+
+def normalize(text: str) -> str:
+    """ตัวพิมพ์เล็ก + รวมรูปแบบ Unicode (สระ/วรรณยุกต์ไทยที่พิมพ์ต่างลำดับ) + ช่องว่างเดียว"""
+    return " ".join(unicodedata.normalize("NFC", str(text)).casefold().split())
+
+
+def _grams(text: str) -> set[str]:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class ItemIndex:
+    """
+    index ของ catalog สินค้า
+    - prefix ของ No. : ค้นด้วย binary search บน No. ที่เรียงไว้
+    - substring      : inverted index ของ n-gram (3 ตัวอักษร) จาก "No. Description"
+                       เอา posting list ของทุก gram ใน query มา intersect แล้วเช็คซ้ำว่ามีคำนั้นจริง
+    """
+
+    def __init__(self, item_no: pd.Series, description: pd.Series):
+        self.item_no = item_no.astype(str).to_numpy()
+        self.description = description.fillna("").astype(str).to_numpy()
+        self._text = [normalize(f"{no} {desc}") for no, desc in zip(self.item_no, self.description)]
+
+        no_norm = np.array([normalize(no) for no in self.item_no], dtype=object)
+        self._no_order = np.argsort(no_norm, kind="stable")
+        self._no_sorted = no_norm[self._no_order]
+
+        postings: dict[str, list[int]] = {}
+        for row, text in enumerate(self._text):
+            for gram in _grams(text):
+                postings.setdefault(gram, []).append(row)
+        self._postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.item_no)
+
+    def label(self, row: int) -> str:
+        return f"{self.item_no[row]} - {self.description[row]}"
+
+    def _prefix_rows(self, query: str) -> np.ndarray:
+        lo = np.searchsorted(self._no_sorted, query, side="left")
+        hi = np.searchsorted(self._no_sorted, query + "\U0010ffff", side="left")
+        return np.sort(self._no_order[lo:hi])
+
+    def _substring_rows(self, query: str, limit: int) -> list[int]:
+        if len(query) < NGRAM:
+            # query สั้นกว่า n-gram -> ไล่หาตรง ๆ แต่หยุดเมื่อได้ครบ limit
+            found = []
+            for row, text in enumerate(self._text):
+                if query in text:
+                    found.append(row)
+                    if len(found) >= limit:
+                        break
+            return found
+
+        lists = [self._postings.get(gram) for gram in _grams(query)]
+        if any(rows is None for rows in lists):
+            return []
+        lists.sort(key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+            if candidates.size == 0:
+                return []
+
+        found = []
+        for row in candidates:
+            if query in self._text[row]:
+                found.append(int(row))
+                if len(found) >= limit:
+                    break
+        return found
+
+    def search(self, query: str, limit: int = 50) -> list[int]:
+        """
+        คืนเลขแถวของสินค้าที่ตรงกับ query ไม่เกิน limit รายการ
+        เรียง: รหัส No. ขึ้นต้นด้วย query ก่อน แล้วตามด้วยรายการที่มี query อยู่ใน No./Description
+        (query ว่าง = limit รายการแรกของ catalog)
+        """
+        query = normalize(query)
+        if not query:
+            return list(range(min(limit, len(self))))
+
+        result = [int(r) for r in self._prefix_rows(query)[:limit]]
+        if len(result) < limit:
+            seen = set(result)
+            for row in self._substring_rows(query, limit + len(seen)):
+                if row not in seen:
+                    result.append(row)
+                    if len(result) >= limit:
+                        break
+        return result
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _build_index(version: str | None, _df_item: pd.DataFrame) -> ItemIndex:
+    return ItemIndex(_df_item["No."], _df_item["Description"])
+
+
+def get_item_index(df_item: pd.DataFrame) -> ItemIndex:
+    """index ของ Item_Data (สร้างครั้งเดียวต่อเวอร์ชันข้อมูล ใช้ร่วมกันทุก session)"""
+    version = data_version(df_item)
+    if version is None:
+        # ไม่ได้มาจาก load_sheet -> ไม่รู้เวอร์ชัน สร้างใหม่ (ไม่ cache)
+        return ItemIndex(df_item["No."], df_item["Description"])
+    return _build_index(version, df_item)
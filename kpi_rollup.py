@@ -0,0 +1,195 @@
+# kpi_rollup.py
+# ตัวเลขสรุปของหน้า Dashboard (จำนวนตาม Status / Priority / Vendor) เก็บไว้ในหน่วยความจำ
+# อัปเดตเองทุกครั้งที่ gsheet_utils โหลดข้อมูลชุดใหม่ / save_sheet / append_rows
+# (แก้บางแถว / เพิ่มแถว = บวกลบเฉพาะแถวที่เปลี่ยน, นับใหม่ทั้ง Sheet เฉพาะตอนเขียนใหม่ทั้งหน้า)
+# หน้า Dashboard อ่านแค่ตัวเลขสรุป ไม่ต้องโหลดและนับ Request / PR_PO ทั้ง Sheet ทุกครั้งที่ refresh
+# Sheet เก็บถาวร (PR_PO_Archive_*) และ shard (PR_PO@2024) นับแยกต่อ Sheet แล้วรวมกับ Sheet หลักตอนสรุป
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+import pandas as pd
+import streamlit as st
+
+import gsheet_utils
+from purchase_ops import PENDING_STATUSES, RECEIVED_STATUS
+
+# Sheet -> คอลัมน์ที่นับจำนวนแยกตามค่า
+ROLLUP_COLUMNS = {
+    "Request": ["Status", "Priority"],
+    "PR_PO": ["Status", "Vendor_Name"],
+}
+
+# ตัวเลขสรุปเก่ากว่านี้ (วินาที) จะเช็คกับ Sheet ใหม่ผ่าน load_sheet
+# (เผื่อมีคนแก้ใน Google Sheet ตรง ๆ หรือแก้จาก process อื่น)
+ROLLUP_MAX_AGE_SECONDS = float(gsheet_utils._secret("KPI_ROLLUP_MAX_AGE_SECONDS", 120))
+
+
+@dataclass
+class SheetRollup:
+    rows: int = 0
+    counts: dict[str, Counter] = field(default_factory=dict)
+    version: str | None = None    # data_version ของ DataFrame ที่ใช้นับ (None = มีการเขียนเพิ่มหลังจากนั้น)
+    built_at: float = 0.0
+
+
+def _columns(sheet_name: str) -> list[str] | None:
+    """คอลัมน์ที่นับของ Sheet (Sheet เก็บถาวร / shard ใช้ของ Sheet หลัก, ไม่ได้นับ = None)"""
+    base = gsheet_utils.archive_base(sheet_name) or gsheet_utils.shard_base(sheet_name)
+    return ROLLUP_COLUMNS.get(base or sheet_name)
+
+
+def _combine(rollups: list[SheetRollup]) -> SheetRollup:
+    total = SheetRollup()
+    for rollup in rollups:
+        total.rows += rollup.rows
+        for col, counter in rollup.counts.items():
+            total.counts.setdefault(col, Counter()).update(counter)
+    return total
+
+
+def _count(df: pd.DataFrame, columns: list[str]) -> dict[str, Counter]:
+    counts = {}
+    for col in columns:
+        if col in df.columns:
+            counts[col] = Counter(df[col].dropna().astype(str).value_counts().to_dict())
+        else:
+            counts[col] = Counter()
+    return counts
+
+
+class _RollupStore:
+    """ตัวเลขสรุปของแต่ละ Sheet (ใช้ร่วมกันทุก session ใน process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rollups: dict[str, SheetRollup] = {}
+
+    def get(self, sheet_name: str) -> SheetRollup | None:
+        with self._lock:
+            return self._rollups.get(sheet_name)
+
+    def drop(self, sheet_name: str):
+        with self._lock:
+            self._rollups.pop(sheet_name, None)
+
+    def rebuild(self, sheet_name: str, df: pd.DataFrame, written: bool = False) -> SheetRollup:
+        """
+        นับใหม่จาก DataFrame ทั้ง Sheet (ข้ามถ้าเป็นข้อมูลชุดเดิมที่โหลดมานับไว้แล้ว) คืนตัวเลขที่ได้
+        written=True : df คือข้อมูลทั้ง Sheet ที่เพิ่งเขียนลงไป (นับใหม่เสมอ ไม่ดูเวอร์ชัน)
+        """
+        version = None if written else gsheet_utils.data_version(df)
+        with self._lock:
+            current = self._rollups.get(sheet_name)
+            if current is not None and version is not None and current.version == version:
+                current.built_at = time.monotonic()
+                return current
+        rollup = SheetRollup(len(df), _count(df, _columns(sheet_name)), version, time.monotonic())
+        with self._lock:
+            self._rollups[sheet_name] = rollup
+        return rollup
+
+    def apply(self, sheet_name: str, removed: pd.DataFrame | None, added: pd.DataFrame):
+        """ลบตัวเลขของแถวเดิม (removed) แล้วบวกของแถวใหม่ (added) เข้าไปในตัวเลขเดิม"""
+        columns = _columns(sheet_name)
+        minus = _count(removed, columns) if removed is not None else {}
+        plus = _count(added, columns)
+        with self._lock:
+            current = self._rollups.get(sheet_name)
+            if current is None:
+                return   # ยังไม่เคยนับ -> ครั้งหน้าที่ขอจะนับจาก Sheet ทั้งก้อนอยู่แล้ว
+            current.rows += len(added) - (len(removed) if removed is not None else 0)
+            for col in columns:
+                counter = current.counts.setdefault(col, Counter())
+                counter.subtract(minus.get(col, Counter()))
+                counter.update(plus.get(col, Counter()))
+                current.counts[col] = +counter   # ตัดค่าที่เหลือ 0 ออก
+            current.version = None
+
+    def add(self, sheet_name: str, df: pd.DataFrame):
+        """บวกแถวใหม่ (append) เข้าไปในตัวเลขเดิม"""
+        self.apply(sheet_name, None, df)
+
+
+@st.cache_resource
+def _get_store() -> _RollupStore:
+    store = _RollupStore()
+
+    def on_load(sheet_name: str, df: pd.DataFrame):
+        if _columns(sheet_name):
+            try:
+                store.rebuild(sheet_name, df)
+            except Exception:
+                store.drop(sheet_name)   # นับไม่ได้ -> ทิ้งไป ให้ครั้งหน้านับใหม่จาก Sheet
+
+    def on_save(sheet_name: str, df: pd.DataFrame):
+        if _columns(sheet_name):
+            try:
+                store.rebuild(sheet_name, df, written=True)
+            except Exception:
+                store.drop(sheet_name)
+
+    def on_patch(sheet_name: str, old: pd.DataFrame, new: pd.DataFrame):
+        if _columns(sheet_name):
+            try:
+                store.apply(sheet_name, old, new)
+            except Exception:
+                store.drop(sheet_name)
+
+    def on_append(sheet_name: str, df: pd.DataFrame):
+        if _columns(sheet_name):
+            try:
+                store.add(sheet_name, df)
+            except Exception:
+                store.drop(sheet_name)
+
+    gsheet_utils.add_listener("load", on_load)
+    gsheet_utils.add_listener("save", on_save)
+    gsheet_utils.add_listener("patch", on_patch)
+    gsheet_utils.add_listener("append", on_append)
+    return store
+
+
+def get_rollup(sheet_name: str, include_archive: bool = False) -> SheetRollup:
+    """
+    ตัวเลขสรุปของ Sheet (ยังไม่เคยนับ / เก่าเกินไป -> โหลดผ่าน load_sheets แล้วนับใหม่)
+    include_archive=True : รวม Sheet เก็บถาวรทุกช่วงเวลาด้วย (โหลดรวมกันใน request เดียว)
+    """
+    names = [sheet_name] + gsheet_utils.shard_partitions(sheet_name)
+    if include_archive:
+        names += gsheet_utils.archive_partitions(sheet_name)
+
+    store = _get_store()
+    now = time.monotonic()
+    # อ่านจาก store ครั้งเดียวแล้วใช้ค่านั้น (listener อาจ drop ทิ้งระหว่างนี้จาก thread อื่น)
+    current = {name: store.get(name) for name in names}
+    stale = [
+        name for name, rollup in current.items()
+        if rollup is None or now - rollup.built_at > ROLLUP_MAX_AGE_SECONDS
+    ]
+    if stale:
+        for name, df in gsheet_utils.load_sheets(stale, combine_shards=False).items():
+            current[name] = store.rebuild(name, df)
+
+    rollups = [
+        current[name] if current[name] is not None else SheetRollup(counts=_count(pd.DataFrame(), _columns(name)))
+        for name in names
+    ]
+    return rollups[0] if len(rollups) == 1 else _combine(rollups)
+
+
+def dashboard_summary() -> dict:
+    """KPI + จำนวนแยกตาม Status / Priority / Vendor สำหรับหน้า Dashboard (PR_PO รวมที่เก็บถาวรแล้ว)"""
+    req = get_rollup("Request")
+    prpo = get_rollup("PR_PO", include_archive=True)
+    return {
+        "total_requests": req.rows,
+        "pending_requests": sum(req.counts["Status"][s] for s in PENDING_STATUSES),
+        "total_po": prpo.rows,
+        "received_po": prpo.counts["Status"][RECEIVED_STATUS],
+        "request_status": dict(req.counts["Status"]),
+        "request_priority": dict(req.counts["Priority"]),
+        "prpo_status": dict(prpo.counts["Status"]),
+        "prpo_vendor": dict(prpo.counts["Vendor_Name"]),
+    }
@@ -0,0 +1,209 @@
+# paged_table.py
+# ตารางแบ่งหน้าสำหรับ st.data_editor / st.dataframe
+# กรอง / เรียงบน server (pandas) แล้วส่งไป browser เฉพาะแถวของหน้าที่เปิดอยู่
+# แถวที่ติ๊กเลือก / cell ที่แก้ จำไว้ใน session_state ตาม row id (ค่าคอลัมน์ key ของแถว)
+# เปลี่ยนหน้า / เปลี่ยนการเรียงแล้วกลับมา ค่าที่เลือก/แก้ไว้ยังอยู่ และ bulk action ใช้กับทุกแถวที่เลือกไว้ได้
+import hashlib
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+PAGE_SIZES = [50, 100, 200, 500]
+SELECT_COL = "เลือก"
+UNSORTED = "(ตามลำดับใน Sheet)"
+# คอลัมน์ภายในที่ไม่ต้องแสดง (เลขเวอร์ชันแถวของ gsheet_utils)
+HIDDEN_COLUMNS = ["Row_Version"]
+
+
+def row_ids(df: pd.DataFrame, keys: list[list[str]] | None = None) -> pd.Series:
+    """
+    row id (ข้อความ) ของแต่ละแถว จากชุดคอลัมน์ key ชุดแรกที่มีครบ ไม่ว่าง และไม่ซ้ำกัน
+    (เช่น SHEET_KEYS ของ gsheet_utils) ไม่มีชุดไหนใช้ได้ -> ใช้ index ของแถว
+    """
+    for key_cols in keys or []:
+        if not all(c in df.columns for c in key_cols):
+            continue
+        ids = df[key_cols[0]].astype(str)
+        for col in key_cols[1:]:
+            ids = ids + "|" + df[col].astype(str)
+        if ids.is_unique and not ids.eq("").any():
+            return ids
+    return pd.Series(df.index.astype(str), index=df.index)
+
+
+def _same(a: pd.Series, b: pd.Series) -> np.ndarray:
+    """เทียบค่าทีละแถว (NaN = NaN)"""
+    a, b = a.astype(object), b.astype(object)
+    return ((a == b) | (a.isna() & b.isna())).to_numpy(dtype=bool)
+
+
+def _sort_positions(df: pd.DataFrame, sort_col: str, descending: bool) -> np.ndarray:
+    """ลำดับแถว (ตำแหน่ง) หลังเรียงตามคอลัมน์ sort_col (เรียงเฉพาะคอลัมน์นั้น ไม่ copy ทั้งตาราง)"""
+    if sort_col == UNSORTED or sort_col not in df.columns:
+        return np.arange(len(df))
+    col = df[sort_col].reset_index(drop=True)
+    try:
+        ordered = col.sort_values(ascending=not descending, kind="stable", na_position="last")
+    except TypeError:
+        # คอลัมน์ที่มีทั้งตัวเลขและข้อความปนกัน -> เรียงแบบข้อความ
+        ordered = col.astype(str).sort_values(ascending=not descending, kind="stable")
+    return ordered.index.to_numpy()
+
+
+class PagedTable:
+    """สถานะของตารางแบ่งหน้า 1 ตาราง (แถวที่เลือก / cell ที่แก้ ของทุกหน้า)"""
+
+    def __init__(self, key: str, df: pd.DataFrame, ids: pd.Series):
+        self.key = key
+        self.df = df
+        self.ids = ids
+
+    @property
+    def selected(self) -> set[str]:
+        return st.session_state.setdefault(f"{self.key}__selected", set())
+
+    @property
+    def edits(self) -> dict[str, dict]:
+        """{row id: {คอลัมน์: ค่าใหม่}}"""
+        return st.session_state.setdefault(f"{self.key}__edits", {})
+
+    def selected_index(self) -> list:
+        """index (ของ df ที่ส่งเข้ามา) ของแถวที่เลือกไว้ ทุกหน้า"""
+        return self.df.index[self.ids.isin(self.selected).to_numpy()].tolist()
+
+    def edited_rows(self) -> pd.DataFrame:
+        """แถวที่มีการแก้ (ทุกหน้า) พร้อมค่าที่แก้แล้ว"""
+        edits = self.edits
+        rows = self.df[self.ids.isin(edits.keys()).to_numpy()].copy()
+        return _apply_edits(rows, self.ids.loc[rows.index], edits)
+
+    def clear(self):
+        """ล้างที่เลือก / ที่แก้ไว้ (เรียกหลังบันทึกสำเร็จ)"""
+        self.selected.clear()
+        self.edits.clear()
+        self._bump()
+
+    def select_all(self):
+        self.selected.update(self.ids.tolist())
+        self._bump()
+
+    def clear_selection(self):
+        self.selected.clear()
+        self._bump()
+
+    def _bump(self):
+        # เปลี่ยน key ของ data_editor ให้ทิ้งค่าที่ติ๊ก/แก้ค้างใน widget เดิม
+        st.session_state[f"{self.key}__gen"] = st.session_state.get(f"{self.key}__gen", 0) + 1
+
+
+def _apply_edits(frame: pd.DataFrame, ids: pd.Series, edits: dict[str, dict]) -> pd.DataFrame:
+    for idx, row_id in zip(frame.index, ids):
+        for col, value in edits.get(row_id, {}).items():
+            if col in frame.columns:
+                frame.at[idx, col] = value
+    return frame
+
+
+def _remember(table: PagedTable, out: pd.DataFrame, original: pd.DataFrame, page_ids: pd.Series,
+              editable: list[str], selectable: bool):
+    """จำค่าที่ติ๊ก/แก้ในหน้านี้ลง session_state ตาม row id"""
+    ids = page_ids.to_numpy()
+    if selectable:
+        checked = out[SELECT_COL].fillna(False).to_numpy(dtype=bool)
+        table.selected.update(ids[checked].tolist())
+        table.selected.difference_update(ids[~checked].tolist())
+
+    edits = table.edits
+    for col in editable:
+        if col not in out.columns:
+            continue
+        same = _same(out[col].reset_index(drop=True), original[col].reset_index(drop=True))
+        for row_id, value, unchanged in zip(ids, out[col].tolist(), same):
+            if unchanged:
+                # แก้กลับเป็นค่าเดิม -> ไม่นับว่าแก้
+                if col in edits.get(row_id, {}):
+                    del edits[row_id][col]
+                    if not edits[row_id]:
+                        del edits[row_id]
+            else:
+                edits.setdefault(row_id, {})[col] = value
+
+
+def paged_table(df: pd.DataFrame, key: str, keys: list[list[str]] | None = None,
+                editable: list[str] | None = None, selectable: bool = False,
+                column_config: dict | None = None, page_size: int = 100) -> PagedTable:
+    """
+    แสดง df แบบแบ่งหน้า (เรียง / เปลี่ยนหน้าบน server ส่งไป browser แค่หน้าเดียว)
+    keys       : ชุดคอลัมน์ที่ใช้เป็น row id (ดู row_ids)
+    editable   : คอลัมน์ที่แก้ได้ในตาราง (ไม่มี + selectable=False = st.dataframe ดูอย่างเดียว)
+    selectable : เพิ่มคอลัมน์ checkbox "เลือก" เป็นคอลัมน์แรก
+    คืน PagedTable ไว้อ่านแถวที่เลือก / แถวที่แก้ของทุกหน้า
+    """
+    editable = editable or []
+    column_config = {**{c: None for c in HIDDEN_COLUMNS if c in df.columns}, **(column_config or {})}
+    ids = row_ids(df, keys)
+    table = PagedTable(key, df, ids)
+
+    # ---------- เรียง / ขนาดหน้า / เลขหน้า ----------
+    col_sort, col_desc, col_size, col_page = st.columns([3, 1, 1, 1])
+    with col_sort:
+        sort_col = st.selectbox("เรียงตาม", [UNSORTED] + [c for c in df.columns if c not in HIDDEN_COLUMNS], key=f"{key}__sort")
+    with col_desc:
+        descending = st.toggle("มากไปน้อย", key=f"{key}__desc")
+    with col_size:
+        size = st.selectbox("แถวต่อหน้า", PAGE_SIZES, index=PAGE_SIZES.index(page_size), key=f"{key}__size")
+    n_pages = max(1, -(-len(df) // size))
+    page_key = f"{key}__page"
+    if st.session_state.get(page_key, 1) > n_pages:
+        # ตัวกรองเปลี่ยน จำนวนหน้าลดลง -> ไปหน้าสุดท้ายที่มี
+        st.session_state[page_key] = n_pages
+    with col_page:
+        page = st.number_input(f"หน้า (จาก {n_pages})", min_value=1, max_value=n_pages, step=1, key=page_key)
+
+    positions = _sort_positions(df, sort_col, descending)
+    start = (int(page) - 1) * size
+    page_pos = positions[start:start + size]
+    original = df.iloc[page_pos]
+    page_ids = ids.iloc[page_pos]
+
+    # ---------- ตารางเฉพาะหน้านี้ ----------
+    if not editable and not selectable:
+        st.dataframe(original, use_container_width=True, hide_index=True, column_config=column_config)
+        st.caption(f"แถว {start + 1 if len(df) else 0}-{start + len(original)} จาก {len(df)}")
+        return table
+
+    view = _apply_edits(original.copy(), page_ids, table.edits)
+    if selectable:
+        view.insert(0, SELECT_COL, page_ids.isin(table.selected).to_numpy())
+    disabled = [c for c in view.columns if c not in editable and c != SELECT_COL]
+
+    # key ผูกกับแถวที่อยู่ในหน้า: เปลี่ยนหน้า/เรียงใหม่ = widget ใหม่ (ค่าที่ติ๊กไว้ใส่กลับจาก session_state)
+    signature = hashlib.md5("\x1f".join(page_ids).encode("utf-8")).hexdigest()[:12]
+    generation = st.session_state.get(f"{key}__gen", 0)
+    out = st.data_editor(
+        view,
+        use_container_width=True,
+        hide_index=True,
+        column_config=column_config,
+        disabled=disabled,
+        num_rows="fixed",
+        key=f"{key}__editor_{generation}_{signature}",
+    )
+    _remember(table, out, original, page_ids, editable, selectable)
+
+    col_info, col_all, col_clear = st.columns([4, 1, 1])
+    with col_info:
+        note = f"แถว {start + 1 if len(df) else 0}-{start + len(original)} จาก {len(df)}"
+        if selectable:
+            note += f" · เลือกไว้ {len(table.selected_index())} รายการ"
+        if table.edits:
+            note += f" · แก้ไว้ {len(table.edits)} แถว (ยังไม่บันทึก)"
+        st.caption(note)
+    if selectable:
+        with col_all:
+            st.button("เลือกทั้งหมด", key=f"{key}__all", help="เลือกทุกแถวตามตัวกรอง (ทุกหน้า)",
+                      on_click=table.select_all)
+        with col_clear:
+            st.button("ล้างที่เลือก", key=f"{key}__none", on_click=table.clear_selection)
+    return table
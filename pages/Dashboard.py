@@ -1,113 +1,158 @@
 # pages/1_📊_Dashboard.py
 import streamlit as st
 import pandas as pd
-from gsheet_utils import load_sheet, save_sheet
+from gsheet_utils import load_sheet, save_sheet, SHEET_KEYS
+from kpi_rollup import dashboard_summary
+from paged_table import paged_table
+from reports import REPORT_MIME, REPORTS, export_report
+from telemetry import end_page, start_page
 
 st.set_page_config(page_title="Purchase Dashboard", layout="wide")
 
 st.title("📊 Purchase Dashboard")
+start_page("Dashboard")
 
-# โหลดข้อมูล
-df_req = load_sheet("Request")
-df_prpo = load_sheet("PR_PO")
-
-if df_req.empty and df_prpo.empty:
-    st.info("ยังไม่มีข้อมูลในระบบเลย ลองไปสร้างคำขอสั่งซื้อหรือ PR/PO ก่อนนะ ✨")
-    st.stop()
-
-today = pd.Timestamp.today().normalize()
-
-# ทำ Lead Time (วัน) จาก Request_Date
-if not df_req.empty and "Request_Date" in df_req.columns:
-    try:
-        df_req["Request_Date_parsed"] = pd.to_datetime(df_req["Request_Date"])
-        df_req["Lead_Days"] = (today - df_req["Request_Date_parsed"]).dt.days
-    except Exception:
-        df_req["Lead_Days"] = None
-
-# ================= KPI บนสุด =================
-col1, col2, col3, col4 = st.columns(4)
-
-total_requests = len(df_req) if not df_req.empty else 0
-pending_statuses = [
-    "ขอสั่งซื้อ",
-    "ขอเสนอราคา",
-    "เปิดใบขอซื้อ(PR)",
-    "รออนุมัติโดยHead",
-    "รออนุมัติโดยCOO",
-]
-pending_requests = (
-    df_req["Status"].isin(pending_statuses).sum() if not df_req.empty else 0
-)
-
-total_po = len(df_prpo) if not df_prpo.empty else 0
-received_po = (
-    df_prpo["Status"].eq("รับสินค้าเข้าแล้ว").sum() if not df_prpo.empty else 0
-)
-
-col1.metric("จำนวนคำขอสั่งซื้อทั้งหมด", total_requests)
-col2.metric("คำขอสั่งซื้อที่ยังไม่ปิด", pending_requests)
-col3.metric("จำนวน PR/PO ทั้งหมด", total_po)
-col4.metric("PO ที่รับสินค้าแล้ว", received_po)
-
-st.markdown("---")
-
-# ================= Chart: Request by Status =================
-col_left, col_right = st.columns(2)
-
-with col_left:
-    st.subheader("จำนวนคำขอสั่งซื้อตามสถานะ")
-
-    if not df_req.empty:
-        status_counts = df_req["Status"].value_counts().reset_index()
-        status_counts.columns = ["Status", "Count"]
-        st.bar_chart(
-            status_counts.set_index("Status")["Count"],
-            height=300,
-        )
-    else:
-        st.caption("ยังไม่มี Request")
+try:
+    # ตัวเลขสรุป (นับไว้แล้ว อัปเดตเองเมื่อมีการบันทึก) ไม่ต้องโหลด Request / PR_PO ทั้ง Sheet
+    summary = dashboard_summary()
 
-with col_right:
-    st.subheader("Priority Breakdown")
+    if summary["total_requests"] == 0 and summary["total_po"] == 0:
+        st.info("ยังไม่มีข้อมูลในระบบเลย ลองไปสร้างคำขอสั่งซื้อหรือ PR/PO ก่อนนะ ✨")
+        st.stop()
 
-    if not df_req.empty:
-        prio_counts = df_req["Priority"].value_counts().reset_index()
-        prio_counts.columns = ["Priority", "Count"]
-        st.bar_chart(
-            prio_counts.set_index("Priority")["Count"],
-            height=300,
-        )
-    else:
-        st.caption("ยังไม่มี Request")
+    def count_series(counts: dict, name: str) -> pd.Series:
+        """dict {ค่า: จำนวน} -> Series สำหรับ st.bar_chart (มากไปน้อย)"""
+        return pd.Series(counts, name="Count", dtype="int64").rename_axis(name).sort_values(ascending=False)
+
+    # ================= KPI บนสุด =================
+    col1, col2, col3, col4 = st.columns(4)
+
+    col1.metric("จำนวนคำขอสั่งซื้อทั้งหมด", summary["total_requests"])
+    col2.metric("คำขอสั่งซื้อที่ยังไม่ปิด", summary["pending_requests"])
+    col3.metric("จำนวน PR/PO ทั้งหมด", summary["total_po"])
+    col4.metric("PO ที่รับสินค้าแล้ว", summary["received_po"])
+
+    st.markdown("---")
+
+    # ================= Chart: Request by Status =================
+    col_left, col_right = st.columns(2)
 
-st.markdown("---")
+    with col_left:
+        st.subheader("จำนวนคำขอสั่งซื้อตามสถานะ")
 
-# ================= ตารางรายละเอียดแบบ Filter =================
-st.subheader("รายละเอียดคำขอสั่งซื้อ (Filter ได้)")
+        if summary["request_status"]:
+            st.bar_chart(count_series(summary["request_status"], "Status"), height=300)
+        else:
+            st.caption("ยังไม่มี Request")
 
-if not df_req.empty:
-    # Filter by Status & Priority
-    status_options = ["(ทั้งหมด)"] + sorted(df_req["Status"].dropna().unique().tolist())
-    prio_options = ["(ทั้งหมด)"] + sorted(
-        df_req["Priority"].dropna().unique().tolist()
-    )
+    with col_right:
+        st.subheader("Priority Breakdown")
 
-    f_col1, f_col2 = st.columns(2)
-    with f_col1:
-        status_filter = st.selectbox("กรองตาม Status", status_options)
-    with f_col2:
-        prio_filter = st.selectbox("กรองตาม Priority", prio_options)
+        if summary["request_priority"]:
+            st.bar_chart(count_series(summary["request_priority"], "Priority"), height=300)
+        else:
+            st.caption("ยังไม่มี Request")
 
-    df_view = df_req.copy()
-    if status_filter != "(ทั้งหมด)":
-        df_view = df_view[df_view["Status"] == status_filter]
-    if prio_filter != "(ทั้งหมด)":
-        df_view = df_view[df_view["Priority"] == prio_filter]
+    # ================= Chart: PR/PO by Status / Vendor =================
+    col_left2, col_right2 = st.columns(2)
 
-    st.dataframe(df_view, use_container_width=True, hide_index=True)
-else:
-    st.caption("ยังไม่มี Request ให้แสดง")
+    with col_left2:
+        st.subheader("จำนวนรายการ PR/PO ตามสถานะ")
 
+        if summary["prpo_status"]:
+            st.bar_chart(count_series(summary["prpo_status"], "Status"), height=300)
+        else:
+            st.caption("ยังไม่มี PR/PO")
 
+    with col_right2:
+        st.subheader("Vendor ที่มีรายการ PR/PO มากที่สุด (Top 10)")
 
+        if summary["prpo_vendor"]:
+            st.bar_chart(count_series(summary["prpo_vendor"], "Vendor_Name").head(10), height=300)
+        else:
+            st.caption("ยังไม่มี PR/PO")
+
+    st.markdown("---")
+
+    # ================= ตารางรายละเอียดแบบ Filter =================
+    st.subheader("รายละเอียดคำขอสั่งซื้อ (Filter ได้)")
+
+    # ตารางต้องใช้ Request ทุกแถว -> โหลดเมื่อเปิดดูเท่านั้น (จอ Dashboard ที่เปิดค้างไว้ไม่ต้องโหลด)
+    show_detail = st.toggle("แสดงตารางรายละเอียด", value=False)
+
+    if not show_detail:
+        st.caption("เปิดสวิตช์ด้านบนเพื่อโหลดตารางรายละเอียดคำขอสั่งซื้อ")
+    elif summary["total_requests"] == 0:
+        st.caption("ยังไม่มี Request ให้แสดง")
+    else:
+        df_req = load_sheet("Request")
+
+        today = pd.Timestamp.today().normalize()
+
+        # ทำ Lead Time (วัน) จาก Request_Date (load_sheet แปลงเป็นวันที่ตาม SHEET_SCHEMAS แล้ว
+        # ถ้ายังเป็นข้อความ = มีค่าที่ไม่ใช่วันที่ปนอยู่ -> ไม่คำนวณ)
+        if "Request_Date" in df_req.columns:
+            if pd.api.types.is_datetime64_any_dtype(df_req["Request_Date"]):
+                df_req["Lead_Days"] = (today - df_req["Request_Date"]).dt.days
+            else:
+                df_req["Lead_Days"] = None
+
+        # Filter by Status & Priority
+        status_options = ["(ทั้งหมด)"] + sorted(df_req["Status"].dropna().unique().tolist())
+        prio_options = ["(ทั้งหมด)"] + sorted(
+            df_req["Priority"].dropna().unique().tolist()
+        )
+
+        f_col1, f_col2 = st.columns(2)
+        with f_col1:
+            status_filter = st.selectbox("กรองตาม Status", status_options)
+        with f_col2:
+            prio_filter = st.selectbox("กรองตาม Priority", prio_options)
+
+        df_view = df_req.copy()
+        if status_filter != "(ทั้งหมด)":
+            df_view = df_view[df_view["Status"] == status_filter]
+        if prio_filter != "(ทั้งหมด)":
+            df_view = df_view[df_view["Priority"] == prio_filter]
+
+        # ส่งไป browser ทีละหน้า (เรียง / เปลี่ยนหน้าบน server)
+        paged_table(df_view, "dash_req", keys=SHEET_KEYS["Request"])
+
+    st.markdown("---")
+
+    # ================= ส่งออกรายงาน =================
+    st.subheader("📤 ส่งออกรายงาน PR/PO (CSV / Excel)")
+
+    col_report, col_format, col_archive = st.columns([2, 1, 1])
+    with col_report:
+        report = st.selectbox("รายงาน", list(REPORTS), format_func=REPORTS.get)
+    with col_format:
+        report_format = st.radio("ชนิดไฟล์", ["csv", "xlsx"], horizontal=True)
+    with col_archive:
+        report_archive = st.checkbox("รวมรายการที่เก็บถาวรแล้ว", value=True)
+
+    # สร้างไฟล์เมื่อกดปุ่มเท่านั้น (ไฟล์อยู่บนดิสก์ชั่วคราว เก็บไว้ใน session จนกว่าจะสร้างใหม่)
+    if st.button("สร้างรายงาน"):
+        previous = st.session_state.pop("report_file", None)
+        if previous is not None:
+            previous[0].close()
+        try:
+            with st.spinner("กำลังสร้างรายงาน..."):
+                report_file = export_report(report, report_format, report_archive)
+        except ImportError:
+            st.error("สร้างไฟล์ Excel ไม่ได้ (ยังไม่ได้ติดตั้ง openpyxl) เลือกเป็น CSV แทน")
+        else:
+            stamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M")
+            st.session_state["report_file"] = (report_file, f"{report}_{stamp}.{report_format}", report_format)
+
+    if "report_file" in st.session_state:
+        report_file, file_name, file_format = st.session_state["report_file"]
+        report_file.seek(0)
+        st.download_button(
+            f"⬇ ดาวน์โหลด {file_name}",
+            data=report_file,
+            file_name=file_name,
+            mime=REPORT_MIME[file_format],
+        )
+finally:
+    end_page()
@@ -0,0 +1,128 @@
+# pages/9_🩺_Diagnostics.py
+# หน้าสำหรับผู้ดูแล: เวลา / จำนวนครั้งเรียก Sheets API / cache hit / retry แยกตาม Sheet และตามหน้า
+import json
+
+import streamlit as st
+import pandas as pd
+from gsheet_utils import telemetry_snapshot
+from telemetry import get_telemetry
+
+st.set_page_config(page_title="Diagnostics", layout="wide")
+st.title("🩺 Diagnostics")
+
+snapshot = telemetry_snapshot()
+
+if not snapshot["enabled"]:
+    st.warning("telemetry ปิดอยู่ (TELEMETRY_ENABLED = false ใน secrets)")
+
+st.caption(
+    f"นับตั้งแต่ {snapshot['started_at']} ({snapshot['uptime_s'] / 60:.0f} นาที) "
+    "ตัวเลขเก็บในหน่วยความจำของ process นี้ (restart แล้วเริ่มนับใหม่)"
+)
+
+
+def hit_rate(counts: dict) -> float | None:
+    """สัดส่วนที่ได้จาก cache โดยไม่ต้องดึงข้อมูลใหม่ (hit + revalidated + shared + restored) / ทั้งหมด (รวม miss + sync)"""
+    served = (
+        counts.get("cache_hit", 0) + counts.get("cache_revalidated", 0)
+        + counts.get("cache_shared", 0) + counts.get("cache_restored", 0)
+    )
+    total = served + counts.get("cache_miss", 0) + counts.get("cache_synced", 0)
+    return round(100 * served / total, 1) if total else None
+
+
+def group_table(groups: dict, ops: list[str]) -> pd.DataFrame:
+    """ตารางสรุป 1 แถวต่อ Sheet / หน้า"""
+    rows = []
+    for name, group in groups.items():
+        counts, timings = group["counts"], group["timings"]
+        row = {
+            "ชื่อ": name,
+            "API calls": counts.get("api_calls", 0),
+            "cache hit %": hit_rate(counts),
+            "cache miss": counts.get("cache_miss", 0),
+            "sync เฉพาะแถว": counts.get("cache_synced", 0),
+            "จาก snapshot": counts.get("cache_restored", 0),
+            "retries": counts.get("api_retries", 0),
+            "errors": counts.get("api_errors", 0) + counts.get("write_errors", 0) + counts.get("snapshot_errors", 0),
+            "429": counts.get("api_quota_errors", 0),
+            "conflicts": counts.get("write_conflicts", 0),
+            "KB ส่ง": round(counts.get("bytes_sent", 0) / 1024, 1),
+            "KB รับ": round(counts.get("bytes_received", 0) / 1024, 1),
+        }
+        for op in ops:
+            timing = timings.get(op)
+            row[f"{op} p50 ms"] = timing["p50_ms"] if timing else None
+            row[f"{op} p95 ms"] = timing["p95_ms"] if timing else None
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# ================= Quota =================
+quota = snapshot["quota"]
+col1, col2, col3 = st.columns(3)
+col1.metric(
+    "อ่าน (60 วินาทีล่าสุด)",
+    f"{quota['reads_last_minute']} / {quota['read_quota_per_minute']:.0f}",
+)
+col2.metric(
+    "เขียน (60 วินาทีล่าสุด)",
+    f"{quota['writes_last_minute']} / {quota['write_quota_per_minute']:.0f}",
+)
+col3.metric("งานเขียนที่ค้างในคิว", snapshot["pending_writes"])
+
+# ================= ตามหน้า =================
+st.subheader("แยกตามหน้า")
+if snapshot["pages"]:
+    pages = group_table(snapshot["pages"], ["render", "render.sheet_io", "render.app"])
+    pages.insert(1, "รอบที่รัน", [g["counts"].get("renders", 0) for g in snapshot["pages"].values()])
+    st.dataframe(pages, use_container_width=True, hide_index=True)
+    st.caption("render = ทั้งรอบ, render.sheet_io = รอ load_sheet(s), render.app = ที่เหลือ (pandas + วาดหน้า)")
+else:
+    st.caption("ยังไม่มีข้อมูล")
+
+# ================= ตาม Sheet =================
+st.subheader("แยกตาม Sheet")
+if snapshot["sheets"]:
+    sheets = group_table(snapshot["sheets"], ["parse", "write.flush"])
+    sheets.insert(1, "แถวที่โหลด", [g["counts"].get("rows_loaded", 0) for g in snapshot["sheets"].values()])
+    sheets["เพิ่ม Row_Version"] = [g["counts"].get("row_version_added", 0) for g in snapshot["sheets"].values()]
+    st.dataframe(sheets, use_container_width=True, hide_index=True)
+else:
+    st.caption("ยังไม่มีข้อมูล")
+
+# ================= ตามชนิดงาน (histogram) =================
+st.subheader("เวลาแยกตามชนิดงาน")
+ops = snapshot["ops"]
+if ops:
+    st.dataframe(
+        pd.DataFrame([
+            {"งาน": op, **{k: v for k, v in timing.items() if k != "buckets"}}
+            for op, timing in ops.items()
+        ]),
+        use_container_width=True,
+        hide_index=True,
+    )
+    op = st.selectbox("ดู histogram ของ", list(ops))
+    buckets = pd.Series(ops[op]["buckets"], name="จำนวนครั้ง", dtype="int64").rename_axis("ms")
+    st.bar_chart(buckets, height=250)
+else:
+    st.caption("ยังไม่มีข้อมูล")
+
+# ================= Export =================
+st.markdown("---")
+col_dl, col_reset = st.columns([1, 1])
+with col_dl:
+    st.download_button(
+        "⬇ ดาวน์โหลด JSON",
+        data=json.dumps(snapshot, ensure_ascii=False, indent=2),
+        file_name=f"telemetry_{snapshot['generated_at'].replace(':', '')}.json",
+        mime="application/json",
+    )
+with col_reset:
+    if st.button("ล้างตัวเลขทั้งหมด"):
+        get_telemetry().reset()
+        st.rerun()
+
+with st.expander("JSON ทั้งหมด"):
+    st.json(snapshot, expanded=False)
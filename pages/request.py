@@ -1,126 +1,115 @@
 import streamlit as st
 import pandas as pd
 from datetime import date
-from gsheet_utils import load_sheet, save_sheet
+from gsheet_utils import load_sheet, enqueue_append, next_id
+from item_search import get_item_index
+from ui_helpers import show_write_results, track_write
+from telemetry import end_page, start_page
+
+# จำนวนสินค้าที่แสดงในช่องเลือกต่อการค้นหา 1 ครั้ง
+ITEM_PICKER_LIMIT = 50
 
 st.title("📝 แจ้งรายการขอสั่งซื้อ")
+start_page("request")
 
-# ---------------------------------------------------------
-# LOAD DATA
-# ---------------------------------------------------------
-# ดึงสินค้าจาก Item_Data (ต้องมีคอลัมน์ No. และ Description)
-df_item = load_sheet("Item_Data")
-
-# ดึงข้อมูล PR_PO (เก็บทั้ง Request / PR / PO)
-df_prpo = load_sheet("PR_PO")
-
-# ---------------------------------------------------------
-# ฟังก์ชัน gen เลข Running Request_ID แบบ RQXXXX
-# ---------------------------------------------------------
-def generate_new_request_id(df: pd.DataFrame) -> str:
-    """
-    อ่าน Request_ID ใน df แล้ว gen เลขถัดไป เช่น RQ0001, RQ0002 ...
-    ถ้ายังไม่มี RQ เลยจะเริ่มจาก RQ0001
-    """
-    if df.empty or "Request_ID" not in df.columns:
-        return "RQ0001"
-
-    ids = df["Request_ID"].dropna().astype(str)
-    nums = []
-    for val in ids:
-        if val.startswith("RQ"):
-            digits = "".join(ch for ch in val if ch.isdigit())
-            if digits:
-                nums.append(int(digits))
-
-    next_num = max(nums) + 1 if nums else 1
-    return f"RQ{next_num:04d}"
-
-
-# ---------------------------------------------------------
-# FORM แจ้งรายการขอสั่งซื้อ
-# ---------------------------------------------------------
-st.subheader("เพิ่มคำขอสั่งซื้อใหม่ (บันทึกลง PR_PO)")
-
-with st.form("request_form", clear_on_submit=True):
+try:
+    show_write_results()
 
-    today = date.today()
+    # ---------------------------------------------------------
+    # LOAD DATA
+    # ---------------------------------------------------------
+    # ดึงสินค้าจาก Item_Data (ต้องมีคอลัมน์ No. และ Description)
+    # (ไม่ต้องโหลด PR_PO แล้ว: เลข Request_ID ขอจาก next_id และบันทึกด้วย enqueue_append)
+    df_item = load_sheet("Item_Data")
 
-    c1, c2 = st.columns(2)
-    with c1:
-        st.text_input("Request Date", today.strftime("%Y-%m-%d"), disabled=True)
-    with c2:
-        st.text_input("Status (เริ่มต้น)", "ขอสั่งซื้อ", disabled=True)
+    # ---------------------------------------------------------
+    # FORM แจ้งรายการขอสั่งซื้อ
+    # ---------------------------------------------------------
+    st.subheader("เพิ่มคำขอสั่งซื้อใหม่ (บันทึกลง PR_PO)")
+
+    today = date.today()
 
     st.markdown("### เลือก / ค้นหาสินค้า")
 
+    # ช่องค้นหาอยู่นอก form เพื่อให้รายการสินค้าอัปเดตตามคำค้นทันที
+    # และส่งไปหน้าเว็บแค่ ITEM_PICKER_LIMIT รายการที่ตรงที่สุด แทนทั้ง catalog
+    selected_item_no = None
+    selected_item_desc = None
+
     if df_item.empty or "No." not in df_item.columns or "Description" not in df_item.columns:
         st.error("ไม่พบข้อมูลสินค้าใน Sheet: Item_Data (ต้องมีคอลัมน์ 'No.' และ 'Description')")
-        selected_item_no = None
-        selected_item_desc = None
     else:
-        item_options = [
-            f"{row['No.']} - {row['Description']}"
-            for _, row in df_item.iterrows()
-        ]
-        item_options.insert(0, "-- เลือก / พิมพ์ค้นหาสินค้า --")
+        item_index = get_item_index(df_item)
+
+        item_query = st.text_input(
+            "ค้นหาสินค้า (รหัส No. หรือชื่อสินค้า)",
+            key="item_query",
+            placeholder="เช่น IT0012, lens, หลอดไฟ",
+        )
+        matches = item_index.search(item_query, limit=ITEM_PICKER_LIMIT)
 
-        chosen_item = st.selectbox(
+        chosen_row = st.selectbox(
             "สินค้า",
-            options=item_options,
-            help="พิมพ์เพื่อค้นหา แล้วเลือกจากรายการที่ขึ้นมาได้"
+            options=[None] + matches,
+            format_func=lambda row: "-- เลือก / พิมพ์ค้นหาสินค้า --" if row is None else item_index.label(row),
+            help=f"แสดง {ITEM_PICKER_LIMIT} รายการแรกที่ตรงกับคำค้น พิมพ์คำค้นให้ละเอียดขึ้นถ้ายังไม่เจอ",
         )
 
-        selected_item_no = None
-        selected_item_desc = None
-        if chosen_item != "-- เลือก / พิมพ์ค้นหาสินค้า --":
-            parts = chosen_item.split(" - ", 1)
-            selected_item_no = parts[0]
-            selected_item_desc = parts[1] if len(parts) > 1 else ""
-
-    quantity = st.number_input("Quantity", min_value=1, value=1, step=1)
-    back_order = st.text_input("Back_Order / หมายเหตุ", "")
-
-    submitted = st.form_submit_button("บันทึกคำขอสั่งซื้อ")
-
-# ---------------------------------------------------------
-# HANDLE SUBMIT
-# ---------------------------------------------------------
-if submitted:
-    if not selected_item_no:
-        st.error("กรุณาเลือกสินค้าจากช่อง 'สินค้า' ก่อนบันทึก")
-        st.stop()
-
-    new_request_id = generate_new_request_id(df_prpo)
-
-    # เตรียม row ใหม่ให้ตรงกับโครง PR_PO ปัจจุบัน
-    # ถ้าคอลัมน์บางตัวใน Sheet ใช้ชื่อแตกต่าง ให้แก้ตรง key ให้ตรง header จริง
-    new_row = {
-        "Request_Date": today.strftime("%Y-%m-%d"),
-        "Request_ID": new_request_id,
-        "PO_ID": "",                 # ยังไม่เปิด PO
-        "PR_ID": "",                 # ยังไม่เปิด PR
-        "Date": today.strftime("%Y-%m-%d"),  # หรือจะเว้นว่างก็ได้
-        "Status": "ขอสั่งซื้อ",
-        "Item_No": selected_item_no,
-        "Description": selected_item_desc,
-        "Quantity": quantity,
-        "Back_Order": back_order,
-        "Comment": "",
-        "Qty_to_Receive": quantity,   # เริ่มต้น = จำนวนที่สั่ง
-        "Quantity_Received": 0,          # ยังไม่รับเข้า
-        "Outstanding_Quantity": quantity,    # outstanding เท่ากับ qty ตอนเริ่ม
-        "Expected_Received": "",          # ถ้ามี ETA ค่อยอัปเดตทีหลัง
-        "Vendor_No.": "",
-        "Vendor_Name": "",
-    }
-
-    # ป้องกันกรณี df_prpo ไม่มีคอลัมน์ครบ (เช่น Sheet เพิ่งสร้างใหม่)
-    for col in df_prpo.columns:
-        if col not in new_row:
-            new_row[col] = ""
-
-    df_prpo = df_prpo.append(new_row, ignore_index=True)
-    save_sheet("PR_PO", df_prpo)
-
-    st.success(f"บันทึกคำขอสั่งซื้อเรียบร้อย ✅ (Request_ID: {new_request_id})")
+        if chosen_row is not None:
+            selected_item_no = str(item_index.item_no[chosen_row])
+            selected_item_desc = str(item_index.description[chosen_row])
+
+    with st.form("request_form", clear_on_submit=True):
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.text_input("Request Date", today.strftime("%Y-%m-%d"), disabled=True)
+        with c2:
+            st.text_input("Status (เริ่มต้น)", "ขอสั่งซื้อ", disabled=True)
+
+        quantity = st.number_input("Quantity", min_value=1, value=1, step=1)
+        back_order = st.text_input("Back_Order / หมายเหตุ", "")
+
+        submitted = st.form_submit_button("บันทึกคำขอสั่งซื้อ")
+
+    # ---------------------------------------------------------
+    # HANDLE SUBMIT
+    # ---------------------------------------------------------
+    if submitted:
+        if not selected_item_no:
+            st.error("กรุณาเลือกสินค้าจากช่อง 'สินค้า' ก่อนบันทึก")
+            st.stop()
+
+        # เลข RQ ถัดไป (ไม่ซ้ำกันแม้หลายคนกดบันทึกพร้อมกัน)
+        new_request_id = next_id("RQ")
+
+        # เตรียม row ใหม่ให้ตรงกับโครง PR_PO ปัจจุบัน
+        # ถ้าคอลัมน์บางตัวใน Sheet ใช้ชื่อแตกต่าง ให้แก้ตรง key ให้ตรง header จริง
+        new_row = {
+            "Request_Date": today.strftime("%Y-%m-%d"),
+            "Request_ID": new_request_id,
+            "PO_ID": "",                 # ยังไม่เปิด PO
+            "PR_ID": "",                 # ยังไม่เปิด PR
+            "Date": today.strftime("%Y-%m-%d"),  # หรือจะเว้นว่างก็ได้
+            "Status": "ขอสั่งซื้อ",
+            "Item_No": selected_item_no,
+            "Description": selected_item_desc,
+            "Quantity": quantity,
+            "Back_Order": back_order,
+            "Comment": "",
+            "Qty_to_Receive": quantity,   # เริ่มต้น = จำนวนที่สั่ง
+            "Quantity_Received": 0,          # ยังไม่รับเข้า
+            "Outstanding_Quantity": quantity,    # outstanding เท่ากับ qty ตอนเริ่ม
+            "Expected_Received": "",          # ถ้ามี ETA ค่อยอัปเดตทีหลัง
+            "Vendor_No.": "",
+            "Vendor_Name": "",
+        }
+
+        # append เฉพาะแถวใหม่ (เรียงคอลัมน์ตาม header ของ Sheet ให้เอง คอลัมน์ที่ขาดจะเป็นค่าว่าง)
+        # ส่งเข้าคิวเขียนเบื้องหลัง ไม่ต้องรอ Google Sheet
+        track_write(enqueue_append("PR_PO", [new_row]))
+
+        # ยังไม่ถึง Sheet: ผลสุดท้าย (สำเร็จ / ล้มเหลว) แจ้งใน show_write_results
+        st.info(f"ส่งคำขอสั่งซื้อเข้าคิวบันทึกแล้ว ⏳ (Request_ID: {new_request_id})")
+finally:
+    end_page()
@@ -0,0 +1,250 @@
+# purchase_ops.py
+# ฟังก์ชันคำนวณฝั่งข้อมูล PR_PO (ไม่มี UI) ให้หน้าเว็บเรียกใช้
+import numpy as np
+import pandas as pd
+
+from search_index import get_search_index
+
+RECEIVED_STATUS = "รับสินค้าเข้าแล้ว"
+
+# ช่วงเวลาของ Sheet เก็บถาวร (strftime ของวันที่ PO / วันที่ขอ) "%Y" = แยก Sheet ตามปี
+ARCHIVE_PERIOD_FORMAT = "%Y"
+
+# ไฟล์ใบรับสินค้า (CSV / Excel): ต้องมี PO_ID + Item_No และคอลัมน์จำนวนที่รับครั้งนี้ (ชื่อแรกที่พบ)
+GR_KEY_COLUMNS = ["PO_ID", "Item_No"]
+GR_QTY_COLUMNS = ["Qty", "Quantity_Received", "Quantity"]
+
+# สถานะที่นับว่าคำขอสั่งซื้อยังไม่ปิด (Dashboard)
+PENDING_STATUSES = [
+    "ขอสั่งซื้อ",
+    "ขอเสนอราคา",
+    "เปิดใบขอซื้อ(PR)",
+    "รออนุมัติโดยHead",
+    "รออนุมัติโดยCOO",
+]
+
+
+def search_items_with_wildcard(df: pd.DataFrame, keyword: str, columns: list[str]) -> pd.DataFrame:
+    """ค้นหาจากหลายคอลัมน์ใน df โดยใช้ * เป็น wildcard (ผ่าน index ค้นหาที่ cache ตามเวอร์ชันข้อมูล)"""
+    if not keyword:
+        return df
+    return get_search_index(df, columns).filter(df, keyword)
+
+
+def _as_qty(value) -> float:
+    """แปลงจำนวนจากตาราง (ค่าว่าง/None = 0) เป็น float"""
+    if value is None or value is pd.NA or value == "":
+        return 0.0
+    return float(value)
+
+
+def _numeric(series: pd.Series) -> pd.Series:
+    """แปลงคอลัมน์จำนวนเป็น float (ค่าว่าง/ตัวอักษร -> NaN)"""
+    return pd.to_numeric(series, errors="coerce").astype(float)
+
+
+def _recalc_outstanding(df: pd.DataFrame, rows: pd.Index):
+    """
+    คำนวณ Outstanding_Quantity / Qty_to_Receive ใหม่เฉพาะแถว rows
+    และถ้ามีรับเข้าแล้ว (Quantity_Received > 0) บังคับสถานะเป็น รับสินค้าเข้าแล้ว
+    """
+    for col in ["Quantity_Received", "Outstanding_Quantity", "Qty_to_Receive"]:
+        df[col] = _numeric(df[col])
+    if rows.empty:
+        return
+
+    q = _numeric(df.loc[rows, "Quantity"])
+    r = df.loc[rows, "Quantity_Received"].fillna(0)
+
+    df.loc[rows, "Outstanding_Quantity"] = (q - r).clip(lower=0)
+    df.loc[rows, "Qty_to_Receive"] = (q - r).clip(lower=0)
+    df.loc[rows[(r > 0).to_numpy()], "Status"] = RECEIVED_STATUS
+
+
+def apply_po_edits(df_prpo: pd.DataFrame, edited_po: pd.DataFrame, allowed_status: list[str]) -> pd.DataFrame:
+    """
+    นำ Quantity_Received / Status ที่แก้ในตาราง PO มาใส่ใน PR_PO ทั้งหมด
+    จับคู่แถวด้วย (PO_ID, Item_No) แบบ join ครั้งเดียว (ถ้า key ซ้ำในตาราง แถวล่างสุดชนะ
+    และใส่ให้ทุกแถวใน PR_PO ที่ key ตรงกัน) แล้วคำนวณยอดค้างรับใหม่เฉพาะแถวที่ค่าเปลี่ยนจริง
+    """
+    df_new = df_prpo.copy()
+    if edited_po.empty:
+        _recalc_outstanding(df_new, df_new.index[:0])
+        return df_new
+
+    edits = pd.DataFrame({
+        "PO_ID": edited_po["PO_ID"].astype(str),
+        "Item_No": edited_po["Item_No"].astype(str),
+        "Quantity_Received": edited_po.get("Quantity_Received", pd.Series(0, index=edited_po.index)).map(_as_qty),
+        "Status": edited_po.get("Status", pd.Series("", index=edited_po.index)),
+    }).drop_duplicates(["PO_ID", "Item_No"], keep="last")
+
+    # index ของ key ทั้ง Sheet สร้างครั้งเดียว แล้วหาแถวที่ตรงกับแต่ละ edit แบบ vectorized
+    edit_keys = pd.MultiIndex.from_frame(edits[["PO_ID", "Item_No"]])
+    all_keys = pd.MultiIndex.from_arrays([df_new["PO_ID"].astype(str), df_new["Item_No"].astype(str)])
+    pos = edit_keys.get_indexer(all_keys)
+    hit = pos >= 0
+
+    rows = df_new.index[hit]
+    new_recv = edits["Quantity_Received"].to_numpy()[pos[hit]]
+    new_status = edits["Status"].to_numpy()[pos[hit]]
+    status_ok = pd.Series(new_status).isin(allowed_status).to_numpy()
+
+    old_recv = _numeric(df_new.loc[rows, "Quantity_Received"]).to_numpy()
+    old_status = df_new.loc[rows, "Status"].to_numpy()
+    changed = (old_recv != new_recv) | (status_ok & (old_status != new_status))
+
+    rows = rows[changed]
+    new_recv, new_status, status_ok = new_recv[changed], new_status[changed], status_ok[changed]
+
+    df_new["Quantity_Received"] = _numeric(df_new["Quantity_Received"])
+    df_new.loc[rows, "Quantity_Received"] = new_recv
+    df_new.loc[rows[status_ok], "Status"] = new_status[status_ok]
+
+    _recalc_outstanding(df_new, rows)
+    return df_new
+
+
+def receive_whole_po(df_prpo: pd.DataFrame, po_id: str) -> pd.DataFrame:
+    """รับเข้าครบทุกรายการของ PO_ID (Quantity_Received = Quantity) แล้วคำนวณยอดค้างรับใหม่"""
+    df_new = df_prpo.copy()
+    rows = df_new.index[(df_new["PO_ID"].astype(str) == po_id).to_numpy()]
+
+    df_new["Quantity_Received"] = _numeric(df_new["Quantity_Received"])
+    df_new.loc[rows, "Quantity_Received"] = _numeric(df_new.loc[rows, "Quantity"])
+
+    _recalc_outstanding(df_new, rows)
+    return df_new
+
+
+def closed_po_periods(df_prpo: pd.DataFrame) -> pd.Series:
+    """
+    รายการ PR_PO ที่ปิดแล้ว (รับสินค้าเข้าแล้ว และยอดค้างรับ = 0) ที่ย้ายไปเก็บถาวรได้
+    คืน Series: index = แถวใน df_prpo, ค่า = ช่วงเวลาจาก Date (ไม่มีใช้ Request_Date)
+    แถวที่ไม่มีวันที่เลยจะไม่ถูกย้าย
+    """
+    if df_prpo.empty or "Status" not in df_prpo.columns or "Outstanding_Quantity" not in df_prpo.columns:
+        return pd.Series(dtype=str)
+
+    dates = pd.Series(pd.NaT, index=df_prpo.index, dtype="datetime64[s]")
+    for col in ["Date", "Request_Date"]:
+        if col in df_prpo.columns:
+            dates = dates.fillna(pd.to_datetime(df_prpo[col], errors="coerce", format="mixed"))
+
+    closed = (
+        df_prpo["Status"].eq(RECEIVED_STATUS).fillna(False)
+        & _numeric(df_prpo["Outstanding_Quantity"]).eq(0)
+        & dates.notna()
+    )
+    return dates[closed].dt.strftime(ARCHIVE_PERIOD_FORMAT)
+
+
+# -------------------------------------------------------
+# นำเข้าใบรับสินค้า (CSV / Excel)
+# -------------------------------------------------------
+def read_goods_receipt(file, name: str) -> pd.DataFrame:
+    """อ่านไฟล์ใบรับสินค้า (.csv / .xlsx) ทุกคอลัมน์เป็นข้อความ (Excel ต้องมี openpyxl)"""
+    if name.lower().endswith((".xlsx", ".xlsm")):
+        return pd.read_excel(file, dtype=str, engine="openpyxl").fillna("")
+    return pd.read_csv(file, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+
+def check_goods_receipt(df_prpo: pd.DataFrame, df_gr: pd.DataFrame) -> pd.DataFrame:
+    """
+    ตรวจไฟล์รับสินค้ากับบรรทัด PO ใน PR_PO ทีเดียวทั้งไฟล์ (ไม่วนทีละแถว)
+    PO_ID + Item_No ซ้ำในไฟล์ = รวมจำนวน (รับบางส่วนหลายรอบในไฟล์เดียวได้)
+    คืนตาราง 1 แถวต่อ (PO_ID, Item_No): Qty, Lines, Outstanding, Row (index ใน df_prpo),
+    Problem ("" = ผ่าน)
+    ไฟล์ไม่มีคอลัมน์ที่ต้องใช้ -> ValueError
+    """
+    missing = [c for c in GR_KEY_COLUMNS if c not in df_gr.columns]
+    qty_col = next((c for c in GR_QTY_COLUMNS if c in df_gr.columns), None)
+    if missing or qty_col is None:
+        need = missing + ([] if qty_col else [" / ".join(GR_QTY_COLUMNS)])
+        raise ValueError(f"ไฟล์ไม่มีคอลัมน์: {', '.join(need)}")
+
+    gr = pd.DataFrame({
+        "PO_ID": df_gr["PO_ID"].astype(str).str.strip(),
+        "Item_No": df_gr["Item_No"].astype(str).str.strip(),
+        "Qty": pd.to_numeric(df_gr[qty_col].astype(str).str.strip().str.replace(",", ""), errors="coerce"),
+    })
+    gr = gr[(gr["PO_ID"] != "") | (gr["Item_No"] != "")]  # แถวว่างในไฟล์
+    gr["Bad"] = gr["Qty"].isna() | (gr["Qty"] <= 0)
+    out = (
+        gr.groupby(GR_KEY_COLUMNS, sort=False)
+        .agg(Qty=("Qty", "sum"), Lines=("Qty", "size"), Bad=("Bad", "any"))
+        .reset_index()
+    )
+
+    # บรรทัด PO ใน PR_PO: key ที่ซ้ำกันเองจับคู่ไม่ได้ (ไม่รู้จะลงแถวไหน)
+    lines = df_prpo[df_prpo["PO_ID"].astype(str).str.strip() != ""]
+    line_keys = pd.MultiIndex.from_arrays(
+        [lines["PO_ID"].astype(str).str.strip(), lines["Item_No"].astype(str).str.strip()]
+    )
+    gr_keys = pd.MultiIndex.from_frame(out[GR_KEY_COLUMNS])
+    n_match = pd.Series(1, index=line_keys).groupby(level=[0, 1]).size().reindex(gr_keys).fillna(0).to_numpy()
+
+    unique = ~line_keys.duplicated(keep=False)
+    pos = line_keys[unique].get_indexer(gr_keys)
+    found = pos >= 0
+    matched = lines[unique].iloc[pos[found]]
+
+    outstanding = np.full(len(out), np.nan)
+    outstanding[found] = (
+        _numeric(matched["Quantity"]).fillna(0) - _numeric(matched["Quantity_Received"]).fillna(0)
+    ).clip(lower=0).to_numpy()
+    out["Outstanding"] = outstanding
+    out["Row"] = pd.Series(matched.index, index=out.index[found]).reindex(out.index)
+
+    out["Problem"] = np.select(
+        [
+            out["Bad"].to_numpy(),
+            n_match == 0,
+            n_match > 1,
+            outstanding <= 0,
+            out["Qty"].to_numpy() > outstanding,
+        ],
+        [
+            "จำนวนไม่ถูกต้อง",
+            "ไม่พบ PO_ID + Item_No นี้",
+            "PO_ID + Item_No ซ้ำใน PR_PO",
+            "รับครบแล้ว",
+            "เกินยอดค้างรับ",
+        ],
+        default="",
+    )
+    return out.drop(columns="Bad")
+
+
+def apply_goods_receipt(df_prpo: pd.DataFrame, checked: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    บวกจำนวนรับเข้าจากแถวที่ผ่าน check_goods_receipt เข้า Quantity_Received
+    แล้วคำนวณยอดค้างรับ / สถานะใหม่เฉพาะแถวนั้น
+    คืน (df ใหม่, ตารางเทียบค่าเดิม -> ค่าใหม่ สำหรับ preview)
+    """
+    ok = checked[checked["Problem"] == ""]
+    rows = pd.Index(ok["Row"].tolist(), dtype=df_prpo.index.dtype)
+
+    df_new = df_prpo.copy()
+    df_new["Quantity_Received"] = _numeric(df_new["Quantity_Received"])
+    old_recv = df_new.loc[rows, "Quantity_Received"].fillna(0).to_numpy()
+    old_out = _numeric(df_new.loc[rows, "Outstanding_Quantity"]).to_numpy()
+    old_status = df_new.loc[rows, "Status"].to_numpy()
+
+    df_new.loc[rows, "Quantity_Received"] = old_recv + ok["Qty"].to_numpy()
+    _recalc_outstanding(df_new, rows)
+
+    preview = pd.DataFrame({
+        "PO_ID": ok["PO_ID"].to_numpy(),
+        "Item_No": ok["Item_No"].to_numpy(),
+        "Description": df_new.loc[rows, "Description"].to_numpy() if "Description" in df_new.columns else "",
+        "Quantity": _numeric(df_new.loc[rows, "Quantity"]).to_numpy(),
+        "รับครั้งนี้": ok["Qty"].to_numpy(),
+        "Quantity_Received (เดิม)": old_recv,
+        "Quantity_Received (ใหม่)": df_new.loc[rows, "Quantity_Received"].to_numpy(),
+        "Outstanding (เดิม)": old_out,
+        "Outstanding (ใหม่)": df_new.loc[rows, "Outstanding_Quantity"].to_numpy(),
+        "Status (เดิม)": old_status,
+        "Status (ใหม่)": df_new.loc[rows, "Status"].to_numpy(),
+    })
+    return df_new, preview
@@ -0,0 +1,224 @@
+# reports.py
+# รายงานส่งออก (CSV / Excel) จาก PR_PO สำหรับฝ่ายจัดซื้อ / การเงิน (ไม่มี UI)
+#   - ยอดค้างรับตาม Vendor
+#   - อายุยอดค้างรับ (นับจาก Expected_Received) แยกตาม Vendor
+#   - สั่ง vs รับแล้ว ต่อ PO
+# อ่าน PR_PO (รวม shard / Sheet เก็บถาวร) ทีละช่วงแถวผ่าน gsheet_utils.iter_sheet_chunks แล้วสรุปสะสมทีละช่วง
+# (Sheet เก็บถาวรดึงจาก Google ทีละช่วงแถวโดยไม่เก็บลง cache)
+# ผลลัพธ์เขียนลงไฟล์ชั่วคราวบนดิสก์ทีละช่วง ไม่ต่อประวัติทั้งหมดเป็นก้อนเดียว และไม่สร้างทั้งไฟล์ในหน่วยความจำ
+import io
+import tempfile
+from typing import BinaryIO, Iterator
+
+import numpy as np
+import pandas as pd
+
+import gsheet_utils
+from telemetry import get_telemetry
+
+REPORTS = {
+    "outstanding_by_vendor": "ยอดค้างรับตาม Vendor",
+    "aging": "อายุยอดค้างรับตาม Expected_Received (แยก Vendor)",
+    "po_received": "สั่ง vs รับแล้ว ต่อ PO",
+}
+REPORT_MIME = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+# จำนวนแถว PR_PO ที่สรุปต่อรอบ / จำนวนแถวรายงานที่เขียนลงไฟล์ต่อรอบ
+REPORT_CHUNK_ROWS = 20_000
+# ช่วงอายุยอดค้างรับ: จำนวนวันที่เลย Expected_Received มาแล้ว (ไม่เกินขอบบน) -> ชื่อช่วง
+AGING_BUCKETS = [
+    (0, "ยังไม่ถึงกำหนด"),
+    (30, "เลย 1-30 วัน"),
+    (60, "เลย 31-60 วัน"),
+    (90, "เลย 61-90 วัน"),
+    (np.inf, "เลยเกิน 90 วัน"),
+]
+AGING_NO_DATE = "ไม่ระบุวันที่"
+NO_VENDOR = "(ไม่ระบุ Vendor)"
+
+
+def _number(chunk: pd.DataFrame, col: str) -> pd.Series:
+    if col not in chunk.columns:
+        return pd.Series(np.nan, index=chunk.index, dtype=float)
+    return pd.to_numeric(chunk[col], errors="coerce").astype(float)
+
+
+def _lines(chunk: pd.DataFrame) -> pd.DataFrame:
+    """คอลัมน์ที่รายงานใช้ของแถว PR_PO ช่วงหนึ่ง (Outstanding ว่าง = Quantity - Quantity_Received)"""
+    qty = _number(chunk, "Quantity").fillna(0)
+    received = _number(chunk, "Quantity_Received").fillna(0)
+    outstanding = _number(chunk, "Outstanding_Quantity").fillna((qty - received).clip(lower=0))
+    vendor = chunk["Vendor_Name"].astype(object) if "Vendor_Name" in chunk.columns else None
+    expected = chunk["Expected_Received"] if "Expected_Received" in chunk.columns else None
+    return pd.DataFrame({
+        "PO_ID": chunk["PO_ID"].astype(object).fillna("").astype(str) if "PO_ID" in chunk.columns else "",
+        "Vendor_Name": vendor.where(vendor.notna() & (vendor != ""), NO_VENDOR) if vendor is not None else NO_VENDOR,
+        "Quantity": qty,
+        "Quantity_Received": received,
+        "Outstanding_Quantity": outstanding,
+        "Expected_Received": pd.to_datetime(expected, errors="coerce") if expected is not None else pd.NaT,
+    }, index=chunk.index)
+
+
+def _empty_dtype(col: str, how: str) -> str:
+    if col.endswith("Expected_Received"):
+        return "datetime64[ns]"
+    return "float64" if how == "sum" else "object"
+
+
+class _Rollup:
+    """
+    groupby ที่สะสมทีละช่วง: เก็บผลสรุปย่อยของแต่ละช่วง แล้วยุบรวมเมื่อเกิน REPORT_CHUNK_ROWS แถว
+    agg ต้องรวมซ้ำได้ (sum / min / max / first) หน่วยความจำตามจำนวนกลุ่ม ไม่ใช่จำนวนแถวที่อ่าน
+    """
+
+    def __init__(self, keys: list[str], agg: dict[str, str]):
+        self.keys = keys
+        self.agg = agg
+        self._parts: list[pd.DataFrame] = []
+        self._rows = 0
+
+    def add(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        self._parts.append(df.groupby(self.keys, sort=False).agg(self.agg))
+        self._rows += len(self._parts[-1])
+        if self._rows > REPORT_CHUNK_ROWS and len(self._parts) > 1:
+            self._parts = [self.result()]
+            self._rows = len(self._parts[0])
+
+    def result(self) -> pd.DataFrame:
+        if not self._parts:
+            # ไม่มีแถวเลย: ตารางว่างที่ชนิดคอลัมน์ตรงกับตอนมีข้อมูล (วันที่ / ตัวเลข) คำนวณต่อได้ไม่ error
+            index = pd.MultiIndex.from_arrays([[]] * len(self.keys), names=self.keys)
+            return pd.DataFrame(
+                {col: pd.Series(dtype=_empty_dtype(col, how)) for col, how in self.agg.items()}, index=index
+            )
+        if len(self._parts) == 1:
+            return self._parts[0]
+        return pd.concat(self._parts).groupby(level=self.keys, sort=False).agg(self.agg)
+
+
+_SUMS = {"Lines": "sum", "Quantity": "sum", "Quantity_Received": "sum", "Outstanding_Quantity": "sum"}
+
+
+def _outstanding_by_vendor(chunks: Iterator[pd.DataFrame], today: pd.Timestamp) -> pd.DataFrame:
+    # แยกตาม (Vendor, PO) ก่อน เพื่อนับจำนวน PO ที่ค้างแบบไม่ซ้ำได้แม้ PO เดียวอยู่คนละช่วง / คนละ Sheet
+    rollup = _Rollup(["Vendor_Name", "PO_ID"], {**_SUMS, "Oldest_Expected_Received": "min"})
+    for chunk in chunks:
+        lines = _lines(chunk)
+        lines = lines[lines["Outstanding_Quantity"] > 0]
+        rollup.add(lines.assign(Lines=1).rename(columns={"Expected_Received": "Oldest_Expected_Received"}))
+    by_po = rollup.result().reset_index()
+    out = by_po.assign(PO_Count=(by_po["PO_ID"] != "").astype(int)).groupby("Vendor_Name", sort=False).agg(
+        {"PO_Count": "sum", **_SUMS, "Oldest_Expected_Received": "min"}
+    )
+    out["Days_Overdue"] = (today - out["Oldest_Expected_Received"]).dt.days.clip(lower=0)
+    return out.sort_values("Outstanding_Quantity", ascending=False).reset_index()
+
+
+def _aging_bucket(expected: pd.Series, today: pd.Timestamp) -> pd.Series:
+    days = (today - expected).dt.days
+    bins = [-np.inf] + [upper for upper, _ in AGING_BUCKETS]
+    labels = pd.cut(days, bins=bins, labels=[label for _, label in AGING_BUCKETS])
+    return labels.astype(object).where(days.notna(), AGING_NO_DATE)
+
+
+def _aging(chunks: Iterator[pd.DataFrame], today: pd.Timestamp) -> pd.DataFrame:
+    rollup = _Rollup(["Vendor_Name", "Bucket"], {"Outstanding_Quantity": "sum"})
+    for chunk in chunks:
+        lines = _lines(chunk)
+        lines = lines[lines["Outstanding_Quantity"] > 0]
+        rollup.add(lines.assign(Bucket=_aging_bucket(lines["Expected_Received"], today)))
+    buckets = [label for _, label in AGING_BUCKETS] + [AGING_NO_DATE]
+    table = rollup.result()["Outstanding_Quantity"].unstack("Bucket").reindex(columns=buckets).fillna(0)
+    table["Total_Outstanding"] = table.sum(axis=1)
+    table.columns.name = None
+    return table.sort_values("Total_Outstanding", ascending=False).reset_index()
+
+
+def _po_received(chunks: Iterator[pd.DataFrame], today: pd.Timestamp) -> pd.DataFrame:
+    # PO หนึ่งมี Vendor เดียว ใช้ first (max ของข้อความช้ากว่ามาก)
+    rollup = _Rollup(["PO_ID"], {
+        "Vendor_Name": "first", **_SUMS, "First_Expected_Received": "min", "Last_Expected_Received": "max",
+    })
+    for chunk in chunks:
+        lines = _lines(chunk)
+        lines = lines[lines["PO_ID"] != ""]
+        rollup.add(lines.assign(
+            Lines=1,
+            First_Expected_Received=lines["Expected_Received"],
+            Last_Expected_Received=lines["Expected_Received"],
+        ))
+    out = rollup.result()
+    ordered = out["Quantity"].where(out["Quantity"] > 0)
+    out["Received_%"] = (100 * out["Quantity_Received"] / ordered).round(1)
+    out["Fully_Received"] = out["Outstanding_Quantity"] <= 0
+    return out.sort_index().reset_index()
+
+
+_BUILDERS = {
+    "outstanding_by_vendor": _outstanding_by_vendor,
+    "aging": _aging,
+    "po_received": _po_received,
+}
+
+
+# ---------------------------------------------------------
+# เขียนไฟล์ (ทีละช่วง ลงไฟล์ชั่วคราวบนดิสก์)
+# ---------------------------------------------------------
+def _slices(df: pd.DataFrame) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), REPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + REPORT_CHUNK_ROWS]
+
+
+def _write_csv(df: pd.DataFrame, out: BinaryIO):
+    # utf-8-sig: Excel เปิดภาษาไทยได้ถูกต้อง
+    text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    for i, part in enumerate(_slices(df)):
+        part.to_csv(text, index=False, header=(i == 0), date_format=gsheet_utils.DATE_FORMAT)
+    if df.empty:
+        df.to_csv(text, index=False)
+    text.flush()
+    text.detach()
+
+
+def _write_xlsx(df: pd.DataFrame, out: BinaryIO, title: str):
+    # write_only: openpyxl เขียนแถวลงไฟล์ชั่วคราวทันทีที่ append ไม่เก็บทั้ง Sheet ไว้ในหน่วยความจำ
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title[:31])
+    ws.append([str(c) for c in df.columns])
+    for part in _slices(df):
+        values = part.astype(object).where(part.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(list(row))
+    wb.save(out)
+
+
+def export_report(report: str, fmt: str = "csv", include_archive: bool = True) -> BinaryIO:
+    """
+    สร้างรายงาน (ชื่อใน REPORTS) เป็นไฟล์ fmt = "csv" | "xlsx" บนดิสก์ชั่วคราว (ลบเองเมื่อปิดไฟล์)
+    คืนไฟล์ (io.FileIO) ที่ seek กลับต้นไฟล์แล้ว ส่งให้ st.download_button ได้เลย (xlsx ต้องมี openpyxl)
+    include_archive=True : รวม PR_PO ที่ย้ายไป Sheet เก็บถาวรแล้วด้วย
+    """
+    with get_telemetry().timer(f"report.{report}", "PR_PO"):
+        chunks = gsheet_utils.iter_sheet_chunks("PR_PO", REPORT_CHUNK_ROWS, include_archive)
+        df = _BUILDERS[report](chunks, pd.Timestamp.today().normalize())
+        out = tempfile.TemporaryFile()
+        try:
+            if fmt == "xlsx":
+                _write_xlsx(df, out, REPORTS[report])
+            else:
+                _write_csv(df, out)
+        except BaseException:
+            out.close()
+            raise
+        # st.download_button รับไฟล์แบบ raw (io.RawIOBase) ไม่รับ BufferedRandom ของ TemporaryFile
+        out.flush()
+        raw = out.detach()
+        raw.seek(0)
+        return raw
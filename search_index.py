@@ -0,0 +1,91 @@
+# search_index.py
+# index ค้นหาข้อความหลายคอลัมน์ (เลขที่ / รหัส / รายละเอียด / Vendor) ของ Request / PR_PO
+# สร้างข้อความรวมของทุกแถวครั้งเดียวต่อเวอร์ชันข้อมูล แล้วตอบคำค้นเป็นชุด index ของแถว
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from gsheet_utils import data_version
+
+# จำนวนผลค้นหาล่าสุดที่จำไว้ต่อ index (3 ส่วนในหน้า PR_PO ถามคำเดียวกันซ้ำใน rerun เดียว)
+RESULT_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=256)
+def _pattern(keyword: str) -> tuple[str, bool]:
+    """
+    แปลงคำค้นเป็น (pattern, เป็น regex หรือไม่) แบบไม่สนตัวพิมพ์ใหญ่เล็ก
+    * = อะไรก็ได้ (ภายในแถวเดียวกัน) ; * หัว/ท้ายตัดทิ้งได้เพราะเป็นการค้นแบบ "มีอยู่ใน" อยู่แล้ว
+    """
+    keyword = keyword.casefold()
+    if "*" not in keyword:
+        return keyword, False
+
+    parts = keyword.strip("*").split("*")
+    if len(parts) == 1:
+        return parts[0], False
+    return ".*".join(re.escape(p) for p in parts), True
+
+
+class SearchIndex:
+    """
+    ข้อความรวมของคอลัมน์ที่ค้นได้ (ตัวพิมพ์เล็ก) 1 ค่าต่อแถว เก็บเป็น Series ชนิด string
+    ตอนค้นใช้ .str.contains ทั้งคอลัมน์ครั้งเดียว (ทำใน C ไม่วนทีละแถวใน Python)
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: list[str]):
+        self.columns = [c for c in columns if c in df.columns]
+        self.index = df.index
+        if self.columns and len(df):
+            text = df[self.columns[0]].astype(str).str.cat(
+                [df[c].astype(str) for c in self.columns[1:]], sep=" "
+            )
+            self._text = text.str.normalize("NFC").str.casefold()
+        else:
+            self._text = pd.Series("", index=df.index, dtype="str")
+        self._find = lru_cache(maxsize=RESULT_CACHE_SIZE)(self._match)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _match(self, keyword: str) -> np.ndarray:
+        pattern, regex = _pattern(keyword)
+        if not pattern:
+            return np.ones(len(self), dtype=bool)
+        mask = self._text.str.contains(pattern, regex=regex, na=False)
+        return mask.to_numpy(dtype=bool)
+
+    def mask(self, keyword: str) -> np.ndarray:
+        """bool array ตามลำดับแถวของ DataFrame ที่ใช้สร้าง index"""
+        return self._find(keyword)
+
+    def matches(self, keyword: str) -> pd.Index:
+        """index ของแถวที่ตรงกับคำค้น"""
+        return self.index[self._find(keyword)]
+
+    def filter(self, df: pd.DataFrame, keyword: str) -> pd.DataFrame:
+        """
+        กรอง df (ทั้งก้อนหรือแค่บางแถวของ DataFrame เดียวกัน เช่น ส่วน PR / PO)
+        ด้วยคำค้น โดยจับคู่จาก index ของแถว
+        """
+        if not keyword:
+            return df
+        return df[df.index.isin(self.matches(keyword))]
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _build_index(version: str, columns: tuple[str, ...], n_rows: int, _df: pd.DataFrame) -> SearchIndex:
+    return SearchIndex(_df, list(columns))
+
+
+def get_search_index(df: pd.DataFrame, columns: list[str]) -> SearchIndex:
+    """index ค้นหาของ df (สร้างครั้งเดียวต่อเวอร์ชันข้อมูล + ชุดคอลัมน์ ใช้ร่วมกันทุก session)"""
+    version = data_version(df)
+    if version is None:
+        # ไม่ได้มาจาก load_sheet -> ไม่รู้เวอร์ชัน สร้างใหม่ (ไม่ cache)
+        return SearchIndex(df, columns)
+    # จำนวนแถวกันกรณี DataFrame ที่ถูกตัดแถวมาแต่ยังติด attrs เวอร์ชันเดิม
+    return _build_index(version, tuple(columns), len(df), df)
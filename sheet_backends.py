@@ -0,0 +1,530 @@
+# sheet_backends.py
+# ที่เก็บข้อมูลเบื้องหลัง load_sheet / save_sheet ใน gsheet_utils
+#
+# gsheet_utils คุยกับ backend ผ่านเมธอดชุดเดียวกับ gspread.Spreadsheet (values_batch_get,
+# values_batch_update, values_append, ...) ดังนั้น backend มี 2 แบบ
+#   - "gspread" : gspread.Spreadsheet ตัวจริง อ่าน/เขียน Google Sheets ตรง ๆ
+#   - "sqlite"  : SQLiteMirror เก็บสำเนาทุก Sheet ไว้ในไฟล์ SQLite บนเครื่อง
+#                 อ่านจากไฟล์ (ไม่กิน quota) เขียนผ่านไป Google ก่อนแล้วค่อยอัปเดตสำเนา
+#                 และมี thread คอยดึงการเปลี่ยนแปลงจาก Google มาเป็นระยะ
+# RenamedSheets ห่อ backend ของ Spreadsheet อื่น (shard) ให้ gsheet_utils เรียก Sheet ในนั้นด้วยชื่ออื่นได้
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Protocol
+
+import pandas as pd
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol, absolute_range_name, rowcol_to_a1
+
+
+class SheetBackend(Protocol):
+    """เมธอดของ gspread.Spreadsheet ที่ gsheet_utils ใช้"""
+
+    def get_lastUpdateTime(self) -> str: ...
+    def values_get(self, range: str, params: dict | None = None) -> Any: ...
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> Any: ...
+    def values_batch_update(self, body: dict | None = None) -> Any: ...
+    def values_append(self, range: str, params: dict, body: dict) -> Any: ...
+    def values_clear(self, range: str) -> Any: ...
+    def values_update(self, range: str, params: dict | None = None, body: dict | None = None) -> Any: ...
+    def add_worksheet(self, title: str, rows: int, cols: int) -> Any: ...
+    def fetch_sheet_metadata(self, params: dict | None = None) -> Any: ...
+
+
+def split_range(range_name: str) -> tuple[str, str | None]:
+    """แยก "'PR_PO'!A2:C2" -> ("PR_PO", "A2:C2") / "'PR_PO'" -> ("PR_PO", None)"""
+    if range_name.startswith("'"):
+        end = 1
+        while True:
+            end = range_name.index("'", end)
+            if range_name[end + 1:end + 2] == "'":
+                end += 2
+                continue
+            break
+        name = range_name[1:end].replace("''", "'")
+        rest = range_name[end + 1:]
+    else:
+        name, sep, rest = range_name.partition("!")
+        rest = sep + rest
+    return name, (rest[1:] or None) if rest.startswith("!") else None
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _cell(value) -> str:
+    """ค่าที่เขียนแบบ RAW -> ข้อความแบบที่ Google คืนมาตอนอ่าน (FORMATTED_VALUE)"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def row_runs(positions: list[int]) -> list[tuple[int, int]]:
+    """ตำแหน่งแถวที่เรียงแล้ว -> ช่วงแถวที่ติดกัน [(แรก, สุดท้าย)]"""
+    runs: list[list[int]] = []
+    for pos in positions:
+        if runs and pos == runs[-1][1] + 1:
+            runs[-1][1] = pos
+        else:
+            runs.append([pos, pos])
+    return [(first, last) for first, last in runs]
+
+
+class SQLiteMirror:
+    """
+    สำเนา Google Sheets ในไฟล์ SQLite (ใช้ร่วมกันได้หลาย process บนเครื่องเดียวกัน)
+
+    แต่ละ Sheet เก็บเป็นตาราง _grid_<ชื่อ> (คอลัมน์ _row = เลขแถวใน Sheet, c1..cN = ค่าแต่ละคอลัมน์
+    รวมแถว header) และมี VIEW ชื่อเดียวกับ Sheet ที่ตั้งชื่อคอลัมน์ตาม header ไว้ query ด้วย SQL
+    คอลัมน์ใน index_columns จะถูกสร้าง index ให้
+
+    remote = None คือโหมด offline (ไม่มี Google Sheets เบื้องหลัง เช่นตอนทดสอบ)
+    version_cells / changed_rows : ตัวเทียบแถวจาก gsheet_utils (_version_cells / _changed_rows)
+    ถ้าให้มา sync เบื้องหลังจะดึงเฉพาะแถวที่ Row_Version เปลี่ยนแทนการดึงทั้ง Sheet
+    """
+
+    def __init__(self, path: str, remote: SheetBackend | None = None,
+                 index_columns: dict[str, list[str]] | None = None,
+                 version_cells: Callable[[str, pd.DataFrame], pd.DataFrame | None] | None = None,
+                 changed_rows: Callable[[pd.DataFrame, list[str], list[list]], list[int] | None] | None = None):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.remote = remote
+        self.index_columns = index_columns or {}
+        self.version_cells = version_cells
+        self.changed_rows = changed_rows
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS _mirror_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _mirror_sheets (name TEXT PRIMARY KEY, width INTEGER, synced_at REAL)"
+        )
+        self._conn.execute("INSERT OR IGNORE INTO _mirror_meta VALUES ('version', '0')")
+        self._remote_revision = None
+        self._sync_thread = None
+
+    # -------------------------------------------------------
+    # โครงสร้างตารางในไฟล์
+    # -------------------------------------------------------
+    def _meta(self, key: str) -> str | None:
+        row = self._conn.execute("SELECT value FROM _mirror_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _bump_version(self):
+        self._conn.execute("UPDATE _mirror_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+
+    def _width(self, name: str) -> int | None:
+        row = self._conn.execute("SELECT width FROM _mirror_sheets WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def mirrored_sheets(self) -> list[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT name FROM _mirror_sheets")]
+
+    def _ensure_width(self, name: str, width: int):
+        current = self._width(name)
+        if current is None or width <= current:
+            return
+        grid = _quote(f"_grid_{name}")
+        for i in range(current + 1, width + 1):
+            self._conn.execute(f"ALTER TABLE {grid} ADD COLUMN c{i} TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("UPDATE _mirror_sheets SET width = ? WHERE name = ?", (width, name))
+
+    def _refresh_view(self, name: str):
+        """สร้าง VIEW ตาม header ปัจจุบัน + index ของคอลัมน์ที่กำหนด"""
+        grid = _quote(f"_grid_{name}")
+        header = self._conn.execute(f"SELECT * FROM {grid} WHERE _row = 1").fetchone()
+        header = list(header[1:]) if header else []
+
+        self._conn.execute(f"DROP VIEW IF EXISTS {_quote(name)}")
+        cols, seen = ["_row"], set()
+        for i, col in enumerate(header, start=1):
+            if col and col not in seen and col != "_row":
+                seen.add(col)
+                cols.append(f"c{i} AS {_quote(col)}")
+        self._conn.execute(f"CREATE VIEW {_quote(name)} AS SELECT {', '.join(cols)} FROM {grid} WHERE _row > 1")
+
+        for col in self.index_columns.get(name, []):
+            if col in header:
+                i = header.index(col) + 1
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(f'ix_{name}_c{i}')} ON {grid} (c{i})"
+                )
+
+    def _replace_sheet(self, name: str, values: list[list]):
+        """แทนที่สำเนาของ Sheet ทั้งหน้าด้วย values (แถวแรก = header)"""
+        width = max([len(r) for r in values] + [1])
+        grid = _quote(f"_grid_{name}")
+        cols = ", ".join(f"c{i} TEXT NOT NULL DEFAULT ''" for i in range(1, width + 1))
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute(f"DROP VIEW IF EXISTS {_quote(name)}")
+            self._conn.execute(f"DROP TABLE IF EXISTS {grid}")
+            self._conn.execute(f"CREATE TABLE {grid} (_row INTEGER PRIMARY KEY, {cols})")
+            placeholders = ", ".join("?" * (width + 1))
+            self._conn.executemany(
+                f"INSERT INTO {grid} VALUES ({placeholders})",
+                ([i] + [_cell(v) for v in row] + [""] * (width - len(row)) for i, row in enumerate(values, start=1)),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO _mirror_sheets VALUES (?, ?, ?)", (name, width, time.time())
+            )
+            self._refresh_view(name)
+            self._bump_version()
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _write_cells(self, name: str, start_row: int, start_col: int, values: list[list]):
+        """เขียนค่าลงสำเนาเริ่มที่ (start_row, start_col) นับจาก 1 แบบเดียวกับ values.update"""
+        width = max([start_col - 1 + len(r) for r in values] + [0])
+        self._ensure_width(name, width)
+        grid = _quote(f"_grid_{name}")
+        for offset, row in enumerate(values):
+            if not row:
+                continue
+            row_no = start_row + offset
+            self._conn.execute(f"INSERT OR IGNORE INTO {grid} (_row) VALUES (?)", (row_no,))
+            sets = ", ".join(f"c{start_col + j} = ?" for j in range(len(row)))
+            self._conn.execute(
+                f"UPDATE {grid} SET {sets} WHERE _row = ?", [_cell(v) for v in row] + [row_no]
+            )
+        if start_row == 1:
+            self._refresh_view(name)
+
+    def _read(self, name: str, a1: str | None) -> list[list]:
+        """อ่านช่วง a1 จากสำเนา (ตัดค่าว่างท้ายแถว/แถวว่างท้ายตาราง แบบ Sheets API)"""
+        width = self._width(name)
+        grid = a1_range_to_grid_range(a1) if a1 else {}
+        first_row = grid.get("startRowIndex", 0) + 1
+        last_row = grid.get("endRowIndex")
+        first_col = grid.get("startColumnIndex", 0) + 1
+        last_col = min(grid.get("endColumnIndex", width), width)
+        if first_col > last_col:
+            return []
+
+        cols = ", ".join(f"c{i}" for i in range(first_col, last_col + 1))
+        sql = f"SELECT _row, {cols} FROM {_quote(f'_grid_{name}')} WHERE _row >= ?"
+        params = [first_row]
+        if last_row is not None:
+            sql += " AND _row <= ?"
+            params.append(last_row)
+        sql += " ORDER BY _row"
+
+        values, expected = [], first_row
+        for row_no, *cells in self._conn.execute(sql, params):
+            # แถวที่ไม่มีในสำเนา = แถวว่าง (ต้องคงตำแหน่งแถวไว้)
+            values.extend([] for _ in range(row_no - expected))
+            while cells and cells[-1] == "":
+                cells.pop()
+            values.append(cells)
+            expected = row_no + 1
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    # -------------------------------------------------------
+    # gspread.Spreadsheet subset
+    # -------------------------------------------------------
+    def get_lastUpdateTime(self) -> str:
+        with self._lock:
+            return f"mirror-{self._meta('version')}"
+
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> dict:
+        with self._lock:
+            parsed = [split_range(r) for r in ranges]
+            missing = list(dict.fromkeys(n for n, _ in parsed if self._width(n) is None))
+        if missing:
+            if self.remote is None:
+                raise KeyError(f"ไม่พบ Sheet {', '.join(missing)} ในสำเนา")
+            # Sheet ที่ยังไม่มีในสำเนา -> ดึงจาก Google มาเก็บก่อน
+            self.sync(missing)
+        with self._lock:
+            return {"valueRanges": [
+                {"range": r, "values": self._read(name, a1)} for r, (name, a1) in zip(ranges, parsed)
+            ]}
+
+    def values_get(self, range: str, params: dict | None = None) -> dict:
+        name, a1 = split_range(range)
+        with self._lock:
+            if self._width(name) is not None:
+                return {"range": range, "values": self._read(name, a1)}
+        if self.remote is None:
+            raise KeyError(f"ไม่พบ Sheet {name} ในสำเนา")
+        # Sheet ที่ไม่ได้ทำสำเนา (เช่น Sheet จองเลข _ID_*) อ่านจาก Google ตรง ๆ
+        return self.remote.values_get(range, params)
+
+    def values_batch_update(self, body: dict | None = None) -> Any:
+        resp = self.remote.values_batch_update(body) if self.remote is not None else {}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for item in (body or {}).get("data", []):
+                    name, a1 = split_range(item["range"])
+                    if self._width(name) is None:
+                        continue
+                    row, col = a1_to_rowcol(a1.split(":")[0]) if a1 else (1, 1)
+                    self._write_cells(name, row, col, item.get("values", []))
+                self._bump_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return resp
+
+    def values_append(self, range: str, params: dict, body: dict) -> Any:
+        name, _ = split_range(range)
+        values = body.get("values", [])
+        resp = self.remote.values_append(range, params, body) if self.remote is not None else None
+
+        with self._lock:
+            if self._width(name) is None:
+                if self.remote is not None:
+                    return resp
+                self._replace_sheet(name, [])
+            last = self._conn.execute(f"SELECT MAX(_row) FROM {_quote(f'_grid_{name}')}").fetchone()[0] or 0
+            if resp is None:
+                first_row = last + 1
+                resp = {"updates": {"updatedRange": absolute_range_name(
+                    name, f"A{first_row}:A{first_row + len(values) - 1}"
+                )}}
+            else:
+                updated = split_range(resp["updates"]["updatedRange"])[1]
+                first_row = a1_to_rowcol(updated.split(":")[0])[0]
+
+            # มีคน append แทรกที่ Google ก่อนหน้า -> ดึงทั้ง Sheet ใหม่ให้ตำแหน่งแถวตรงกัน
+            resync = first_row != last + 1
+            if not resync:
+                self._conn.execute("BEGIN")
+                self._write_cells(name, first_row, 1, values)
+                self._bump_version()
+                self._conn.execute("COMMIT")
+        if resync:
+            self.sync([name])
+        return resp
+
+    def values_clear(self, range: str) -> Any:
+        resp = self.remote.values_clear(range) if self.remote is not None else {}
+        name, a1 = split_range(range)
+        with self._lock:
+            if self._width(name) is None:
+                return resp
+            if a1 is None:
+                self._replace_sheet(name, [])
+            else:
+                # ล้างเฉพาะช่วง: เขียนค่าว่างทับ
+                grid = a1_range_to_grid_range(a1)
+                width = self._width(name)
+                first_row = grid.get("startRowIndex", 0) + 1
+                last_row = grid.get("endRowIndex") or (
+                    self._conn.execute(f"SELECT MAX(_row) FROM {_quote(f'_grid_{name}')}").fetchone()[0] or 0
+                )
+                first_col = grid.get("startColumnIndex", 0) + 1
+                last_col = min(grid.get("endColumnIndex", width), width)
+                blank = [[""] * (last_col - first_col + 1) for _ in range(first_row, last_row + 1)]
+                self._conn.execute("BEGIN")
+                self._write_cells(name, first_row, first_col, blank)
+                self._bump_version()
+                self._conn.execute("COMMIT")
+        return resp
+
+    def values_update(self, range: str, params: dict | None = None, body: dict | None = None) -> Any:
+        resp = self.remote.values_update(range, params, body) if self.remote is not None else {}
+        name, a1 = split_range(range)
+        values = (body or {}).get("values", [])
+        with self._lock:
+            if self._width(name) is None:
+                if self.remote is not None:
+                    return resp
+                self._replace_sheet(name, [])
+            row, col = a1_to_rowcol(a1.split(":")[0]) if a1 else (1, 1)
+            self._conn.execute("BEGIN")
+            self._write_cells(name, row, col, values)
+            self._bump_version()
+            self._conn.execute("COMMIT")
+        return resp
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> Any:
+        if self.remote is not None:
+            return self.remote.add_worksheet(title, rows, cols)
+        with self._lock:
+            if self._width(title) is not None:
+                raise ValueError(f"มี Sheet {title} อยู่แล้ว")
+            self._replace_sheet(title, [])
+
+    def fetch_sheet_metadata(self, params: dict | None = None) -> Any:
+        if self.remote is not None:
+            return self.remote.fetch_sheet_metadata(params)
+        # offline: มีเฉพาะชื่อ Sheet ที่อยู่ในสำเนา
+        return {"sheets": [{"properties": {"title": name}} for name in self.mirrored_sheets()]}
+
+    # -------------------------------------------------------
+    # SQL / sync
+    # -------------------------------------------------------
+    def query(self, sql: str, params: tuple | dict = ()) -> pd.DataFrame:
+        """query สำเนาด้วย SQL (ใช้ชื่อ Sheet เป็นชื่อตาราง เช่น SELECT * FROM "PR_PO" WHERE ...)"""
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params)
+
+    def sync(self, sheet_names: list[str] | None = None):
+        """ดึงข้อมูลล่าสุดจาก Google มาแทนสำเนา (ไม่ระบุชื่อ = ทุก Sheet ที่มีสำเนาอยู่)"""
+        if self.remote is None:
+            return
+        names = sheet_names if sheet_names is not None else self.mirrored_sheets()
+        if not names:
+            return
+        revision = self.remote.get_lastUpdateTime()
+        resp = self.remote.values_batch_get([absolute_range_name(n) for n in names])
+        with self._lock:
+            for name, value_range in zip(names, resp.get("valueRanges", [])):
+                self._replace_sheet(name, value_range.get("values", []))
+            if sheet_names is None:
+                self._remote_revision = revision
+
+    def sync_if_changed(self):
+        """
+        เช็ค modifiedTime ของ Google ก่อน ถ้ามีการแก้ไข:
+        Sheet ที่มี Row_Version ดึงเฉพาะแถวที่เปลี่ยน (ดู _sync_rows) ที่เหลือดึงใหม่ทั้ง Sheet
+        """
+        if self.remote is None:
+            return
+        revision = self.remote.get_lastUpdateTime()
+        if revision == self._remote_revision:
+            return
+        names = self.mirrored_sheets()
+        full = self._sync_rows(names) if self.version_cells and self.changed_rows else names
+        if full:
+            self.sync(full)
+        self._remote_revision = revision
+
+    def _sync_rows(self, names: list[str]) -> list[str]:
+        """
+        sync เฉพาะแถวที่เปลี่ยน (batchGet 2 ครั้งรวมทุก Sheet แบบเดียวกับ gsheet_utils._sync_sheets)
+          1) header + คอลัมน์ key + Row_Version   2) ช่วงแถวที่เลขเวอร์ชันเปลี่ยน / แถวใหม่ท้าย Sheet
+        คืนชื่อ Sheet ที่ต้องดึงใหม่ทั้ง Sheet (ไม่มี Row_Version / header เปลี่ยน / แถวถูกลบ / เปลี่ยนเยอะ)
+        """
+        full, plans = [], {}
+        with self._lock:
+            for name in names:
+                values = self._read(name, None)
+                header = values[0] if values else []
+                width = len(header)
+                cells = pd.DataFrame(
+                    [(row + [""] * (width - len(row)))[:width] for row in values[1:]], columns=header, dtype=object
+                )
+                old = self.version_cells(name, cells) if len(values) > 1 and len(set(header)) == width else None
+                if old is None:
+                    full.append(name)
+                else:
+                    plans[name] = (header, old)
+        if not plans:
+            return full
+
+        ranges = []
+        for name, (header, old) in plans.items():
+            ranges.append(absolute_range_name(name, "1:1"))
+            for col in old.columns:
+                letter = rowcol_to_a1(1, header.index(col) + 1)[:-1]
+                ranges.append(absolute_range_name(name, f"{letter}:{letter}"))
+        value_ranges = iter(self.remote.values_batch_get(ranges).get("valueRanges", []))
+
+        fetch = {}
+        for name, (header, old) in plans.items():
+            remote_header = (next(value_ranges, {}).get("values") or [[]])[0]
+            columns = [next(value_ranges, {}).get("values", []) for _ in old.columns]
+            changed = self.changed_rows(old, header, columns) if remote_header == header else None
+            if changed is None:
+                full.append(name)
+            elif changed:
+                fetch[name] = (len(header), row_runs(changed))
+        if not fetch:
+            return full
+
+        ranges = [
+            absolute_range_name(name, f"{first + 2}:{last + 2}")
+            for name, (_, runs) in fetch.items() for first, last in runs
+        ]
+        value_ranges = iter(self.remote.values_batch_get(ranges).get("valueRanges", []))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for name, (width, runs) in fetch.items():
+                    for first, last in runs:
+                        rows = next(value_ranges, {}).get("values", [])
+                        rows += [[]] * (last - first + 1 - len(rows))
+                        # เติมค่าว่างให้ครบทุกคอลัมน์ (API ตัดค่าว่างท้ายแถว ค่าเก่าในสำเนาต้องถูกล้างด้วย)
+                        self._write_cells(name, first + 2, 1, [(row + [""] * width)[:width] for row in rows])
+                self._bump_version()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return full
+
+    def start_background_sync(self, interval_seconds: float):
+        """เริ่ม thread ดึงการเปลี่ยนแปลงจาก Google ทุก interval_seconds วินาที"""
+        if self.remote is None or self._sync_thread is not None:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.sync_if_changed()
+                except Exception:   # noqa: BLE001 - thread ต้องไม่ตาย รอบหน้าลองใหม่
+                    # import ตรงนี้: telemetry import sheet_backends อยู่แล้ว
+                    from telemetry import SPREADSHEET, get_telemetry
+                    get_telemetry().count("api_errors", SPREADSHEET)
+
+        self._sync_thread = threading.Thread(target=_loop, name="sheet-mirror-sync", daemon=True)
+        self._sync_thread.start()
+
+
+class RenamedSheets:
+    """
+    backend ของ Spreadsheet shard: gsheet_utils เรียก Sheet ด้วยชื่อ shard (เช่น "PR_PO@2024")
+    แต่ Worksheet จริงใน Spreadsheet นั้นชื่อตาม Sheet หลัก ("PR_PO")
+    names = {ชื่อที่ gsheet_utils ใช้: ชื่อ Worksheet จริง} (ชื่ออื่นส่งต่อตามเดิม)
+    """
+
+    def __init__(self, remote: SheetBackend, names: dict[str, str]):
+        self.remote = remote
+        self.names = names
+
+    def _range(self, range_name: str) -> str:
+        name, a1 = split_range(range_name)
+        return absolute_range_name(self.names.get(name, name), a1)
+
+    def get_lastUpdateTime(self) -> str:
+        return self.remote.get_lastUpdateTime()
+
+    def values_get(self, range: str, params: dict | None = None) -> Any:
+        return self.remote.values_get(self._range(range), params)
+
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> Any:
+        return self.remote.values_batch_get([self._range(r) for r in ranges], params)
+
+    def values_batch_update(self, body: dict | None = None) -> Any:
+        data = [{**item, "range": self._range(item["range"])} for item in (body or {}).get("data", [])]
+        return self.remote.values_batch_update({**(body or {}), "data": data})
+
+    def values_append(self, range: str, params: dict, body: dict) -> Any:
+        return self.remote.values_append(self._range(range), params, body)
+
+    def values_clear(self, range: str) -> Any:
+        return self.remote.values_clear(self._range(range))
+
+    def values_update(self, range: str, params: dict | None = None, body: dict | None = None) -> Any:
+        return self.remote.values_update(self._range(range), params, body)
+
+    def add_worksheet(self, title: str, rows: int, cols: int) -> Any:
+        return self.remote.add_worksheet(self.names.get(title, title), rows, cols)
+
+    def fetch_sheet_metadata(self, params: dict | None = None) -> Any:
+        return self.remote.fetch_sheet_metadata(params)
@@ -0,0 +1,127 @@
+# snapshot_store.py
+# เก็บข้อมูลล่าสุดของแต่ละ Sheet ลงดิสก์เป็นไฟล์ Arrow IPC (แบบคอลัมน์) พร้อม revision ที่โหลดมา
+# เปิดแอปใหม่ / deploy ใหม่ อ่านจากไฟล์ได้ทันที (memory-map) ไม่ต้องรอดึงทั้ง Sheet จาก Google
+# หลาย process บนเครื่องเดียวกันเปิดไฟล์เดียวกัน ใช้ page cache ของ OS ร่วมกัน
+# เขียนไฟล์ชั่วคราวแล้ว os.replace ทับ (atomic) process ที่ map ไฟล์เดิมอยู่ยังอ่านของเดิมได้ต่อ
+import json
+import os
+import threading
+import time
+from urllib.parse import quote
+
+import pandas as pd
+
+from telemetry import get_telemetry
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:   # ไม่มี pyarrow -> ไม่เก็บ snapshot (โหลดจาก Google ทุกครั้งแบบเดิม)
+    pa = None
+
+_META_KEY = b"purchase_app"
+
+
+def _to_table(df: pd.DataFrame) -> "pa.Table":
+    """DataFrame -> Arrow table (คอลัมน์ object ที่ชนิดปนกัน เช่นตัวเลขปนข้อความ เก็บเป็นข้อความแทน)"""
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        pass
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class SnapshotStore:
+    """
+    ไฟล์ snapshot 1 ไฟล์ต่อ Sheet ในโฟลเดอร์ directory
+    load() อ่านได้ครั้งเดียวต่อ Sheet ต่อ process (ใช้ตอนเริ่ม หลังจากนั้นใช้ cache ในหน่วยความจำ)
+    save_later() ส่งให้ thread เบื้องหลังเขียน (ถ้าส่งมาหลายครั้งก่อนเขียนทัน เขียนแค่ชุดล่าสุด)
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.enabled = pa is not None and bool(directory)
+        self._lock = threading.Condition()
+        self._pending: dict[str, tuple[pd.DataFrame, dict]] = {}
+        self._taken: set[str] = set()
+        self._thread: threading.Thread | None = None
+        if self.enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, sheet_name: str) -> str:
+        return os.path.join(self.directory, f"{quote(sheet_name, safe='')}.arrow")
+
+    # ---------- อ่าน ----------
+    def load(self, sheet_name: str, max_age: float) -> tuple[pd.DataFrame, dict] | None:
+        """
+        (DataFrame, meta) จากไฟล์ snapshot ของ Sheet นี้ ถ้ามีและอายุไม่เกิน max_age วินาที
+        meta = {"revision", "saved_at", "full_at"} (เวลาเป็น time.time())
+        คืน None ถ้าไม่มีไฟล์ / ไฟล์เสีย / เคยอ่านไปแล้วใน process นี้
+        """
+        with self._lock:
+            if not self.enabled or sheet_name in self._taken:
+                return None
+            self._taken.add(sheet_name)
+        try:
+            # ไม่ปิด memory map เอง: คอลัมน์ตัวเลขใน DataFrame ชี้เข้าไปในไฟล์ที่ map ไว้ (ไม่ copy)
+            source = pa.memory_map(self.path(sheet_name), "r")
+            table = pa.ipc.open_file(source).read_all()
+            meta = json.loads(table.schema.metadata[_META_KEY])
+        except (OSError, KeyError, ValueError, pa.ArrowException):
+            return None
+        if time.time() - meta.get("saved_at", 0) > max_age:
+            return None
+        return table.to_pandas(split_blocks=True), meta
+
+    # ---------- เขียน ----------
+    def save(self, sheet_name: str, df: pd.DataFrame, meta: dict):
+        """เขียน snapshot ทันที (ไฟล์ชั่วคราวในโฟลเดอร์เดียวกันแล้ว os.replace)"""
+        table = _to_table(df)
+        metadata = {**(table.schema.metadata or {}), _META_KEY: json.dumps(meta).encode("utf-8")}
+        table = table.replace_schema_metadata(metadata)
+        path = self.path(sheet_name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with pa.OSFile(tmp, "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def save_later(self, sheet_name: str, df: pd.DataFrame, meta: dict):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending[sheet_name] = (df, meta)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+                self._thread.start()
+            self._lock.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._lock.wait()
+                pending, self._pending = self._pending, {}
+            for sheet_name, (df, meta) in pending.items():
+                try:
+                    self.save(sheet_name, df, meta)
+                except Exception:   # noqa: BLE001 - thread ต้องไม่ตาย Sheet อื่น / รอบหน้ายังเขียนได้
+                    # ดิสก์เต็ม / สิทธิ์ไฟล์ / อื่น ๆ -> ไม่เก็บ Sheet นี้
+                    # ลบไฟล์เก่าทิ้งด้วย ไม่ให้เปิดแอปครั้งหน้าไปใช้ข้อมูลที่เก่ากว่านี้
+                    get_telemetry().count("snapshot_errors", sheet_name)
+                    try:
+                        os.remove(self.path(sheet_name))
+                    except OSError:
+                        pass
@@ -12,6 +12,7 @@ st.markdown(
 - 📊 Dashboard — ภาพรวมคำขอสั่งซื้อ & PR/PO
 - 📋 Requests — แจ้งขอสั่งซื้อ + แก้ไขสถานะคำขอสั่งซื้อ
 - 📄 PR / PO — จัดการสถานะ PR/PO  
+- 🩺 Diagnostics — เวลา / จำนวนครั้งเรียก Google Sheets API ของแต่ละหน้า (สำหรับผู้ดูแล)
 """
 )
 st.info("เลือกเมนูจาก sidebar 'Pages' ทางซ้ายมือได้เลย")
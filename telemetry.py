@@ -0,0 +1,303 @@
+# telemetry.py
+# ตัวนับเวลา / จำนวนครั้ง / ขนาดข้อมูล ของทุกการอ่านเขียน Sheet และทุกรอบที่หน้าเว็บรัน
+# เก็บในหน่วยความจำของ process (ใช้ร่วมกันทุก session) แยกตาม Sheet และตามหน้า
+# ดูได้ที่หน้า Diagnostics หรือ snapshot() เป็น dict (แปลงเป็น JSON ได้)
+#
+# ต้นทุนต่อเหตุการณ์ = lock 1 ครั้ง + บวกเลขใน dict เปิดทิ้งไว้ตอนใช้งานจริงได้
+# ปิดได้ด้วย set_enabled(False) (gsheet_utils อ่านจาก secret TELEMETRY_ENABLED)
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from sheet_backends import split_range
+
+# ขอบบนของช่อง histogram เวลา (มิลลิวินาที) ช่องสุดท้าย = มากกว่าทุกค่า
+LATENCY_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+# เมธอดของ backend ที่นับเป็นการอ่าน (quota อ่าน) ที่เหลือนับเป็นการเขียน
+READ_METHODS = {"get_lastUpdateTime", "values_get", "values_batch_get", "fetch_sheet_metadata"}
+# งานที่ไม่ได้มาจากหน้าไหน (ตัวเขียนเบื้องหลัง / sync ของ SQLite)
+BACKGROUND = "(เบื้องหลัง)"
+# เหตุการณ์ที่ไม่ระบุ Sheet (เช่น เช็ค revision ของทั้ง Spreadsheet)
+SPREADSHEET = "(Spreadsheet)"
+MAX_SESSIONS = 1000
+
+_enabled = True
+_local = threading.local()   # Sheet ของการเรียก API ที่ thread นี้กำลังเรียก (call) / เรียกล่าสุด (last)
+
+
+def set_enabled(enabled: bool):
+    global _enabled
+    _enabled = enabled
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def _percentile(self, q: float) -> float:
+        """ค่าประมาณจากขอบบนของช่องที่ percentile ตก (ช่องสุดท้ายใช้ค่าสูงสุดที่เจอ)"""
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return 0.0
+
+    def to_dict(self) -> dict:
+        labels = [f"<={b}" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": self._percentile(0.5),
+            "p95_ms": self._percentile(0.95),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class _Group:
+    """ตัวเลขของ Sheet หนึ่ง หรือหน้าหนึ่ง: เวลาแยกตามชนิดงาน + ตัวนับ"""
+
+    def __init__(self):
+        self.timings: dict[str, _Histogram] = {}
+        self.counts: Counter = Counter()
+
+    def to_dict(self) -> dict:
+        return {
+            "timings": {op: h.to_dict() for op, h in sorted(self.timings.items())},
+            "counts": dict(sorted(self.counts.items())),
+        }
+
+
+class Telemetry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._ops: dict[str, _Histogram] = {}
+        self._sheets: dict[str, _Group] = {}
+        self._pages: dict[str, _Group] = {}
+        self._calls: deque = deque()   # (เวลา, "read" | "write") ของการเรียก API ใน 60 วินาทีล่าสุด
+        # session -> [หน้า, เวลาเริ่มรอบ, เวลาอ่าน Sheet สะสมในรอบนี้ (ms)]
+        self._sessions: OrderedDict[str, list] = OrderedDict()
+
+    # ---------- หน้า ----------
+    def _session(self) -> str | None:
+        ctx = get_script_run_ctx(suppress_warning=True)
+        return ctx.session_id if ctx is not None else None
+
+    def start_page(self, page: str):
+        session = self._session()
+        if session is None:
+            return
+        with self._lock:
+            self._sessions[session] = [page, time.perf_counter(), 0.0]
+            self._sessions.move_to_end(session)
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+    def end_page(self):
+        session = self._session()
+        with self._lock:
+            state = self._sessions.get(session)
+            if state is None:
+                return
+            page, started, io_ms = state
+            total = (time.perf_counter() - started) * 1000
+            group = self._group(self._pages, page)
+            self._hist(group.timings, "render").add(total)
+            self._hist(group.timings, "render.sheet_io").add(io_ms)
+            self._hist(group.timings, "render.app").add(max(total - io_ms, 0.0))
+            group.counts["renders"] += 1
+
+    def _page_state(self) -> list | None:
+        """[หน้า, ...] ของ session ที่รันอยู่ใน thread นี้ (ต้องถือ self._lock)"""
+        session = self._session()
+        return self._sessions.get(session) if session is not None else None
+
+    # ---------- บันทึก ----------
+    @staticmethod
+    def _group(groups: dict, name: str) -> _Group:
+        group = groups.get(name)
+        if group is None:
+            group = groups[name] = _Group()
+        return group
+
+    @staticmethod
+    def _hist(timings: dict, op: str) -> _Histogram:
+        hist = timings.get(op)
+        if hist is None:
+            hist = timings[op] = _Histogram()
+        return hist
+
+    def record(self, op: str, ms: float, sheet: str | None = None, sheet_io: bool = False):
+        """เวลาของงาน op (ms) นับเข้ารวม / Sheet / หน้าที่รันอยู่ sheet_io=True = นับเป็นเวลาอ่าน Sheet ของหน้า"""
+        if not _enabled:
+            return
+        with self._lock:
+            self._hist(self._ops, op).add(ms)
+            if sheet is not None:
+                self._hist(self._group(self._sheets, sheet).timings, op).add(ms)
+            state = self._page_state()
+            page = state[0] if state is not None else BACKGROUND
+            self._hist(self._group(self._pages, page).timings, op).add(ms)
+            if sheet_io and state is not None:
+                state[2] += ms
+
+    def count(self, name: str, sheet: str | None = None, n: int = 1):
+        if not _enabled:
+            return
+        with self._lock:
+            if sheet is not None:
+                self._group(self._sheets, sheet).counts[name] += n
+            state = self._page_state()
+            self._group(self._pages, state[0] if state is not None else BACKGROUND).counts[name] += n
+
+    def api_call(self, method: str):
+        """นับการเรียก API 1 ครั้งเข้าหน้าต่าง 60 วินาที (ดูว่าใกล้ quota แค่ไหน)"""
+        if not _enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._calls.append((now, "read" if method in READ_METHODS else "write"))
+            while self._calls and now - self._calls[0][0] > 60:
+                self._calls.popleft()
+
+    @contextmanager
+    def timer(self, op: str, sheet: str | None = None, sheet_io: bool = False):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(op, (time.perf_counter() - start) * 1000, sheet, sheet_io)
+
+    # ---------- อ่านค่า ----------
+    def snapshot(self, read_quota: float | None = None, write_quota: float | None = None) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            recent = Counter(kind for t, kind in self._calls if now - t <= 60)
+            return {
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "started_at": datetime.fromtimestamp(self._started).isoformat(timespec="seconds"),
+                "uptime_s": round(time.time() - self._started, 1),
+                "enabled": _enabled,
+                "quota": {
+                    "reads_last_minute": recent["read"],
+                    "writes_last_minute": recent["write"],
+                    "read_quota_per_minute": read_quota,
+                    "write_quota_per_minute": write_quota,
+                },
+                "ops": {op: h.to_dict() for op, h in sorted(self._ops.items())},
+                "sheets": {name: g.to_dict() for name, g in sorted(self._sheets.items())},
+                "pages": {name: g.to_dict() for name, g in sorted(self._pages.items())},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._started = time.time()
+            self._ops.clear()
+            self._sheets.clear()
+            self._pages.clear()
+            self._calls.clear()
+
+
+@st.cache_resource
+def get_telemetry() -> Telemetry:
+    return Telemetry()
+
+
+def start_page(page: str):
+    """เรียกบนสุดของแต่ละหน้า: เริ่มจับเวลารอบนี้ และนับงานที่เกิดใน session นี้เข้าหน้านี้ (รวม fragment ที่รันทีหลัง)"""
+    get_telemetry().start_page(page)
+
+
+def end_page():
+    """
+    เรียกใน finally ท้ายหน้า (try: ... finally: end_page()) ให้นับรอบที่จบด้วย st.stop() / st.rerun() ด้วย
+    บันทึกเวลาทั้งรอบ แยกเป็นเวลาอ่าน Sheet กับเวลาที่เหลือ (pandas + วาดหน้า)
+    """
+    get_telemetry().end_page()
+
+
+# ---------------------------------------------------------
+# BACKEND / HTTP (นับทุกการเรียก Sheets API)
+# ---------------------------------------------------------
+def _sheet_of(method: str, args: tuple, kwargs: dict) -> str:
+    """ชื่อ Sheet ของการเรียก API (หลาย Sheet ใน batch เดียว = ชื่อคั่นด้วย +)"""
+    target = args[0] if args else kwargs.get("range", kwargs.get("ranges", kwargs.get("body", kwargs.get("title"))))
+    if method == "add_worksheet":
+        return str(target)
+    if isinstance(target, str):
+        return split_range(target)[0]
+    if isinstance(target, dict):
+        target = [item.get("range", "") for item in target.get("data", [])]
+    if isinstance(target, (list, tuple)) and target:
+        return "+".join(sorted({split_range(r)[0] for r in target}))
+    return SPREADSHEET
+
+
+class InstrumentedBackend:
+    """
+    ห่อ backend (gspread.Spreadsheet / FakeSpreadsheet) ให้ทุกเมธอดถูกจับเวลา / นับครั้ง / นับ error
+    แยกตาม Sheet และหน้า (เมธอดอื่น / attribute ส่งต่อให้ตัวจริงตรง ๆ)
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.inner, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+
+        def call(*args, **kwargs):
+            if not _enabled:
+                return attr(*args, **kwargs)
+            telemetry = get_telemetry()
+            sheet = _sheet_of(name, args, kwargs)
+            _local.call = _local.last = sheet
+            telemetry.api_call(name)
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                code = getattr(getattr(e, "response", None), "status_code", None)
+                telemetry.count("api_quota_errors" if code == 429 else "api_errors", sheet)
+                raise
+            finally:
+                _local.call = None
+                telemetry.record(f"api.{name}", (time.perf_counter() - start) * 1000, sheet)
+                telemetry.count("api_calls", sheet)
+
+        return call
+
+
+def record_retry():
+    """นับการลองเรียก API ใหม่ (หลัง 429 / 5xx) เข้า Sheet ของการเรียกล่าสุดใน thread นี้"""
+    get_telemetry().count("api_retries", getattr(_local, "last", None) or SPREADSHEET)
+
+
+def response_hook(response, *args, **kwargs):
+    """hook ของ requests.Session: นับขนาด request / response จริงที่รับส่งกับ Google"""
+    if not _enabled:
+        return
+    sheet = getattr(_local, "call", None) or SPREADSHEET
+    telemetry = get_telemetry()
+    body = response.request.body if response.request is not None else None
+    telemetry.count("bytes_sent", sheet, len(body) if body else 0)
+    length = response.headers.get("Content-Length")
+    telemetry.count("bytes_received", sheet, int(length) if length and length.isdigit() else len(response.content))
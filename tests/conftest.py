@@ -0,0 +1,25 @@
+# tests/conftest.py
+# ทดสอบชั้นข้อมูลกับ FakeSpreadsheet (benchmarks/fake_sheets.py) ไม่ต้องมี secrets / internet
+#
+#   python -m pytest -q
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gsheet_utils
+from benchmarks.fake_sheets import FakeSpreadsheet
+from benchmarks.run_benchmarks import make_dataset
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """Spreadsheet ปลอม 200 แถว PR_PO (Request / PR_PO มี Row_Version) ใช้แทน Google Sheets ระหว่างเทสต์"""
+    monkeypatch.setattr(gsheet_utils, "VERSIONED_SHEETS", ["Request", "PR_PO"])
+    sheets = FakeSpreadsheet(make_dataset(200))
+    gsheet_utils.use_backend(sheets)
+    yield sheets
+    gsheet_utils._get_write_queue().close()
+    gsheet_utils.use_backend(None)
@@ -0,0 +1,175 @@
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+import gsheet_utils
+
+
+def _counts(sheet_name: str) -> dict:
+    return gsheet_utils.telemetry_snapshot()["sheets"].get(sheet_name, {}).get("counts", {})
+
+
+def _cells(rows: list[list]) -> pd.DataFrame:
+    return pd.DataFrame(rows[1:], columns=rows[0], dtype=object)
+
+
+# ---------------------------------------------------------
+# compare-and-swap ด้วย Row_Version
+# ---------------------------------------------------------
+def test_apply_patch_skips_rows_changed_by_someone_else(fake):
+    frame = _cells(fake.sheets["Request"])
+    frame.loc[0, "Row_Version"] = "2"   # มีคนแก้แถวแรกไปก่อน
+    patch = {
+        "key_cols": ["Request_ID"],
+        "rows": [
+            [["RQ000001"], {"Status": "mine"}, "1"],
+            [["RQ000002"], {"Status": "mine"}, "1"],
+        ],
+        "appends": [],
+    }
+    before = frame.loc[0, "Status"]
+
+    frame, changed, missing, conflicts = gsheet_utils._apply_patch(frame, patch)
+
+    assert conflicts == [["RQ000001"]]
+    assert missing == []
+    assert frame.loc[0, "Status"] == before
+    assert frame.loc[1, "Status"] == "mine"
+    assert frame.loc[1, "Row_Version"] == "2"
+    assert list(changed) == [1]
+
+
+def test_save_sheet_raises_conflict_and_keeps_other_rows(fake):
+    rows = fake.sheets["Request"]
+    header = rows[0]
+    status, version = header.index("Status"), header.index("Row_Version")
+    df = gsheet_utils.load_sheet("Request").copy()
+
+    # อีก process แก้แถวแรกใน Sheet (เลขเวอร์ชันเพิ่ม)
+    rows[1][status], rows[1][version] = "external", "2"
+    fake.revision += 1
+
+    df["Status"] = df["Status"].astype(object)
+    df.loc[0, "Status"] = "mine"
+    df.loc[1, "Status"] = "mine"
+    with pytest.raises(gsheet_utils.WriteConflict) as exc:
+        gsheet_utils.save_sheet("Request", df)
+
+    assert exc.value.keys == [["RQ000001"]]
+    assert rows[1][status] == "external"
+    assert rows[2][status] == "mine"
+    assert rows[2][version] == "2"
+
+
+# ---------------------------------------------------------
+# sync เฉพาะแถวที่เปลี่ยน
+# ---------------------------------------------------------
+def test_changed_rows_returns_none_when_rows_removed_or_keys_moved():
+    old = pd.DataFrame({"Request_ID": ["RQ1", "RQ2", "RQ3"], "Row_Version": ["1", "1", "1"]})
+    keys = [["Request_ID"], ["RQ1"], ["RQ2"], ["RQ3"], ["RQ4"]]
+    versions = [["Row_Version"], ["1"], ["2"], ["1"], ["1"]]
+    header = ["Request_ID", "Row_Version"]
+
+    # แถวเดิมเปลี่ยนเวอร์ชัน 1 แถว + แถวใหม่ท้าย Sheet (เกินสัดส่วน -> โหลดทั้ง Sheet)
+    assert gsheet_utils._changed_rows(old, header, [keys, versions]) is None
+    big = pd.concat([old] * 10, ignore_index=True)
+    big_keys = [["Request_ID"]] + big[["Request_ID"]].values.tolist()
+    big_versions = [["Row_Version"]] + big[["Row_Version"]].values.tolist()
+    big_versions[5] = ["2"]
+    assert gsheet_utils._changed_rows(big, header, [big_keys, big_versions]) == [4]
+
+    # แถวถูกลบ / ย้ายที่ -> โหลดทั้ง Sheet
+    assert gsheet_utils._changed_rows(old, header, [keys[:3], versions[:3]]) is None
+    moved = [keys[0], ["RQ2"], ["RQ1"], ["RQ3"]]
+    assert gsheet_utils._changed_rows(old, header, [moved, versions[:4]]) is None
+
+
+def test_load_sheet_syncs_changed_rows_only(fake):
+    rows = fake.sheets["PR_PO"]
+    header = rows[0]
+    comment, version = header.index("Comment"), header.index("Row_Version")
+    gsheet_utils.load_sheet("PR_PO")
+    synced = _counts("PR_PO").get("cache_synced", 0)
+
+    rows[3][comment], rows[3][version] = "edited", "2"
+    fake.revision += 1
+    gsheet_utils._get_sheet_cache().expire("PR_PO")   # เลย TTL แล้ว -> เช็คกับ Sheet
+    df = gsheet_utils.load_sheet("PR_PO")
+
+    assert _counts("PR_PO").get("cache_synced", 0) == synced + 1
+    assert df.loc[2, "Comment"] == "edited"
+
+
+def test_load_sheet_falls_back_to_full_load_when_rows_deleted(fake):
+    rows = fake.sheets["PR_PO"]
+    gsheet_utils.load_sheet("PR_PO")
+    missed = _counts("PR_PO").get("cache_miss", 0)
+    synced = _counts("PR_PO").get("cache_synced", 0)
+
+    deleted = rows.pop(5)
+    fake.revision += 1
+    gsheet_utils._get_sheet_cache().expire("PR_PO")
+    df = gsheet_utils.load_sheet("PR_PO")
+
+    assert _counts("PR_PO").get("cache_miss", 0) == missed + 1
+    assert _counts("PR_PO").get("cache_synced", 0) == synced
+    assert len(df) == len(rows) - 1
+    assert deleted[1] not in set(df["Request_ID"])
+
+
+# ---------------------------------------------------------
+# journal ของคิวเขียน
+# ---------------------------------------------------------
+def test_write_queue_replays_pending_jobs_from_journal(fake, tmp_path):
+    journal = tmp_path / "write_journal.jsonl"
+    row = {"Request_ID": "RQ999999", "Status": "ขอสั่งซื้อ"}
+    records = [
+        {"op": "enqueue", "ticket": "done1", "sheet": "Request", "kind": "append",
+         "payload": [{"Request_ID": "RQ999998"}]},
+        {"op": "done", "ticket": "done1"},
+        {"op": "enqueue", "ticket": "pending1", "sheet": "Request", "kind": "append", "payload": [row]},
+    ]
+    lines = [json.dumps(r, ensure_ascii=False) for r in records]
+    journal.write_text("\n".join(lines) + "\n" + '{"op": "enq', encoding="utf-8")   # บรรทัดท้ายเขียนไม่จบ
+    n_rows = len(fake.sheets["Request"])
+
+    queue = gsheet_utils._WriteQueue(str(journal), backend=fake)
+    try:
+        queue.wait("pending1", timeout=10)
+    finally:
+        queue.close()
+
+    ids = [r[0] for r in fake.sheets["Request"]]
+    assert len(fake.sheets["Request"]) == n_rows + 1
+    assert "RQ999999" in ids and "RQ999998" not in ids
+    assert journal.read_text(encoding="utf-8") == ""
+
+
+# ---------------------------------------------------------
+# เลข running
+# ---------------------------------------------------------
+@pytest.mark.parametrize("block_size", [1, 5])
+def test_next_id_is_unique_across_threads_and_processes(fake, monkeypatch, block_size):
+    monkeypatch.setattr(gsheet_utils, "ID_BLOCK_SIZE", block_size)
+    # 2 allocator ใช้ Sheet _ID_ เดียวกัน = 2 process
+    allocators = [gsheet_utils._IdAllocator(), gsheet_utils._IdAllocator()]
+    ids, lock = [], threading.Lock()
+
+    def worker(allocator):
+        got = [allocator.next_number("RQ") for _ in range(10)]
+        with lock:
+            ids.extend(got)
+
+    threads = [threading.Thread(target=worker, args=(allocators[i % 2],)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(ids) == 80
+    assert len(set(ids)) == 80
+    existing = gsheet_utils.load_sheet("PR_PO")["Request_ID"].str[2:].astype(int).max()
+    assert min(ids) > existing
+
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+import gsheet_utils
+from purchase_ops import RECEIVED_STATUS, apply_goods_receipt, apply_po_edits, check_goods_receipt
+
+PO_STATUSES = ["แจ้งสั่งซื้อแล้ว(PO)", "อยู่ระหว่างการจัดส่ง", RECEIVED_STATUS]
+
+
+def _prpo() -> pd.DataFrame:
+    return pd.DataFrame({
+        "PO_ID": ["PO1", "PO1", "PO2", "PO3", "PO3"],
+        "Item_No": ["A", "B", "A", "C", "C"],
+        "Description": ["a", "b", "a", "c", "c"],
+        "Status": ["แจ้งสั่งซื้อแล้ว(PO)"] * 5,
+        "Quantity": [10.0, 5.0, 8.0, 4.0, 4.0],
+        "Quantity_Received": [0.0, 0.0, 2.0, 0.0, 0.0],
+        "Outstanding_Quantity": [10.0, 5.0, 6.0, 4.0, 4.0],
+        "Qty_to_Receive": [10.0, 5.0, 6.0, 4.0, 4.0],
+    })
+
+
+# ---------------------------------------------------------
+# apply_po_edits
+# ---------------------------------------------------------
+def test_apply_po_edits_updates_matching_rows_only():
+    df = _prpo()
+    edited = pd.DataFrame({
+        "PO_ID": ["PO1", "PO1", "PO2"],
+        "Item_No": ["A", "A", "A"],                 # key ซ้ำ -> แถวล่างสุดชนะ
+        "Quantity_Received": [3, 4, 2],             # PO2/A ไม่เปลี่ยน
+        "Status": ["ไม่มีในรายการ", "อยู่ระหว่างการจัดส่ง", "ไม่มีในรายการ"],
+    })
+
+    out = apply_po_edits(df, edited, PO_STATUSES)
+
+    assert out.loc[0, "Quantity_Received"] == 4
+    assert out.loc[0, "Outstanding_Quantity"] == 6
+    assert out.loc[0, "Qty_to_Receive"] == 6
+    assert out.loc[0, "Status"] == RECEIVED_STATUS      # รับเข้าแล้วบางส่วน -> บังคับสถานะ
+    assert out.loc[2, "Status"] == df.loc[2, "Status"]  # สถานะที่ไม่อนุญาตไม่ถูกใส่
+    pd.testing.assert_frame_equal(out.loc[[1, 2, 3, 4]], df.loc[[1, 2, 3, 4]])
+    assert df.loc[0, "Quantity_Received"] == 0          # ไม่แก้ DataFrame ที่ส่งเข้ามา
+
+
+def test_apply_po_edits_sets_allowed_status_without_receiving():
+    df = _prpo()
+    edited = pd.DataFrame({"PO_ID": ["PO1"], "Item_No": ["B"], "Quantity_Received": [0],
+                           "Status": ["อยู่ระหว่างการจัดส่ง"]})
+
+    out = apply_po_edits(df, edited, PO_STATUSES)
+
+    assert out.loc[1, "Status"] == "อยู่ระหว่างการจัดส่ง"
+    assert out.loc[1, "Outstanding_Quantity"] == 5
+
+
+# ---------------------------------------------------------
+# ใบรับสินค้า
+# ---------------------------------------------------------
+def test_goods_receipt_checks_and_applies_valid_lines():
+    df = _prpo()
+    gr = pd.DataFrame({
+        "PO_ID": ["PO1", "PO1", "PO1", "PO2", "PO3", "PO9", "PO1", ""],
+        "Item_No": ["A", "A", "B", "A", "C", "Z", "A", ""],
+        "Qty": ["2", "3", "5", "7", "1", "1", "x", ""],   # บรรทัดท้ายว่าง = ข้าม
+    })
+
+    checked = check_goods_receipt(df, gr).set_index(["PO_ID", "Item_No"])
+
+    assert checked.loc[("PO1", "A"), "Problem"] == "จำนวนไม่ถูกต้อง"   # มีบรรทัด "x"
+    assert checked.loc[("PO1", "B"), "Problem"] == ""
+    assert checked.loc[("PO2", "A"), "Problem"] == "เกินยอดค้างรับ"
+    assert checked.loc[("PO3", "C"), "Problem"] == "PO_ID + Item_No ซ้ำใน PR_PO"
+    assert checked.loc[("PO9", "Z"), "Problem"] == "ไม่พบ PO_ID + Item_No นี้"
+
+    out, preview = apply_goods_receipt(df, checked.reset_index())
+
+    assert out.loc[1, "Quantity_Received"] == 5
+    assert out.loc[1, "Outstanding_Quantity"] == 0
+    assert out.loc[1, "Status"] == RECEIVED_STATUS
+    pd.testing.assert_frame_equal(out.drop(index=1), df.drop(index=1), check_dtype=False)
+    assert preview[["PO_ID", "Item_No"]].values.tolist() == [["PO1", "B"]]
+    assert preview["Quantity_Received (เดิม)"].tolist() == [0]
+    assert preview["Status (ใหม่)"].tolist() == [RECEIVED_STATUS]
+
+
+def test_goods_receipt_on_loaded_sheet_roundtrips_through_save(fake):
+    df = gsheet_utils.load_sheet("PR_PO")
+    open_lines = df[(df["PO_ID"] != "") & (df["Quantity_Received"] == 0)]
+    line = open_lines.iloc[0]
+    gr = pd.DataFrame({"PO_ID": [line["PO_ID"]], "Item_No": [line["Item_No"]], "Qty": ["1"]})
+
+    checked = check_goods_receipt(df, gr)
+    assert checked["Problem"].tolist() == [""]
+    out, _ = apply_goods_receipt(df, checked)
+    gsheet_utils.save_sheet("PR_PO", out)
+
+    gsheet_utils.invalidate_cache("PR_PO")
+    saved = gsheet_utils.load_sheet("PR_PO")
+    row = saved.loc[line.name]
+    assert row["Quantity_Received"] == 1
+    assert row["Outstanding_Quantity"] == line["Quantity"] - 1
+    assert row["Status"] == RECEIVED_STATUS
+    assert np.array_equal(saved.drop(index=line.name)["Quantity_Received"].to_numpy(),
+                          df.drop(index=line.name)["Quantity_Received"].to_numpy(), equal_nan=True)
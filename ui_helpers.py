@@ -0,0 +1,40 @@
+# ui_helpers.py
+# ส่วน UI ที่ใช้ร่วมกันหลายหน้า
+import streamlit as st
+
+from gsheet_utils import pending_writes, write_status
+
+
+def track_write(ticket: str | None):
+    """จำ ticket ของงานเขียนที่ส่งเข้าคิวไว้ แจ้งผลใน show_write_results รอบถัด ๆ ไป"""
+    if ticket is not None:
+        st.session_state.setdefault("write_tickets", []).append(ticket)
+
+
+def flash(message: str, kind: str = "success"):
+    """ข้อความแจ้งผลที่จะแสดงหลัง st.rerun() (ใน show_write_results รอบถัดไป) kind = success / info / warning"""
+    st.session_state.setdefault("flash_messages", []).append((kind, message))
+
+
+def show_write_results():
+    """
+    แจ้งข้อความจาก flash, งานเขียนของ session นี้ที่ล้มเหลว / มีแถวที่คนอื่นแก้ไปก่อน (conflict)
+    และจำนวนงานที่ยังรอส่งไป Google Sheet
+    """
+    for kind, message in st.session_state.pop("flash_messages", []):
+        getattr(st, kind)(message)
+
+    remaining = []
+    for ticket in st.session_state.get("write_tickets", []):
+        state, error = write_status(ticket)
+        if state == "error":
+            st.error(f"บันทึกลง Google Sheet ไม่สำเร็จ: {error}")
+        elif state == "conflict":
+            st.warning(f"⚠️ {error}")
+        elif state == "queued":
+            remaining.append(ticket)
+    st.session_state["write_tickets"] = remaining
+
+    n = pending_writes()
+    if n:
+        st.caption(f"⏳ กำลังส่งข้อมูลที่บันทึกไป Google Sheet อีก {n} รายการ")